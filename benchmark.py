@@ -0,0 +1,72 @@
+import json
+
+import typer
+
+# The suite and its dependencies are imported inside the commands, like the other entry points.
+app = typer.Typer()
+
+
+@app.command()
+def run(
+    sizes: str = typer.Option("7000,100000,1000000", help="Comma-separated raw catalog sizes"),
+    output: str = typer.Option("benchmark_results.json", help="Where to write the JSON results"),
+    work_dir: str = typer.Option("benchmarks/work", help="Directory for generated catalogs and indexes"),
+    seed: int = typer.Option(0, help="Seed for the synthetic catalogs and queries"),
+    sample_books: int = typer.Option(2000, help="Books used for the emotion and zero-shot throughput benchmarks"),
+    real_models: bool = typer.Option(False, help="Benchmark the real Hugging Face models instead of offline stand-ins"),
+):
+    """
+    Run the performance benchmarks on synthetic catalogs and write the results as JSON.
+    """
+    import os
+
+    from src.benchmark import run_benchmarks
+
+    results = run_benchmarks(
+        sizes=[int(size) for size in sizes.split(",")], work_dir=work_dir, seed=seed,
+        sample_books=sample_books, real_models=real_models,
+    )
+    tmp_path = f"{output}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, output)
+    print(json.dumps(results["catalogs"], indent=2))
+    print(f"Results written to {output}")
+
+
+@app.command()
+def generate(
+    output: str = typer.Option(..., help="Where to write the synthetic books.csv"),
+    books: int = typer.Option(7000, help="Number of raw books"),
+    seed: int = typer.Option(0, help="Random seed"),
+):
+    """
+    Write a synthetic raw catalog with the columns of data/raw/books.csv.
+    """
+    from src.synthetic import write_catalog
+
+    write_catalog(output, books, seed=seed)
+    print(f"Wrote {books} synthetic books to {output}")
+
+
+@app.command()
+def compare(
+    old: str = typer.Argument(..., help="Earlier results file"),
+    new: str = typer.Argument(..., help="Later results file"),
+):
+    """
+    Print every metric two result files share, with the ratio new / old.
+    """
+    from src.benchmark import compare_results
+
+    with open(old, "r", encoding="utf-8") as f:
+        old_results = json.load(f)
+    with open(new, "r", encoding="utf-8") as f:
+        new_results = json.load(f)
+    for path, a, b in compare_results(old_results, new_results):
+        ratio = f"{b / a:.2f}x" if a else "n/a"
+        print(f"{path}: {a} -> {b} ({ratio})")
+
+
+if __name__ == "__main__":
+    app()
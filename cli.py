@@ -1,8 +1,8 @@
 import typer
-import pandas as pd
-from src.retriever import retrieve_semantic_recommendations
-from src.vectorstore import build_vectorstore
+from src.config import BOOK_STORE_DIR, EMOTION_STRENGTH, VECTORSTORE_SOURCE_CSV
 
+# Everything beyond typer and the config is imported inside the commands, so `--help` and argument errors stay fast;
+# `python -m src.startup` checks this.
 app = typer.Typer()
 
 # Load cleaned and preprocessed books
@@ -11,62 +11,102 @@ description_txt = "data/preprocessed/tagged_descriptions.txt"
 
 # Check if vector store exists or rebuild it if necessary
 VECTORSTORE_DIR = "chroma_db"
+NUMPY_INDEX_DIR = "vector_index"
+NEIGHBOR_INDEX_DIR = "neighbor_index"
+LEXICAL_INDEX_DIR = "lexical_index"
+SHARDED_INDEX_DIR = "vector_shards"
 
-# Build vectorstore (once) if not already built
-def load_or_build_vectorstore():
-    try:
-        # Attempt to load the existing vector store
+# Open the persisted vectorstore, embedding only books missing from it
+def load_or_build_vectorstore(backend: str = "chroma"):
+    from src.quantized_index import QUANTIZATION_MODES, load_or_build_quantized_index
+    from src.sharded_index import load_or_build_sharded_index
+    from src.vector_index import as_vector_index
+    from src.vectorstore import load_or_build_vectorstore as open_or_build_vectorstore, load_or_build_numpy_index, open_current_numpy_index
+
+    numpy_backend = backend in ("numpy", "sharded") or backend in QUANTIZATION_MODES
+    # A current NumPy index is opened without touching Chroma
+    vector_db = open_current_numpy_index(VECTORSTORE_SOURCE_CSV, VECTORSTORE_DIR, NUMPY_INDEX_DIR) if numpy_backend else None
+    if vector_db is not None:
+        print(f"NumPy index loaded from {NUMPY_INDEX_DIR}")
+    else:
         print(f"Loading vectorstore from {VECTORSTORE_DIR}...")
-        vector_db = build_vectorstore(
-            csv_path=input_path,
+        vector_db = open_or_build_vectorstore(
+            csv_path=VECTORSTORE_SOURCE_CSV,
             description_txt_path=description_txt,
             persist_directory=VECTORSTORE_DIR
         )
         print(f"Vectorstore loaded from {VECTORSTORE_DIR}")
-    except Exception as e:
-        # If loading fails, rebuild the vector store
-        print(f"Error loading vector store: {e}. Rebuilding...")
-        vector_db = build_vectorstore(
-            csv_path=input_path,
-            description_txt_path=description_txt,
-            persist_directory=VECTORSTORE_DIR
-        )
-        print(f"Vectorstore rebuilt and saved to {VECTORSTORE_DIR}")
-    return vector_db
+        if numpy_backend:
+            vector_db = load_or_build_numpy_index(vector_db, VECTORSTORE_DIR, NUMPY_INDEX_DIR)
+            print(f"NumPy index loaded from {NUMPY_INDEX_DIR}")
+    if backend == "sharded":
+        vector_db = load_or_build_sharded_index(vector_db, SHARDED_INDEX_DIR)
+        print(f"{len(vector_db.shard_directories)} index shards loaded from {SHARDED_INDEX_DIR}")
+    if backend in QUANTIZATION_MODES:
+        vector_db = load_or_build_quantized_index(vector_db, backend)
+        print(f"{backend} codes loaded, rescoring shortlists at full precision")
+    # A Chroma store is wrapped once, so its ISBN list is fetched at most once per process
+    return as_vector_index(vector_db)
 
-# Load books data
-books_df = pd.read_csv(input_path)
+# Load books data, indexed by ISBN for rank-ordered lookups
+def load_books_table():
+    from src.book_table import open_book_table
+
+    return open_book_table(BOOK_STORE_DIR, input_path)
 
 @app.command()
 def recommend(
     query: str = typer.Option(..., help="Search query to recommend books based on"),
     category: str = typer.Option("All", help="Category filter for recommendations"),
     emotion: str = typer.Option("All", help="Emotion filter for recommendations"),
-    top_k: int = typer.Option(5, help="Number of top recommendations to show")
+    min_emotion_score: float = typer.Option(0.0, help="Minimum score for the --emotion filter"),
+    min_rating: float = typer.Option(None, help="Minimum average rating"),
+    min_pages: int = typer.Option(None, help="Minimum number of pages"),
+    max_pages: int = typer.Option(None, help="Maximum number of pages"),
+    tone: str = typer.Option("All", help="Favour an emotional tone: Happy, Surprising, Angry, Suspenseful or Sad"),
+    emotion_weights: str = typer.Option("", help="Favour a blend of emotions, e.g. 'joy=0.8,surprise=0.2'"),
+    emotion_strength: float = typer.Option(EMOTION_STRENGTH, help="Share of the ranking given to --tone / --emotion-weights (0 to 1)"),
+    top_k: int = typer.Option(5, help="Number of top recommendations to show"),
+    backend: str = typer.Option("chroma", help="Vector index backend: 'chroma', 'numpy', 'sharded', or the quantized 'int8' / 'float16'"),
+    hybrid: bool = typer.Option(False, help="Fuse BM25 title/author/description matches with the semantic search"),
 ):
     """
     Recommend books based on a search query, optional category, and emotional tone.
     """
-    # Load or rebuild vector store
-    vector_db = load_or_build_vectorstore()
+    from src.filters import RecommendationFilter
+    from src.lexical_index import LexicalIndex
+    from src.reranking import EmotionPreference, parse_emotion_weights
+    from src.retriever import retrieve_hybrid_recommendations, retrieve_semantic_recommendations
 
-    # Retrieve semantic recommendations
-    recs = retrieve_semantic_recommendations(query, vector_db, books_df, top_k=top_k)
+    try:
+        preference = EmotionPreference.build(emotions=parse_emotion_weights(emotion_weights), tone=tone, strength=emotion_strength)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
 
-    # Debugging: Print raw recommendations before filtering
-    print(f"Raw recommendations (before filtering): {len(recs)}")
-    print(recs.head())  # Print top few rows to check content
+    # Load or rebuild vector store
+    vector_db = load_or_build_vectorstore(backend)
+    books_table = load_books_table()
 
-    # Filter by category if necessary
-    if category != "All":
-        recs = recs[recs['simple_categories'].str.contains(category, case=False, na=False)]
+    # Category, emotion, rating and page filters are applied inside the search
+    filters = RecommendationFilter.build(
+        category=category,
+        category_contains=True,
+        emotions=None if emotion == "All" else {emotion: min_emotion_score},
+        min_rating=min_rating,
+        min_pages=min_pages,
+        max_pages=max_pages,
+    )
 
-    # Filter by emotion if necessary
-    if emotion != "All":
-        recs = recs[recs[emotion].notnull() & (recs[emotion] > 0)]
-    
-    # Debugging: Print recommendations after filtering
-    print(f"Filtered recommendations (after applying category and emotion filters): {len(recs)}")
+    # Retrieve semantic (or hybrid lexical + semantic) recommendations
+    if hybrid:
+        if LexicalIndex.read_manifest(LEXICAL_INDEX_DIR) is None:
+            print(f"No lexical index found in {LEXICAL_INDEX_DIR}; run the pipeline first.")
+            raise typer.Exit(code=1)
+        lexical = LexicalIndex.load(LEXICAL_INDEX_DIR)
+        recs = retrieve_hybrid_recommendations(query, vector_db, books_table, lexical, top_k=top_k, filters=filters, preference=preference)
+    else:
+        recs = retrieve_semantic_recommendations(query, vector_db, books_table, top_k=top_k, filters=filters, preference=preference)
+    print(f"Recommendations found: {len(recs)}")
 
     # Display the recommendations
     if recs.empty:
@@ -81,5 +121,73 @@ def recommend(
             print(f"Description: {truncated_desc}")
             print("-" * 40)
 
+@app.command()
+def recommend_batch(
+    input_path: str = typer.Option(..., "--input", help="Queries as a .jsonl or .csv file, or '-' for JSONL ('-.csv' for CSV) on stdin"),
+    output: str = typer.Option("-", help="Where to write the JSONL results; '-' writes to stdout"),
+    top_k: int = typer.Option(5, help="Recommendations per query, unless a query sets 'top_k'"),
+    batch_size: int = typer.Option(256, help="Queries embedded and searched together"),
+    backend: str = typer.Option("numpy", help="Vector index backend: 'chroma', 'numpy', 'sharded', or the quantized 'int8' / 'float16'"),
+    hybrid: bool = typer.Option(False, help="Fuse BM25 title/author/description matches with the semantic search"),
+):
+    """
+    Recommend books for many queries at once, streaming one JSON line of results per query.
+
+    Each query is a JSON object (or CSV row) with a 'query' and optional 'id', 'top_k', 'category', 'emotion',
+    'min_emotion_score', 'emotions', 'min_rating', 'min_pages' and 'max_pages', filtered as in `recommend`.
+    """
+    import contextlib
+    import json
+    import sys
+
+    from src.batch import read_queries, recommend_batch as run_batch
+    from src.cache import RetrievalCache
+    from src.lexical_index import LexicalIndex
+
+    # Progress goes to stderr so results can be piped from stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        vector_db = load_or_build_vectorstore(backend)
+        books_table = load_books_table()
+        lexical = None
+        if hybrid:
+            if LexicalIndex.read_manifest(LEXICAL_INDEX_DIR) is None:
+                print(f"No lexical index found in {LEXICAL_INDEX_DIR}; run the pipeline first.")
+                raise typer.Exit(code=1)
+            lexical = LexicalIndex.load(LEXICAL_INDEX_DIR)
+
+    with contextlib.ExitStack() as stack:
+        out = sys.stdout if output == "-" else stack.enter_context(open(output, "w", encoding="utf-8"))
+        stats = run_batch(
+            read_queries(input_path), vector_db, books_table, out,
+            top_k=top_k, batch_size=batch_size, lexical=lexical, cache=RetrievalCache(),
+        )
+    print(json.dumps(stats), file=sys.stderr)
+
+    if hasattr(vector_db, "close"):
+        vector_db.close()
+
+@app.command()
+def similar(
+    isbn: int = typer.Option(..., help="ISBN-13 of the book to find similar books for"),
+    top_k: int = typer.Option(5, help="Number of similar books to show"),
+):
+    """
+    Show the books most similar to a given book, from the precomputed neighbour table (no model inference).
+    """
+    from src.neighbors import NeighborTable
+
+    if NeighborTable.read_manifest(NEIGHBOR_INDEX_DIR) is None:
+        print(f"No neighbour table found in {NEIGHBOR_INDEX_DIR}; run the pipeline first.")
+        raise typer.Exit(code=1)
+    neighbors = NeighborTable.load(NEIGHBOR_INDEX_DIR)
+    isbns, scores = neighbors.similar(isbn, top_k=top_k)
+    recs = load_books_table().take(isbns, scores)
+
+    if recs.empty:
+        print(f"No similar books found for ISBN {isbn}.")
+    else:
+        for index, row in recs.iterrows():
+            print(f"{row['rank']}. {row['title_and_subtitle']} (ISBN {row['isbn13']}, similarity {row['similarity']:.3f})")
+
 if __name__ == "__main__":
     app()
\ No newline at end of file
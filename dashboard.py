@@ -1,63 +1,68 @@
-import os
-import pandas as pd
-import numpy as np
-from dotenv import load_dotenv
-
-from transformers import pipeline
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import CharacterTextSplitter
-from langchain.embeddings import SentenceTransformerEmbeddings
-from langchain_chroma import Chroma
-
-import gradio as gr
-
-load_dotenv()
-
-books = pd.read_csv("data/preprocessed/books_with_emotions.csv")
-
-# Thumbnails
-books["large_thumbnail"] = books["thumbnail"] + "&fife=w800"
-
-loader = TextLoader("data/preprocessed/tagged_descriptions.txt", encoding='utf-8')
-raw_documents = loader.load()
-text_splitter = CharacterTextSplitter(separator="\n", chunk_size=0, chunk_overlap=0)
-documents = text_splitter.split_documents(raw_documents)
-
-api_key = os.getenv("HUGGINGFACEHUB_API_KEY")
-embedding = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-db_books = Chroma.from_documents(
-    documents=documents,
-    embedding=embedding,
-    persist_directory="chroma_db"
-)
+from typing import TYPE_CHECKING
+
+from src.config import BOOK_STORE_DIR, TONE_EMOTIONS, VECTORSTORE_SOURCE_CSV
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+BOOKS_CSV = "data/preprocessed/books_with_emotions.csv"
+
+# Data, models and gradio are loaded on first use rather than at import time; `python -m src.startup` checks this.
+_resources: dict = {}
+
+
+def load_resources() -> dict:
+    """Opens the book table, vectorstore, lexical index and retrieval cache once, and returns them on later calls."""
+    if not _resources:
+        from dotenv import load_dotenv
+
+        from src.book_table import open_book_table
+        from src.cache import RetrievalCache
+        from src.lexical_index import LexicalIndex
+        from src.vector_index import as_vector_index
+        from src.vectorstore import load_or_build_vectorstore
+
+        load_dotenv()
+        _resources.update(
+            # Columns are memory-mapped; text is decoded only for the recommended rows
+            book_table=open_book_table(BOOK_STORE_DIR, BOOKS_CSV),
+            # Wrapped once, so filtered queries reuse one ISBN list instead of fetching it from Chroma per request
+            db_books=as_vector_index(load_or_build_vectorstore(
+                csv_path=VECTORSTORE_SOURCE_CSV,
+                description_txt_path="data/preprocessed/tagged_descriptions.txt",
+                persist_directory="chroma_db"
+            )),
+            # Title and author queries are answered from the BM25 index when the pipeline has built it
+            lexical_index=LexicalIndex.load("lexical_index") if LexicalIndex.read_manifest("lexical_index") else None,
+            # Switching the category or tone of a recent query is served from memory
+            retrieval_cache=RetrievalCache(),
+        )
+    return _resources
 
 def retrieve_semantic_recommendations(
         query: str,
         category: str = None,
         tone: str = None,
-        initial_top_k: int = 50,
         final_top_k: int = 16,
-) -> pd.DataFrame:
-
-    recs = db_books.similarity_search(query, k=initial_top_k)
-    books_list = [int(rec.page_content.strip('"').split()[0]) for rec in recs]
-    book_recs = books[books["isbn13"].isin(books_list)].head(initial_top_k)
-
-    if category != "All":
-        book_recs = book_recs[book_recs["simple_categories"] == category].head(final_top_k)
+        emotion_weights: str = "",
+) -> "pd.DataFrame":
+    from src.filters import RecommendationFilter
+    from src.reranking import EmotionPreference, parse_emotion_weights
+    from src.retriever import retrieve_hybrid_recommendations, retrieve_semantic_recommendations as retrieve_filtered_recommendations
+
+    resources = load_resources()
+    book_table, db_books, lexical_index, retrieval_cache = (
+        resources["book_table"], resources["db_books"], resources["lexical_index"], resources["retrieval_cache"]
+    )
+
+    # The category filter is applied inside the search, so no over-fetching is needed
+    filters = RecommendationFilter.build(category=category)
+    # The tone and emotion weights re-rank the whole candidate set inside the retriever, before truncation
+    preference = EmotionPreference.build(emotions=parse_emotion_weights(emotion_weights or ""), tone=tone)
+    if lexical_index is not None:
+        book_recs = retrieve_hybrid_recommendations(query, db_books, book_table, lexical_index, top_k=final_top_k, filters=filters, cache=retrieval_cache, preference=preference)
     else:
-        book_recs = book_recs.head(final_top_k)
-
-    if tone == "Happy":
-        book_recs.sort_values(by="joy", ascending=False, inplace=True)
-    elif tone == "Surprising":
-        book_recs.sort_values(by="surprise", ascending=False, inplace=True)
-    elif tone == "Angry":
-        book_recs.sort_values(by="anger", ascending=False, inplace=True)
-    elif tone == "Suspenseful":
-        book_recs.sort_values(by="fear", ascending=False, inplace=True)
-    elif tone == "Sad":
-        book_recs.sort_values(by="sadness", ascending=False, inplace=True)
+        book_recs = retrieve_filtered_recommendations(query, db_books, book_table, top_k=final_top_k, filters=filters, cache=retrieval_cache, preference=preference)
 
     return book_recs
 
@@ -65,49 +70,70 @@ def retrieve_semantic_recommendations(
 def recommend_books(
         query: str,
         category: str,
-        tone: str
+        tone: str,
+        emotion_weights: str = "",
 ):
-    recommendations = retrieve_semantic_recommendations(query, category, tone)
-    results = []
-
-    for _, row in recommendations.iterrows():
-        description = row["description"]
-        truncated_desc_split = description.split()
-        truncated_description = " ".join(truncated_desc_split[:30]) + "..."
-
-        authors_split = row["authors"].split(";")
-        if len(authors_split) == 2:
-            authors_str = f"{authors_split[0]} and {authors_split[1]}"
-        elif len(authors_split) > 2:
-            authors_str = f"{', '.join(authors_split[:-1])}, and {authors_split[-1]}"
-        else:
-            authors_str = row["authors"]
-
-        caption = f"{row['title']} by {authors_str}: {truncated_description}"
-        results.append((row["large_thumbnail"], caption))
+    from src.metrics import timer, traced_request
+
+    # Slow requests are logged with the time spent in each stage
+    with traced_request("dashboard", query=query, category=category, tone=tone, emotion_weights=emotion_weights):
+        recommendations = retrieve_semantic_recommendations(query, category, tone, emotion_weights=emotion_weights)
+        results = []
+
+        with timer("retrieval_stage_seconds", stage="format"):
+            for _, row in recommendations.iterrows():
+                description = row["description"]
+                truncated_desc_split = description.split()
+                truncated_description = " ".join(truncated_desc_split[:30]) + "..."
+
+                authors_split = row["authors"].split(";")
+                if len(authors_split) == 2:
+                    authors_str = f"{authors_split[0]} and {authors_split[1]}"
+                elif len(authors_split) > 2:
+                    authors_str = f"{', '.join(authors_split[:-1])}, and {authors_split[-1]}"
+                else:
+                    authors_str = row["authors"]
+
+                caption = f"{row['title']} by {authors_str}: {truncated_description}"
+                large_thumbnail = row["thumbnail"] + "&fife=w800" if isinstance(row["thumbnail"], str) else None
+                results.append((large_thumbnail, caption))
     return results
 
-categories = ["All"] + sorted(books["simple_categories"].unique())
-tones = ["All"] + ["Happy", "Surprising", "Angry", "Suspenseful", "Sad"]
+tones = ["All"] + list(TONE_EMOTIONS)
+
+
+def build_dashboard():
+    """Builds the Gradio UI; the data behind it is loaded by `load_resources`."""
+    import gradio as gr
 
-with gr.Blocks(theme = gr.themes.Glass()) as dashboard:
-    gr.Markdown("# Semantic book recommender")
+    categories = ["All"] + load_resources()["book_table"].categories
 
-    with gr.Row():
-        user_query = gr.Textbox(label = "Please enter a description of a book:",
-                                placeholder = "e.g., A story about forgiveness")
-        category_dropdown = gr.Dropdown(choices = categories, label = "Select a category:", value = "All")
-        tone_dropdown = gr.Dropdown(choices = tones, label = "Select an emotional tone:", value = "All")
-        submit_button = gr.Button("Find recommendations")
+    with gr.Blocks(theme = gr.themes.Glass()) as dashboard:
+        gr.Markdown("# Semantic book recommender")
 
-    gr.Markdown("## Recommendations")
-    output = gr.Gallery(label = "Recommended books", columns = 8, rows = 2)
+        with gr.Row():
+            user_query = gr.Textbox(label = "Please enter a description of a book:",
+                                    placeholder = "e.g., A story about forgiveness")
+            category_dropdown = gr.Dropdown(choices = categories, label = "Select a category:", value = "All")
+            tone_dropdown = gr.Dropdown(choices = tones, label = "Select an emotional tone:", value = "All")
+            weights_box = gr.Textbox(label = "Or weight several emotions:",
+                                     placeholder = "e.g., joy=0.8, surprise=0.2")
+            submit_button = gr.Button("Find recommendations")
 
-    submit_button.click(fn = recommend_books,
-                        inputs = [user_query, category_dropdown, tone_dropdown],
-                        outputs = output)
+        gr.Markdown("## Recommendations")
+        output = gr.Gallery(label = "Recommended books", columns = 8, rows = 2)
+
+        submit_button.click(fn = recommend_books,
+                            inputs = [user_query, category_dropdown, tone_dropdown, weights_box],
+                            outputs = output)
+
+    return dashboard
 
 
 if __name__ == "__main__":
+    from src.metrics import configure_log
+
+    configure_log("-")
+    dashboard = build_dashboard()
     dashboard.launch()
     # dashboard.launch(share=True)
\ No newline at end of file
@@ -1,4 +1,31 @@
-from pipeline import run_pipeline
+from typing import Optional
+
+import typer
+
+from src.config import MODEL_MEMORY_BUDGET_MB, QUANTIZE_MODELS, TORCH_THREADS_PER_WORKER
+
+app = typer.Typer()
+
+
+@app.command()
+def main(
+    force: bool = typer.Option(False, help="Recompute every stage even if its inputs are unchanged"),
+    workers: int = typer.Option(1, help="Worker processes for the zero-shot and emotion stages"),
+    torch_threads: int = typer.Option(TORCH_THREADS_PER_WORKER, help="Torch intra-op threads per worker process"),
+    quantize_models: bool = typer.Option(QUANTIZE_MODELS, help="Run the zero-shot and emotion models with dynamic int8 quantization on CPU"),
+    model_memory_mb: float = typer.Option(MODEL_MEMORY_BUDGET_MB, help="Evict least recently used models beyond this much memory per process"),
+    metrics_log: Optional[str] = typer.Option(None, help="Append a JSON event for every stage to this file; '-' for stderr"),
+):
+    """
+    Run the preprocessing pipeline.
+    """
+    from pipeline import run_pipeline
+
+    run_pipeline(
+        force=force, workers=workers, torch_threads=torch_threads,
+        quantize_models=quantize_models, model_memory_mb=model_memory_mb, metrics_log=metrics_log,
+    )
+
 
 if __name__ == "__main__":
-    run_pipeline()
\ No newline at end of file
+    app()
@@ -1,51 +1,260 @@
-from src.preprocessing import clean_books_dataset
-from src.vectorstore import build_vectorstore
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+
+import pandas as pd
+
+from src.preprocessing import stream_clean_books_dataset
+from src.vectorstore import build_vectorstore, load_or_build_numpy_index, file_sha256, text_sha1
+from src.lexical_index import load_or_build_lexical_index
+from src.neighbors import load_or_build_neighbor_table
+from src.quantized_index import QUANTIZATION_MODES, quantization_report
 from src.retriever import retrieve_semantic_recommendations
-from src.classifier import ZeroShotBookClassifier
+from src.book_store import BookStore
+from src.classifier import predict_confident_categories, zero_shot_shard_task
 from src.category_mapper import map_categories
-from src.sentiment.analyzer import analyze_book_emotions
+from src.config import (
+    BOOK_STORE_DIR, CATEGORY_MAPPING, VECTORSTORE_SOURCE_CSV, FICTION_CATEGORIES, EMBEDDING_MODEL_NAME,
+    EMBEDDING_CONFIDENCE_THRESHOLD, MODEL_MEMORY_BUDGET_MB, QUANTIZE_MODELS, ZERO_SHOT_MODEL_NAME,
+)
+from src.metrics import configure_log, get_metrics, log_event, timer
+from src.models import configure_models, get_registry
+from src.sentiment.analyzer import emotion_shard_task
+from src.sentiment.config import EMOTION_LABELS, EMOTION_MODEL_NAME
+from src.sharding import ShardedExecutor, TORCH_THREADS_PER_WORKER
+from src.stage_cache import StageCache, stage_key
+
+CACHE_DIR = "data/preprocessed/.cache"
+
+# Books scored per emotion checkpoint; a crash loses at most one chunk of work.
+EMOTION_CHECKPOINT_ROWS = 500
+
+PIPELINE_STAGE_METRIC = "pipeline_stage_seconds"
+
+
+@contextmanager
+def pipeline_stage(name: str):
+    """Times one pipeline stage into the stage histogram and logs it as a JSON event; also usable as a function decorator."""
+    start = time.perf_counter()
+    with timer(PIPELINE_STAGE_METRIC, stage=name):
+        yield
+    log_event("pipeline_stage", stage=name, seconds=round(time.perf_counter() - start, 3))
+
+
+@pipeline_stage("categories")
+def fill_categories_incremental(books_df: pd.DataFrame, vector_index, cache: StageCache, executor: ShardedExecutor) -> pd.DataFrame:
+    """Fills missing categories, running the classifiers only on books without a cached prediction.
+
+    Confident embedding-probe predictions are made in-process; the remaining books are zero-shot classified in ISBN shards by `executor`, and every completed shard is checkpointed.
+    """
+    key = stage_key(get_registry().variant(ZERO_SHOT_MODEL_NAME), EMBEDDING_MODEL_NAME, EMBEDDING_CONFIDENCE_THRESHOLD, FICTION_CATEGORIES)
+    rows = cache.rows("categories", key)
+
+    missing = books_df[books_df["simple_categories"].isna()]
+    if missing.empty:
+        print("No books are missing a category.")
+        return books_df
+    missing = missing[["isbn13", "description"]].assign(input_hash=missing["description"].astype(str).map(text_sha1))
+    cached, todo = rows.lookup(missing)
+    print(f"{len(cached)} cached category predictions, {len(todo)} books to classify.")
+
+    predictions = [cached]
+    if len(todo):
+        confident = predict_confident_categories(books_df, todo, vector_index).to_numpy()
+        probed = todo[["isbn13", "input_hash"]].assign(simple_categories=confident)[pd.notna(confident)]
+        rows.append(probed)
+        predictions.append(probed.drop(columns=["input_hash"]))
+
+        remaining = todo[pd.isna(confident)]
+        print(f"Zero-shot classifying {len(remaining)} books...")
+        log_event("zero_shot_books", cached=len(cached), probed=len(probed), classified=len(remaining))
+        zero_shot = executor.run(zero_shot_shard_task, remaining, on_result=rows.append, desc="zero-shot shards")
+        if len(zero_shot):
+            predictions.append(zero_shot.drop(columns=["input_hash"]))
+
+    predicted_df = pd.concat(predictions, ignore_index=True).drop_duplicates(subset="isbn13", keep="last")
+    predicted_df = predicted_df.rename(columns={"simple_categories": "predicted_categories"})
+    books_df = pd.merge(books_df, predicted_df, on="isbn13", how="left")
+    books_df["simple_categories"] = books_df["simple_categories"].fillna(books_df["predicted_categories"])
+    return books_df.drop(columns=["predicted_categories"])
+
+
+@pipeline_stage("emotions")
+def analyze_emotions_incremental(books_df: pd.DataFrame, cache: StageCache, executor: ShardedExecutor) -> pd.DataFrame:
+    """Scores emotions only for books without cached scores, in ISBN shards of at most EMOTION_CHECKPOINT_ROWS books.
+
+    Every completed shard is checkpointed, so an interrupted run resumes from the shards already finished.
+    """
+    rows = cache.rows("emotions", stage_key(get_registry().variant(EMOTION_MODEL_NAME), EMOTION_LABELS))
+
+    keyed = books_df[["isbn13", "description"]].assign(input_hash=books_df["description"].astype(str).map(text_sha1))
+    cached, todo = rows.lookup(keyed)
+    print(f"{len(cached)} books with cached emotion scores, {len(todo)} to score.")
+    log_event("emotion_books", cached=len(cached), scored=len(todo))
+
+    if len(todo):
+        executor.run(emotion_shard_task, todo, max_shard_rows=EMOTION_CHECKPOINT_ROWS, on_result=rows.append, desc="emotion shards")
+        rows.compact()
+        cached, _ = rows.lookup(keyed)
 
-def run_pipeline():
+    emotions_df = cached.drop_duplicates(subset="isbn13", keep="last")
+    return pd.merge(books_df.drop(columns=EMOTION_LABELS, errors="ignore"), emotions_df, on="isbn13")
+
+
+def run_pipeline(
+    force: bool = False,
+    workers: int = 1,
+    torch_threads: int = TORCH_THREADS_PER_WORKER,
+    quantize_models: bool = QUANTIZE_MODELS,
+    model_memory_mb: float | None = MODEL_MEMORY_BUDGET_MB,
+    metrics_log: Optional[str] = None,
+):
+    """Runs the pipeline, skipping stages whose inputs and configuration are unchanged.
+
+    Each stage is keyed by a hash of its inputs and configuration. Model stages keep per-ISBN results in `CACHE_DIR`, so only new or changed books are passed through the models, and an interrupted emotion run resumes from its last checkpoint.
+
+    Args:
+        force (bool, optional): Ignore stage keys and recompute every stage (per-ISBN model results are still reused). Defaults to False.
+        workers (int, optional): Worker processes for the zero-shot and emotion stages, each with its own model instances. 1 runs them in-process. Defaults to 1.
+        torch_threads (int, optional): Torch intra-op threads per worker process. Defaults to TORCH_THREADS_PER_WORKER.
+        quantize_models (bool, optional): Run the zero-shot and emotion models with dynamic int8 quantization on CPU; their results are cached separately from full-precision ones. Defaults to QUANTIZE_MODELS.
+        model_memory_mb (float | None, optional): Memory budget for the models loaded in this process; None means no limit. Defaults to MODEL_MEMORY_BUDGET_MB.
+        metrics_log (Optional[str], optional): File to append JSON events for every stage to ('-' for stderr). Defaults to None.
+    """
     print("Starting book recommender pipeline...")
+    configure_log(metrics_log)
+    registry = configure_models(quantize=quantize_models, memory_budget_mb=model_memory_mb)
+    started = time.perf_counter()
 
     input_path = "data/raw/books.csv"
-    output_path = "data/preprocessed/books_cleaned.csv"
+    output_path = VECTORSTORE_SOURCE_CSV
     description_txt = "data/preprocessed/tagged_descriptions.txt"
+    cats_path = 'data/preprocessed/books_with_cats.csv'
+    emotion_output_path = 'data/preprocessed/books_with_emotions.csv'
+
+    cache = StageCache(CACHE_DIR)
 
-    print("Cleaning dataset...")
-    cleaned_df = clean_books_dataset(input_path, output_path)
+    with pipeline_stage("clean"):
+        clean_key = stage_key(file_sha256(input_path), file_sha256(stream_clean_books_dataset.__code__.co_filename))
+        if not force and cache.is_fresh("clean", clean_key, [output_path]):
+            print("Cleaned dataset is up to date.")
+            cleaned_df = pd.read_csv(output_path)
+        else:
+            print("Cleaning dataset...")
+            stats = stream_clean_books_dataset(input_path, output_path, description_txt_path=description_txt)
+            print(f"Cleaned {stats['rows_read']} rows in {stats['seconds']:.1f}s ({stats['rows_per_second']:,.0f} rows/s).")
+            log_event("clean_rows", rows_read=stats["rows_read"], rows_written=stats["rows_written"], rows_per_second=round(stats["rows_per_second"]))
+            cleaned_df = pd.read_csv(output_path)
+            cache.mark("clean", clean_key)
 
     print(f"Dataset cleaned. {len(cleaned_df)} books ready.")
 
+    print("Building BM25 lexical index...")
+    with pipeline_stage("lexical_index"):
+        lexical_index = load_or_build_lexical_index(output_path, "lexical_index")
+    print(f"Lexical index ready with {len(lexical_index.vocabulary)} terms over {len(lexical_index)} books.")
+
     print("Building vectorstore...")
-    vector_db = build_vectorstore(
-        csv_path=output_path,
-        description_txt_path=description_txt,
-        persist_directory="chroma_db"
-    )
+    with pipeline_stage("vectorstore"):
+        vector_db = build_vectorstore(
+            csv_path=output_path,
+            description_txt_path=description_txt,
+            persist_directory="chroma_db"
+        )
     print("Vectorstore database created")
 
+    print("Exporting NumPy vector index...")
+    with pipeline_stage("numpy_index"):
+        vector_index = load_or_build_numpy_index(vector_db, "chroma_db", "vector_index")
+    print(f"NumPy index ready with {len(vector_index)} books.")
+
+    print("Quantizing vector index...")
+    with pipeline_stage("quantization_report"):
+        report = quantization_report(vector_index)
+    for mode in QUANTIZATION_MODES:
+        print(
+            f"{mode}: {report[mode]['compression']}x smaller than float32, "
+            f"recall@{report['top_k']} {report[mode]['recall_scan_only']} from the scan alone, "
+            f"{report[mode]['recall_rescored']} after rescoring."
+        )
+
+    print("Refreshing item-to-item neighbour table...")
+    with pipeline_stage("neighbors"):
+        neighbor_table = load_or_build_neighbor_table(vector_index, "neighbor_index")
+    print(f"Neighbour table ready with {neighbor_table.k} neighbours for each of {len(neighbor_table)} books.")
+
     print("Testing semantic search...")
     sample_query = "A magical school where students learn spells and secrets"
-    recs = retrieve_semantic_recommendations(sample_query, vector_db, cleaned_df, top_k=5)
+    with pipeline_stage("search_check"):
+        recs = retrieve_semantic_recommendations(sample_query, vector_index, cleaned_df, top_k=5)
     print(recs[['title_and_subtitle', 'average_rating']])
 
-    cleaned_df = map_categories(cleaned_df)
+    cleaned_hash = file_sha256(output_path)
+    categories_key = stage_key(
+        cleaned_hash, CATEGORY_MAPPING, registry.variant(ZERO_SHOT_MODEL_NAME), EMBEDDING_MODEL_NAME, EMBEDDING_CONFIDENCE_THRESHOLD,
+    )
+    emotions_key = stage_key(categories_key, registry.variant(EMOTION_MODEL_NAME))
+    categories_fresh = not force and cache.is_fresh("categories", categories_key, [cats_path])
+    emotions_fresh = not force and cache.is_fresh("emotions", emotions_key, [emotion_output_path])
 
-    print("Running zero-shot classification for missing categories...")
-    classifier = ZeroShotBookClassifier()
-    cleaned_df = classifier.fill_missing_categories(cleaned_df)
+    # Category filling and emotion scoring only share the cleaned descriptions. With worker processes they run
+    # concurrently, both feeding ISBN shards to the same pool; in-process they run one after the other, so the
+    # two models never compete for the same cores.
+    concurrent_stages = 2 if workers > 1 else 1
+    with ShardedExecutor(workers=workers, torch_threads=torch_threads, quantize_models=quantize_models) as executor, ThreadPoolExecutor(max_workers=concurrent_stages) as stages:
+        if categories_fresh:
+            print("Categories are up to date.")
+            categories_job = None
+        else:
+            print("Running zero-shot classification for missing categories...")
+            categories_job = stages.submit(fill_categories_incremental, map_categories(cleaned_df.copy()), vector_index, cache, executor)
 
-    cats_path = 'data/preprocessed/books_with_cats.csv'
-    cleaned_df.to_csv(cats_path, index=False)
+        if emotions_fresh:
+            print("Sentiment analysis is up to date.")
+            emotions_job = None
+        else:
+            print("Running sentiment analysis...")
+            emotions_job = stages.submit(analyze_emotions_incremental, cleaned_df[["isbn13", "description"]], cache, executor)
 
-    print("Running sentiment analysis...")
-    emotion_output_path = 'data/preprocessed/books_with_emotions.csv'
-    books_with_emotions = analyze_book_emotions(cleaned_df)
-    books_with_emotions.to_csv(emotion_output_path, index=False)
-    print("Sentiment analysis complete.")
+        if categories_job is not None:
+            books_with_cats = categories_job.result()
+            books_with_cats.to_csv(cats_path, index=False)
+            cache.mark("categories", categories_key)
+        else:
+            books_with_cats = pd.read_csv(cats_path)
+
+        if emotions_job is not None:
+            emotion_scores = emotions_job.result()[["isbn13"] + EMOTION_LABELS]
+            books_with_emotions = pd.merge(books_with_cats, emotion_scores, on="isbn13")
+            books_with_emotions.to_csv(emotion_output_path, index=False)
+            cache.mark("emotions", emotions_key)
+            print("Sentiment analysis complete.")
+
+    with pipeline_stage("book_store"):
+        store_key = stage_key(file_sha256(emotion_output_path))
+        if not force and cache.is_fresh("store", store_key, [BOOK_STORE_DIR]) and BookStore.exists(BOOK_STORE_DIR):
+            print("Book store is up to date.")
+        else:
+            print("Writing columnar book store...")
+            if emotions_job is None:
+                books_with_emotions = pd.read_csv(emotion_output_path)
+            store = BookStore.write(books_with_emotions, BOOK_STORE_DIR)
+            cache.mark("store", store_key)
+            print(f"Book store written to {BOOK_STORE_DIR} with {len(store)} books.")
+
+    # Models used by worker processes are loaded (and reported) there, not here.
+    for entry in registry.report():
+        print(
+            f"Model {entry['model']}: loaded in {entry['load_seconds']}s, +{entry['rss_mb']} MB resident"
+            f"{', int8' if entry['quantized'] else ''}, used {entry['uses']} times."
+        )
 
+    # With worker processes, categories and emotions run concurrently, so their times overlap.
+    timings = {h["labels"]["stage"]: h["sum"] for h in get_metrics().snapshot()["histograms"] if h["name"] == PIPELINE_STAGE_METRIC}
+    print("Stage timings: " + ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in timings.items()))
+    log_event("pipeline_completed", seconds=round(time.perf_counter() - started, 3), stages=timings)
     print("Pipeline completed successfully.")
 
 # if __name__ == "__main__":
-#     run_pipeline()
\ No newline at end of file
+#     run_pipeline()
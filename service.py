@@ -0,0 +1,124 @@
+import json
+from typing import Optional
+
+import typer
+
+from src.config import BOOK_STORE_DIR, DEFAULT_SHARDS, PROFILE_DIR, SLOW_REQUEST_MS, VECTORSTORE_SOURCE_CSV
+
+# Index, model and service modules are imported inside the commands, so `--help` and `load-test` start quickly.
+app = typer.Typer()
+
+input_path = "data/preprocessed/books_with_emotions.csv"
+description_txt = "data/preprocessed/tagged_descriptions.txt"
+VECTORSTORE_DIR = "chroma_db"
+NUMPY_INDEX_DIR = "vector_index"
+NEIGHBOR_INDEX_DIR = "neighbor_index"
+LEXICAL_INDEX_DIR = "lexical_index"
+SHARDED_INDEX_DIR = "vector_shards"
+
+LOAD_TEST_QUERIES = [
+    "A story about forgiveness",
+    "a young wizard learning magic",
+    "A book about time travel",
+    "A book about dinosaurs",
+    "A magical school where students learn spells and secrets",
+    "A detective solving a murder in a small village",
+    "The history of the Roman empire",
+    "A heartwarming story about a dog and his family",
+]
+
+
+@app.command()
+def serve(
+    host: str = typer.Option("127.0.0.1", help="Interface to bind"),
+    port: int = typer.Option(8000, help="Port to listen on"),
+    backend: str = typer.Option("numpy", help="Vector index backend: 'chroma', 'numpy', 'sharded', or the quantized 'int8' / 'float16'"),
+    shards: int = typer.Option(DEFAULT_SHARDS, help="Number of index shards for the 'sharded' backend"),
+    shard_scheme: str = typer.Option("hash", help="How the 'sharded' backend partitions ISBNs: 'hash' or 'range'"),
+    search_workers: int = typer.Option(DEFAULT_SHARDS, help="Worker processes searching shards for the 'sharded' backend"),
+    max_batch_size: int = typer.Option(32, help="Maximum queries embedded and searched together"),
+    max_wait_ms: float = typer.Option(5.0, help="How long the first query of a batch waits for others"),
+    cache: bool = typer.Option(True, help="Cache query embeddings and ranked results"),
+    hybrid: bool = typer.Option(True, help="Fuse BM25 matches with the semantic search when the lexical index exists"),
+    metrics_log: Optional[str] = typer.Option(None, help="Append JSON events (slow requests, profiles) to this file; '-' for stderr"),
+    slow_request_ms: float = typer.Option(SLOW_REQUEST_MS, help="Log requests slower than this with their per-stage breakdown"),
+    profile_slow_ms: Optional[float] = typer.Option(None, help="Profile batches with cProfile and keep the first one slower than this"),
+    profile_dir: str = typer.Option(PROFILE_DIR, help="Where profiles of slow batches are written"),
+):
+    """
+    Run the HTTP/JSON recommendation service with warm models and micro-batched queries.
+    """
+    import asyncio
+
+    from src.book_table import open_book_table
+    from src.cache import RetrievalCache
+    from src.lexical_index import LexicalIndex
+    from src.metrics import SlowRequestProfiler, configure_log
+    from src.models import get_registry
+    from src.neighbors import NeighborTable
+    from src.quantized_index import QUANTIZATION_MODES, load_or_build_quantized_index
+    from src.sharded_index import load_or_build_sharded_index
+    from src.service import RecommendationService, serve as serve_http
+    from src.vectorstore import load_or_build_vectorstore, load_or_build_numpy_index, open_current_numpy_index
+
+    configure_log(metrics_log)
+    print("Loading vectorstore and book table...")
+    numpy_backend = backend in ("numpy", "sharded") or backend in QUANTIZATION_MODES
+    index = open_current_numpy_index(VECTORSTORE_SOURCE_CSV, VECTORSTORE_DIR, NUMPY_INDEX_DIR) if numpy_backend else None
+    if index is None:
+        index = load_or_build_vectorstore(
+            csv_path=VECTORSTORE_SOURCE_CSV,
+            description_txt_path=description_txt,
+            persist_directory=VECTORSTORE_DIR
+        )
+        if numpy_backend:
+            index = load_or_build_numpy_index(index, VECTORSTORE_DIR, NUMPY_INDEX_DIR)
+    if backend in QUANTIZATION_MODES:
+        index = load_or_build_quantized_index(index, backend)
+    if backend == "sharded":
+        index = load_or_build_sharded_index(index, SHARDED_INDEX_DIR, n_shards=shards, scheme=shard_scheme, workers=search_workers)
+    books = open_book_table(BOOK_STORE_DIR, input_path)
+    neighbors = NeighborTable.load(NEIGHBOR_INDEX_DIR) if NeighborTable.read_manifest(NEIGHBOR_INDEX_DIR) else None
+    lexical = LexicalIndex.load(LEXICAL_INDEX_DIR) if hybrid and LexicalIndex.read_manifest(LEXICAL_INDEX_DIR) else None
+
+    service = RecommendationService(
+        index, books, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+        cache=RetrievalCache() if cache else None, neighbors=neighbors, lexical=lexical, slow_request_ms=slow_request_ms,
+        profiler=SlowRequestProfiler(profile_slow_ms, profile_dir) if profile_slow_ms is not None else None,
+    )
+    service.warm_up()
+    for entry in get_registry().report():
+        print(f"Model {entry['model']} loaded in {entry['load_seconds']}s, +{entry['rss_mb']} MB resident.")
+    try:
+        asyncio.run(serve_http(service, host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if hasattr(index, "close"):
+            index.close()
+
+
+@app.command()
+def load_test(
+    host: str = typer.Option("127.0.0.1", help="Service host"),
+    port: int = typer.Option(8000, help="Service port"),
+    requests: int = typer.Option(500, help="Total number of requests to send"),
+    concurrency: int = typer.Option(32, help="Requests in flight at once"),
+    top_k: int = typer.Option(10, help="Results requested per query"),
+):
+    """
+    Send concurrent requests to a running service and print throughput and latency as JSON.
+    """
+    import asyncio
+
+    from src.service import run_load_test
+
+    summary = asyncio.run(run_load_test(
+        LOAD_TEST_QUERIES, host=host, port=port,
+        total_requests=requests, concurrency=concurrency, top_k=top_k,
+    ))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    app()
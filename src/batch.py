@@ -0,0 +1,151 @@
+import csv
+import itertools
+import json
+import sys
+import time
+from typing import IO, Iterable, Iterator, Optional
+
+from src.book_table import BookTable
+from src.cache import RetrievalCache
+from src.lexical_index import LexicalIndex
+from src.retriever import retrieve_batch_recommendations, retrieve_hybrid_batch
+from src.service import BadRequest, parse_request, to_records
+
+# Queries embedded and searched together; peak memory grows with this (per-query filter masks are batch x books).
+BATCH_QUERIES = 256
+
+# CSV cells are strings; numbers are converted by `parse_request`, these fields need parsing first.
+_CSV_FIELDS = {
+    "category_contains": lambda value: value.strip().lower() in ("1", "true", "yes"),
+    "emotions": json.loads,
+}
+
+
+def _csv_record(row: dict) -> dict:
+    """Turns a CSV row into a request payload, dropping empty cells and parsing structured fields."""
+    record = {}
+    for name, value in row.items():
+        if name is None or value is None or value == "":
+            continue
+        convert = _CSV_FIELDS.get(name)
+        try:
+            record[name] = convert(value) if convert else value
+        except ValueError:
+            # Left as a string, so validation reports the bad field for this row only.
+            record[name] = value
+    return record
+
+
+def read_queries(path: str, stream: Optional[IO[str]] = None) -> Iterator[dict]:
+    """Lazily reads batch queries as request payloads, one per JSONL line or CSV row.
+
+    Args:
+        path (str): A .jsonl or .csv file; '-' reads JSONL from standard input, '-.csv' reads CSV from it.
+        stream (Optional[IO[str]]): Input to read instead of opening `path`; its format is still taken from `path`.
+
+    Yields:
+        dict: Payloads with a 'query' and the same optional fields as a service request, plus an optional 'id'.
+    """
+    is_csv = path.lower().endswith(".csv")
+    if stream is None and not path.startswith("-"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            yield from read_queries(path, f)
+        return
+
+    stream = stream if stream is not None else sys.stdin
+    if is_csv:
+        for row in csv.DictReader(stream):
+            yield _csv_record(row)
+        return
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as error:
+            yield {"id": f"line {line_number}", "error": f"Invalid JSON: {error.msg}"}
+
+
+def recommend_batch(
+    records: Iterable[dict],
+    index,
+    books: BookTable,
+    out: IO[str],
+    top_k: int = 5,
+    batch_size: int = BATCH_QUERIES,
+    lexical: Optional[LexicalIndex] = None,
+    cache: Optional[RetrievalCache] = None,
+    log: IO[str] = sys.stderr,
+) -> dict:
+    """Answers a stream of queries in batches, writing one JSON line per query as each batch completes.
+
+    Queries go through the same retriever and filters as the interactive `recommend` command; categories match as whole words unless a record sets 'category_contains' to false. Output lines follow the input order and hold the query's 'id' (its 1-based input position when missing), the 'query' and its ranked 'results', or an 'error' for invalid records and for queries whose retrieval failed. Only one batch is held in memory at a time.
+
+    Args:
+        records (Iterable[dict]): Request payloads, e.g. from `read_queries`.
+        index: Vector index to search (Chroma, NumPy, sharded or quantized).
+        books (BookTable): Book metadata.
+        out (IO[str]): Where the JSONL results are written; flushed after every batch.
+        top_k (int, optional): Results per query for records without a 'top_k'. Defaults to 5.
+        batch_size (int, optional): Queries embedded and searched together. Defaults to BATCH_QUERIES.
+        lexical (Optional[LexicalIndex]): BM25 index; when given, queries use hybrid retrieval.
+        cache (Optional[RetrievalCache]): Embedding and result cache shared across batches, useful for repeated queries.
+        log (IO[str], optional): Where progress is printed. Defaults to standard error, so results can go to standard output.
+
+    Returns:
+        dict: 'queries', 'errors', 'seconds' and 'queries_per_second'.
+    """
+    processed = errors = 0
+    start = time.perf_counter()
+    records = iter(records)
+
+    for batch in iter(lambda: list(itertools.islice(records, batch_size)), []):
+        lines: list = [None] * len(batch)
+        groups: dict[int, list] = {}
+        for i, record in enumerate(batch):
+            position = processed + i + 1
+            record_id = record.get("id", position) if isinstance(record, dict) else position
+            try:
+                if isinstance(record, dict):
+                    if "error" in record:
+                        raise BadRequest(record["error"])
+                    record = {"top_k": top_k, "category_contains": True, **record}
+                query, query_top_k, filters = parse_request(record)
+            except BadRequest as error:
+                lines[i] = {"id": record_id, "error": str(error)}
+                errors += 1
+                continue
+            groups.setdefault(query_top_k, []).append((i, record_id, query, filters))
+
+        # Queries with the same top_k share one embedding pass and one vectorized search.
+        for group_top_k, items in groups.items():
+            _, _, queries, filters = zip(*items)
+            try:
+                if lexical is not None:
+                    results = retrieve_hybrid_batch(list(queries), index, books, lexical, top_k=group_top_k, filters=list(filters), cache=cache)
+                else:
+                    results = retrieve_batch_recommendations(list(queries), index, books, top_k=group_top_k, filters=list(filters), cache=cache)
+            except Exception as error:
+                # Reported on the group's own lines, so the rest of the file is still answered.
+                print(f"Retrieval failed for {len(items)} queries: {error!r}", file=log)
+                for i, record_id, query, _ in items:
+                    lines[i] = {"id": record_id, "query": query, "error": f"Retrieval failed: {error}"}
+                errors += len(items)
+                continue
+            for (i, record_id, query, _), recs in zip(items, results):
+                lines[i] = {"id": record_id, "query": query, "results": to_records(recs)}
+
+        out.write("".join(json.dumps(line) + "\n" for line in lines))
+        out.flush()
+        processed += len(batch)
+        elapsed = time.perf_counter() - start
+        print(f"Processed {processed} queries ({processed / max(elapsed, 1e-9):,.1f} queries/s), {errors} errors.", file=log)
+
+    seconds = time.perf_counter() - start
+    return {
+        "queries": processed,
+        "errors": errors,
+        "seconds": seconds,
+        "queries_per_second": processed / max(seconds, 1e-9),
+    }
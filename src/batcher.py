@@ -0,0 +1,86 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Sequence
+
+
+class _Failed:
+    """Marks an item whose processing raised `error`."""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+class MicroBatcher:
+    """Collects concurrent asyncio requests for a short window and processes them as one batch.
+
+    The first request of a batch opens a window of `max_wait_ms`; every request arriving before it closes (up to `max_batch_size`) joins the batch. `process_batch` runs on a single worker thread, so the event loop keeps accepting requests while a batch is being computed and model calls are never made concurrently. If a batch fails, its items are retried one at a time, so an error reaches only the requests that cause it.
+    """
+
+    def __init__(self, process_batch: Callable[[Sequence[Any]], Sequence[Any]], max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro-batcher")
+
+    async def submit(self, item: Any) -> Any:
+        """Queues one item and waits for its result from the batch it ends up in."""
+        loop = asyncio.get_running_loop()
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+        future = loop.create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self._executor, self.process_batch, items)
+            except Exception as e:
+                if len(batch) == 1:
+                    results = [_Failed(e)]
+                else:
+                    # Retry the items one at a time, so only the request that caused the failure receives it.
+                    results = await loop.run_in_executor(self._executor, self._process_each, items)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, _Failed):
+                    future.set_exception(result.error)
+                else:
+                    future.set_result(result)
+
+    def _process_each(self, items: Sequence[Any]) -> list:
+        results = []
+        for item in items:
+            try:
+                results.append(self.process_batch([item])[0])
+            except Exception as e:
+                results.append(_Failed(e))
+        return results
+
+    def close(self) -> None:
+        """Stops the batching task and the worker thread."""
+        if self._worker is not None:
+            self._worker.cancel()
+        self._executor.shutdown(wait=False)
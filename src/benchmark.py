@@ -0,0 +1,280 @@
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.book_table import BookTable
+from src.category_mapper import map_categories
+from src.classifier import ZeroShotBookClassifier
+from src.filters import RecommendationFilter
+from src.lexical_index import LexicalIndex
+from src.preprocessing import clean_books_dataset, stream_clean_books_dataset
+from src.reranking import RERANK_BUDGET_MS, RERANK_CANDIDATES, EmotionPreference, rerank_by_emotion
+from src.retriever import retrieve_batch_recommendations, retrieve_semantic_recommendations
+from src.sentiment.analyzer import analyze_book_emotions, split_sentences
+from src.synthetic import (
+    EMBEDDING_DIM, HashingEmbedding, StubEmotionClassifier, StubZeroShotPipeline,
+    synthetic_emotions, synthetic_queries, write_catalog,
+)
+from src.vector_index import NumpyVectorIndex
+
+BENCHMARK_SIZES = (7_000, 100_000, 1_000_000)
+
+# Queries timed one at a time for the single-query and filtered latency percentiles.
+LATENCY_QUERIES = 200
+WARMUP_QUERIES = 5
+# Queries per call for the batched retrieval benchmark.
+RETRIEVAL_BATCH = 32
+RETRIEVAL_BATCHES = 20
+# Books passed through the emotion and zero-shot stages; their throughput does not depend on catalog size.
+MODEL_SAMPLE_BOOKS = 2_000
+
+# Descriptions embedded per block while building the index.
+EMBED_BLOCK_ROWS = 20_000
+
+# Filters for the filtered-retrieval benchmark: a common category, and a selective combination.
+BENCHMARK_FILTERS = {
+    "category": RecommendationFilter.build(category="Fiction", category_contains=True),
+    "category_emotion_rating": RecommendationFilter.build(
+        category="Fiction", category_contains=True, emotions={"joy": 0.3}, min_rating=3.5,
+    ),
+}
+
+# Preference for the re-ranking benchmark: "mostly joy, a bit of surprise".
+BENCHMARK_PREFERENCE = EmotionPreference.build(emotions={"joy": 0.8, "surprise": 0.2})
+# Candidate-set sizes re-ranked on their own, against RERANK_BUDGET_MS.
+RERANK_SIZES = (RERANK_CANDIDATES, 5_000)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def latency_summary(samples_ms: Sequence[float]) -> dict:
+    """Summarizes latencies in milliseconds as count, mean, p50, p99 and max."""
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "count": int(len(samples)),
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "max_ms": round(float(samples.max()), 3),
+    }
+
+
+def timed(fn: Callable, *args, **kwargs) -> tuple[object, float]:
+    """Calls `fn` and returns its result and the elapsed wall time in seconds."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def time_each(fn: Callable, items: Sequence, warmup: int = WARMUP_QUERIES) -> list[float]:
+    """Calls `fn` on every item after `warmup` untimed calls, returning per-call latencies in milliseconds."""
+    for item in items[:warmup]:
+        fn(item)
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def environment() -> dict:
+    """Describes the machine and commit a run was made on, so result files can be compared."""
+    def git(*args: str) -> Optional[str]:
+        try:
+            return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def benchmark_catalog(n_books: int, work_dir: str, seed: int = 0, dim: int = EMBEDDING_DIM) -> tuple[dict, pd.DataFrame]:
+    """Benchmarks cleaning, index builds and retrieval on a synthetic catalog of `n_books` raw rows.
+
+    Args:
+        n_books (int): Raw catalog size; about three quarters of the rows survive cleaning.
+        work_dir (str): Directory for the generated CSVs and indexes.
+        seed (int, optional): Catalog and query seed. Defaults to 0.
+        dim (int, optional): Embedding dimension of the stand-in model. Defaults to EMBEDDING_DIM.
+
+    Returns:
+        tuple[dict, pd.DataFrame]: The results, and the cleaned books (reused for the model benchmarks).
+    """
+    directory = os.path.join(work_dir, f"catalog_{n_books}")
+    raw_path = os.path.join(directory, "books.csv")
+    cleaned_path = os.path.join(directory, "books_cleaned.csv")
+    results: dict = {"raw_books": n_books}
+
+    print(f"[{n_books}] Generating synthetic catalog...")
+    _, seconds = timed(write_catalog, raw_path, n_books, seed)
+    results["generate_seconds"] = round(seconds, 3)
+
+    print(f"[{n_books}] Cleaning...")
+    books, seconds = timed(clean_books_dataset, raw_path)
+    results["clean"] = {"seconds": round(seconds, 3), "rows_per_second": round(n_books / seconds), "books": len(books)}
+    stats = stream_clean_books_dataset(raw_path, cleaned_path)
+    results["stream_clean"] = {"seconds": round(stats["seconds"], 3), "rows_per_second": round(stats["rows_per_second"])}
+
+    books = map_categories(books.drop_duplicates(subset="isbn13", keep="last"))
+    books = books.merge(synthetic_emotions(books["isbn13"].to_numpy(), seed), on="isbn13")
+    table = BookTable(books)
+
+    print(f"[{n_books}] Building indexes...")
+    embedding = HashingEmbedding(dim)
+    descriptions = table.frame["tagged_description"].tolist()
+    start = time.perf_counter()
+    vectors = np.concatenate([
+        embedding.embed_documents(descriptions[i:i + EMBED_BLOCK_ROWS]) for i in range(0, len(descriptions), EMBED_BLOCK_ROWS)
+    ])
+    embed_seconds = time.perf_counter() - start
+    index, build_seconds = timed(NumpyVectorIndex.build, os.path.join(directory, "vector_index"), vectors, table.isbns, embedding=embedding)
+    del vectors
+    _, lexical_seconds = timed(LexicalIndex.from_books, table.frame)
+    results["index_build"] = {
+        "embed_seconds": round(embed_seconds, 3),
+        "numpy_index_seconds": round(build_seconds, 3),
+        "lexical_index_seconds": round(lexical_seconds, 3),
+        "index_bytes": int(index.embeddings.nbytes),
+    }
+
+    print(f"[{n_books}] Timing retrieval...")
+    queries = synthetic_queries(max(LATENCY_QUERIES, RETRIEVAL_BATCH * RETRIEVAL_BATCHES), seed)
+    results["single_query"] = latency_summary(time_each(
+        lambda q: retrieve_semantic_recommendations(q, index, table, top_k=10), queries[:LATENCY_QUERIES],
+    ))
+
+    batches = [queries[i * RETRIEVAL_BATCH:(i + 1) * RETRIEVAL_BATCH] for i in range(RETRIEVAL_BATCHES)]
+    batch_latency = latency_summary(time_each(
+        lambda batch: retrieve_batch_recommendations(batch, index, table, top_k=10), batches, warmup=1,
+    ))
+    batch_latency["batch_size"] = RETRIEVAL_BATCH
+    batch_latency["queries_per_second"] = round(RETRIEVAL_BATCH * 1000 / batch_latency["mean_ms"], 1)
+    results["batched_query"] = batch_latency
+
+    results["filtered_query"] = {}
+    for name, query_filter in BENCHMARK_FILTERS.items():
+        summary = latency_summary(time_each(
+            lambda q: retrieve_semantic_recommendations(q, index, table, top_k=10, filters=query_filter), queries[:LATENCY_QUERIES],
+        ))
+        summary["selectivity"] = round(float(table.filter_mask(query_filter).mean()), 4)
+        results["filtered_query"][name] = summary
+
+    results["emotion_query"] = latency_summary(time_each(
+        lambda q: retrieve_semantic_recommendations(q, index, table, top_k=10, preference=BENCHMARK_PREFERENCE), queries[:LATENCY_QUERIES],
+    ))
+    results["rerank"] = {}
+    for size in RERANK_SIZES:
+        candidates = [index.search_vectors(embedding.embed_query(q)[None, :], top_k=size)[0] for q in queries[:20]]
+        summary = latency_summary(time_each(
+            lambda hit: rerank_by_emotion(table, hit[0], hit[1], BENCHMARK_PREFERENCE, 10), candidates * 5,
+        ))
+        summary["within_budget"] = summary["p99_ms"] <= RERANK_BUDGET_MS
+        results["rerank"][str(size)] = summary
+
+    return results, books
+
+
+def benchmark_models(books: pd.DataFrame, sample_books: int = MODEL_SAMPLE_BOOKS, real_models: bool = False) -> dict:
+    """Measures emotion-scoring and zero-shot throughput on a sample of books.
+
+    With the default offline stand-ins, this measures the code around the models (sentence splitting, batching, aggregation); pass `real_models` to load the Hugging Face models through the model registry instead.
+
+    Args:
+        books (pd.DataFrame): Cleaned books with 'isbn13' and 'description'.
+        sample_books (int, optional): Books to score. Defaults to MODEL_SAMPLE_BOOKS.
+        real_models (bool, optional): Use the real emotion and zero-shot models (needs the model weights). Defaults to False.
+
+    Returns:
+        dict: Books per second and sentences per second for 'emotion', books per second for 'zero_shot'.
+    """
+    sample = books[["isbn13", "description"]].head(sample_books)
+    if real_models:
+        from src.sentiment.config import get_emotion_classifier
+        emotion_classifier, zero_shot = get_emotion_classifier(), ZeroShotBookClassifier()
+    else:
+        emotion_classifier, zero_shot = StubEmotionClassifier(), ZeroShotBookClassifier(pipe=StubZeroShotPipeline())
+
+    print(f"Scoring emotions for {len(sample)} books...")
+    sentences = sum(len(split_sentences(d)) for d in sample["description"])
+    _, emotion_seconds = timed(analyze_book_emotions, sample, classifier=emotion_classifier)
+    print(f"Zero-shot classifying {len(sample)} books...")
+    _, zero_shot_seconds = timed(zero_shot.predict_categories, sample["description"].tolist())
+
+    return {
+        "models": "real" if real_models else "stub",
+        "sample_books": len(sample),
+        "emotion": {
+            "seconds": round(emotion_seconds, 3),
+            "books_per_second": round(len(sample) / emotion_seconds, 1),
+            "sentences_per_second": round(sentences / emotion_seconds, 1),
+        },
+        "zero_shot": {
+            "seconds": round(zero_shot_seconds, 3),
+            "books_per_second": round(len(sample) / zero_shot_seconds, 1),
+        },
+    }
+
+
+def run_benchmarks(
+    sizes: Sequence[int] = BENCHMARK_SIZES,
+    work_dir: str = "benchmarks/work",
+    seed: int = 0,
+    dim: int = EMBEDDING_DIM,
+    sample_books: int = MODEL_SAMPLE_BOOKS,
+    real_models: bool = False,
+) -> dict:
+    """Runs the whole suite and returns the results as a JSON-serializable dict.
+
+    Args:
+        sizes (Sequence[int], optional): Raw catalog sizes to benchmark. Defaults to BENCHMARK_SIZES.
+        work_dir (str, optional): Directory for generated catalogs and indexes. Defaults to 'benchmarks/work'.
+        seed (int, optional): Seed for catalogs and queries; equal seeds give identical inputs. Defaults to 0.
+        dim (int, optional): Embedding dimension of the stand-in model. Defaults to EMBEDDING_DIM.
+        sample_books (int, optional): Books used for the model throughput benchmarks. Defaults to MODEL_SAMPLE_BOOKS.
+        real_models (bool, optional): Benchmark the real Hugging Face models instead of the offline stand-ins. Defaults to False.
+
+    Returns:
+        dict: 'environment', 'config', per-size 'catalogs' and 'models' results.
+    """
+    results = {
+        "environment": environment(),
+        "config": {"sizes": list(sizes), "seed": seed, "dim": dim, "latency_queries": LATENCY_QUERIES},
+        "catalogs": {},
+    }
+    model_books = None
+    for n_books in sizes:
+        results["catalogs"][str(n_books)], books = benchmark_catalog(n_books, work_dir, seed=seed, dim=dim)
+        if model_books is None:
+            model_books = books
+    if model_books is not None:
+        results["models"] = benchmark_models(model_books, sample_books=sample_books, real_models=real_models)
+    return results
+
+
+def compare_results(old: dict, new: dict, prefix: str = "") -> list[tuple[str, float, float]]:
+    """Pairs up the numeric results two runs have in common, as (path, old value, new value)."""
+    pairs = []
+    for key in old.keys() & new.keys():
+        path = f"{prefix}.{key}" if prefix else key
+        a, b = old[key], new[key]
+        if isinstance(a, dict) and isinstance(b, dict):
+            pairs.extend(compare_results(a, b, path))
+        elif isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool):
+            pairs.append((path, a, b))
+    return sorted(pairs)
@@ -0,0 +1,236 @@
+import json
+import os
+import shutil
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+BOOK_STORE_SCHEMA = "schema.json"
+
+# File in the store directory naming the version subdirectory readers open; replaced atomically by each write.
+BOOK_STORE_POINTER = "CURRENT"
+BOOK_STORE_VERSION_PREFIX = "version-"
+
+# Low-cardinality text columns stored as int32 codes plus a category list.
+CATEGORICAL_COLUMNS = ("categories", "simple_categories")
+
+# Columns rebuilt from other columns on read instead of being stored twice.
+DERIVED_COLUMNS = ("tagged_description",)
+
+
+def _infer_kind(name: str, values: pd.Series) -> str:
+    if name == "isbn13":
+        return "int64"
+    if name in CATEGORICAL_COLUMNS:
+        return "category"
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_integer_dtype(values):
+        return "int64"
+    if pd.api.types.is_float_dtype(values):
+        return "float32"
+    return "string"
+
+
+def _save_array(directory: str, name: str, array: np.ndarray) -> None:
+    # Write then rename, so processes that still memory-map the old files keep a valid mapping.
+    tmp_path = os.path.join(directory, f"{name}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, os.path.join(directory, name))
+
+
+def _column_files(column: dict) -> list[str]:
+    kind = column["kind"]
+    if kind in ("int64", "float32"):
+        return [f"{column['name']}.npy"]
+    if kind == "category":
+        return [f"{column['name']}.codes.npy"]
+    if kind == "string":
+        return [f"{column['name']}.{part}.npy" for part in ("bytes", "offsets", "nulls")]
+    return []
+
+
+def _current_version(directory: str) -> str:
+    """Directory holding the store's current version; stores written before versioning keep their files in `directory` itself."""
+    pointer = os.path.join(directory, BOOK_STORE_POINTER)
+    if not os.path.exists(pointer):
+        return directory
+    with open(pointer, "r", encoding="utf-8") as f:
+        return os.path.join(directory, f.read().strip())
+
+
+def _encode_strings(values: pd.Series) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    nulls = values.isna().to_numpy()
+    encoded = [b"" if null else str(value).encode("utf-8") for value, null in zip(values, nulls)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return blob, offsets, nulls
+
+
+class BookStore:
+    """Typed, columnar on-disk copy of the book catalog.
+
+    Every column is its own `.npy` file under `directory`, described by a schema file: int64 ISBNs (rows sorted by ISBN), float32 numeric columns, int32 codes for categorical columns and UTF-8 byte blobs with int64 offsets for text. Columns are memory-mapped, so readers only page in the columns they use and processes opening the same store share those pages. Text is decoded only for the rows that are read.
+
+    Each write goes to a new version subdirectory and then atomically replaces the `CURRENT` pointer, keeping the previous version on disk. A store maps every column file of the version current when it is opened, so a long-running reader keeps reading one consistent snapshot while the pipeline rewrites the store.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.version_directory = _current_version(directory)
+        with open(os.path.join(self.version_directory, BOOK_STORE_SCHEMA), "r", encoding="utf-8") as f:
+            self.schema = json.load(f)
+        self._kinds = {column["name"]: column["kind"] for column in self.schema["columns"]}
+        self._arrays: dict[str, np.ndarray] = {
+            filename: np.load(os.path.join(self.version_directory, filename), mmap_mode="r")
+            for column in self.schema["columns"]
+            for filename in _column_files(column)
+        }
+
+    @classmethod
+    def write(cls, books_df: pd.DataFrame, directory: str) -> "BookStore":
+        """Writes a book DataFrame (e.g. books_with_emotions) as a columnar store and opens it.
+
+        Args:
+            books_df (pd.DataFrame): Books to store; must contain 'isbn13'. Duplicate ISBNs keep their last row.
+            directory (str): Store directory; the column files go to a new version subdirectory of it.
+
+        Returns:
+            BookStore: The persisted store.
+        """
+        os.makedirs(directory, exist_ok=True)
+        version = f"{BOOK_STORE_VERSION_PREFIX}{time.time_ns()}"
+        version_directory = os.path.join(directory, version)
+        os.makedirs(version_directory)
+        books = books_df.drop_duplicates(subset="isbn13", keep="last")
+        books = books.sort_values("isbn13", kind="stable").reset_index(drop=True)
+
+        columns = []
+        for name in books.columns:
+            if name in DERIVED_COLUMNS:
+                columns.append({"name": name, "kind": "derived"})
+                continue
+            kind = _infer_kind(name, books[name])
+            column = {"name": name, "kind": kind}
+            if kind == "int64":
+                _save_array(version_directory, f"{name}.npy", books[name].to_numpy(dtype=np.int64))
+            elif kind == "float32":
+                _save_array(version_directory, f"{name}.npy", books[name].to_numpy(dtype=np.float32))
+            elif kind == "category":
+                values = pd.Categorical(books[name])
+                _save_array(version_directory, f"{name}.codes.npy", values.codes.astype(np.int32))
+                column["categories"] = [str(category) for category in values.categories]
+            else:
+                blob, offsets, nulls = _encode_strings(books[name])
+                _save_array(version_directory, f"{name}.bytes.npy", blob)
+                _save_array(version_directory, f"{name}.offsets.npy", offsets)
+                _save_array(version_directory, f"{name}.nulls.npy", nulls)
+            columns.append(column)
+
+        with open(os.path.join(version_directory, BOOK_STORE_SCHEMA), "w", encoding="utf-8") as f:
+            json.dump({"count": int(len(books)), "columns": columns}, f, indent=2)
+
+        # The pointer is replaced last, so readers only ever open a complete version.
+        previous = os.path.basename(_current_version(directory))
+        tmp_path = os.path.join(directory, f"{BOOK_STORE_POINTER}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(directory, BOOK_STORE_POINTER))
+        cls._prune(directory, keep={version, previous})
+
+        return cls(directory)
+
+    @staticmethod
+    def _prune(directory: str, keep: set) -> None:
+        """Removes versions other than `keep`, and the column files of a store written before versioning.
+
+        Readers map a version's files when they open it, so removing a version they still use is safe.
+        """
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name in keep:
+                continue
+            if name.startswith(BOOK_STORE_VERSION_PREFIX) and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif name == BOOK_STORE_SCHEMA or name.endswith(".npy"):
+                os.remove(path)
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        """True when `directory` holds a complete store."""
+        return os.path.exists(os.path.join(_current_version(directory), BOOK_STORE_SCHEMA))
+
+    def __len__(self) -> int:
+        return self.schema["count"]
+
+    @property
+    def columns(self) -> list[str]:
+        """Column names in their original order, including derived ones."""
+        return [column["name"] for column in self.schema["columns"]]
+
+    def kind(self, name: str) -> str:
+        """Storage kind of a column: 'int64', 'float32', 'category', 'string' or 'derived'."""
+        if name not in self._kinds:
+            raise KeyError(f"Unknown column '{name}'")
+        return self._kinds[name]
+
+    def _load(self, filename: str) -> np.ndarray:
+        return self._arrays[filename]
+
+    def array(self, name: str) -> np.ndarray:
+        """Returns the memory-mapped values of a numeric column, or the int32 codes (-1 for missing) of a categorical one."""
+        kind = self.kind(name)
+        if kind in ("int64", "float32"):
+            return self._load(f"{name}.npy")
+        if kind == "category":
+            return self._load(f"{name}.codes.npy")
+        raise TypeError(f"Column '{name}' is stored as {kind}, not as an array")
+
+    def categories(self, name: str) -> list[str]:
+        """Category labels of a categorical column, indexed by code."""
+        for column in self.schema["columns"]:
+            if column["name"] == name and column["kind"] == "category":
+                return column["categories"]
+        raise TypeError(f"Column '{name}' is not categorical")
+
+    def strings(self, name: str, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Decodes a text column (or only the rows at `positions`) into an object array, with None for missing values."""
+        blob = self._load(f"{name}.bytes.npy")
+        offsets = self._load(f"{name}.offsets.npy")
+        nulls = self._load(f"{name}.nulls.npy")
+        rows = np.arange(len(self)) if positions is None else np.asarray(positions, dtype=np.int64)
+        values = np.empty(len(rows), dtype=object)
+        for i, row in enumerate(rows):
+            values[i] = None if nulls[row] else bytes(blob[offsets[row]:offsets[row + 1]]).decode("utf-8")
+        return values
+
+    def column(self, name: str, positions: Optional[np.ndarray] = None):
+        """Reads one column (or only the rows at `positions`) in its pandas-facing form."""
+        kind = self.kind(name)
+        if kind == "string":
+            return self.strings(name, positions)
+        if kind == "derived":
+            # tagged_description is the ISBN followed by the description, as built by the preprocessing step.
+            isbns = self.column("isbn13", positions)
+            descriptions = self.strings("description", positions)
+            return np.array([f"{isbn} {description}" for isbn, description in zip(isbns, descriptions)], dtype=object)
+        values = self.array(name)
+        values = np.array(values if positions is None else values[np.asarray(positions, dtype=np.int64)])
+        if kind == "category":
+            return pd.Categorical.from_codes(values, categories=self.categories(name))
+        return values
+
+    def read(self, columns: Optional[Sequence[str]] = None, positions: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Materializes selected columns and rows as a DataFrame.
+
+        Args:
+            columns (Optional[Sequence[str]]): Columns to read; all columns if None.
+            positions (Optional[np.ndarray]): Row positions to read, in the order given; all rows if None.
+
+        Returns:
+            pd.DataFrame: The requested slice of the catalog, sorted by ISBN when `positions` is None.
+        """
+        names = self.columns if columns is None else list(columns)
+        return pd.DataFrame({name: self.column(name, positions) for name in names})
@@ -0,0 +1,180 @@
+import re
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.book_store import BookStore
+from src.filters import RecommendationFilter
+
+# Index-to-table row alignments kept per table: typically one vector index and one lexical index.
+ALIGNMENT_CACHE_SIZE = 2
+
+
+class BookTable:
+    """Book metadata keyed by ISBN-13 for O(k) lookups of search hits.
+
+    The DataFrame is sorted by `isbn13` once at construction, so a batch of hits is resolved with a binary search over a contiguous int64 array and gathered positionally, in the order the hits were given. A table opened from a `BookStore` reads its ISBN, category and numeric columns straight from the memory-mapped column files and decodes text only for the rows it returns.
+    """
+
+    def __init__(self, books: "pd.DataFrame | BookStore"):
+        self._frame: Optional[pd.DataFrame] = None
+        self._numeric_columns: dict[str, np.ndarray] = {}
+        self._alignments: list[tuple[np.ndarray, np.ndarray]] = []
+
+        # Per-category masks are precomputed; numeric columns are materialized on first use.
+        self._category_masks: dict[str, np.ndarray] = {}
+        if isinstance(books, BookStore):
+            self.store: Optional[BookStore] = books
+            self.isbns = books.array("isbn13")
+            if "simple_categories" in books.columns:
+                codes = books.array("simple_categories")
+                for code, category in enumerate(books.categories("simple_categories")):
+                    self._category_masks[category] = codes == code
+        else:
+            self.store = None
+            books = books.drop_duplicates(subset="isbn13", keep="last")
+            self._frame = books.sort_values("isbn13", kind="stable").reset_index(drop=True)
+            self.isbns = self._frame["isbn13"].to_numpy(dtype=np.int64)
+            if "simple_categories" in self._frame.columns:
+                categories = self._frame["simple_categories"]
+                for category in categories.dropna().unique():
+                    self._category_masks[str(category)] = (categories == category).to_numpy()
+
+    @classmethod
+    def from_csv(cls, csv_path: str) -> "BookTable":
+        """Loads a book CSV (e.g. books_with_emotions.csv) into an ISBN-keyed table."""
+        return cls(pd.read_csv(csv_path))
+
+    @classmethod
+    def from_store(cls, directory: str) -> "BookTable":
+        """Opens a columnar book store written by `BookStore.write` without reading the text columns."""
+        return cls(BookStore(directory))
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """All books as a DataFrame sorted by ISBN; read from the store in full on first access."""
+        if self._frame is None:
+            self._frame = self.store.read()
+        return self._frame
+
+    def __len__(self) -> int:
+        return len(self.isbns)
+
+    def positions(self, isbns: Sequence[int]) -> np.ndarray:
+        """Maps ISBNs to row positions in `frame`, with -1 for ISBNs that are not in the table."""
+        isbns = np.asarray(isbns, dtype=np.int64)
+        if len(self.isbns) == 0:
+            return np.full(len(isbns), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.isbns, isbns), len(self.isbns) - 1)
+        return np.where(self.isbns[positions] == isbns, positions, -1)
+
+    def take(self, isbns: Sequence[int], scores: Optional[Sequence[float]] = None) -> pd.DataFrame:
+        """Gathers the rows for ranked search hits, preserving their order.
+
+        Args:
+            isbns (Sequence[int]): ISBNs in rank order, best first.
+            scores (Optional[Sequence[float]]): Similarity score of each hit, aligned with `isbns`.
+
+        Returns:
+            pd.DataFrame: One row per hit found in the table, with added 'similarity' and 'rank' (1-based) columns.
+        """
+        positions = self.positions(isbns)
+        found = positions >= 0
+        if self.store is not None and self._frame is None:
+            recs = self.store.read(positions=positions[found])
+        else:
+            recs = self.frame.iloc[positions[found]].reset_index(drop=True)
+        if scores is not None:
+            recs["similarity"] = np.asarray(scores, dtype=np.float32)[found]
+        recs["rank"] = np.arange(1, len(recs) + 1)
+        return recs
+
+    def numeric_column(self, name: str) -> np.ndarray:
+        """Returns a column as a cached float32 array aligned with `frame` (NaN for missing values)."""
+        if name not in self._numeric_columns:
+            if self.store is not None:
+                if self.store.kind(name) == "float32":
+                    values = self.store.array(name)
+                else:
+                    values = pd.to_numeric(pd.Series(self.store.column(name)), errors="coerce").to_numpy(dtype=np.float32)
+            elif name in self.frame.columns:
+                values = pd.to_numeric(self.frame[name], errors="coerce").to_numpy(dtype=np.float32)
+            else:
+                raise KeyError(f"Unknown column '{name}'")
+            self._numeric_columns[name] = values
+        return self._numeric_columns[name]
+
+    @property
+    def categories(self) -> list[str]:
+        """Sorted distinct `simple_categories` values."""
+        return sorted(self._category_masks)
+
+    def category_mask(self, category: str, contains: bool = False) -> np.ndarray:
+        """Rows whose category equals `category`, or contains it as a whole word (case-insensitive) when `contains` is set."""
+        mask = np.zeros(len(self), dtype=bool)
+        pattern = re.compile(rf"\b{re.escape(category)}\b", re.IGNORECASE)
+        for name, category_mask in self._category_masks.items():
+            if pattern.search(name) if contains else (name == category):
+                mask |= category_mask
+        return mask
+
+    def filter_mask(self, filters: Optional[RecommendationFilter]) -> Optional[np.ndarray]:
+        """Evaluates a filter over all rows of the table.
+
+        Args:
+            filters (Optional[RecommendationFilter]): Predicates to apply.
+
+        Returns:
+            Optional[np.ndarray]: Boolean mask aligned with `frame`, or None when nothing is filtered.
+        """
+        if filters is None or filters.is_empty():
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        if filters.category is not None:
+            mask &= self.category_mask(filters.category, filters.category_contains)
+        for emotion, threshold in filters.emotions:
+            mask &= self.numeric_column(emotion) >= threshold
+        if filters.min_rating is not None:
+            mask &= self.numeric_column("average_rating") >= filters.min_rating
+        if filters.min_pages is not None:
+            mask &= self.numeric_column("num_pages") >= filters.min_pages
+        if filters.max_pages is not None:
+            mask &= self.numeric_column("num_pages") <= filters.max_pages
+        return mask
+
+    def index_mask(self, index_isbns: np.ndarray, filters: Optional[RecommendationFilter]) -> Optional[np.ndarray]:
+        """Evaluates a filter for the rows of a vector index, so it can be applied before top-k selection.
+
+        The mapping from index rows to table rows is computed once per index (vector or lexical) and reused; the last ALIGNMENT_CACHE_SIZE mappings are kept. Index rows without metadata in the table never match a non-empty filter.
+
+        Args:
+            index_isbns (np.ndarray): ISBN of each row of the vector index.
+            filters (Optional[RecommendationFilter]): Predicates to apply.
+
+        Returns:
+            Optional[np.ndarray]: Boolean mask aligned with `index_isbns`, or None when nothing is filtered.
+        """
+        mask = self.filter_mask(filters)
+        if mask is None:
+            return None
+        positions = next((positions for isbns, positions in self._alignments if isbns is index_isbns), None)
+        if positions is None:
+            positions = self.positions(index_isbns)
+            # Most recent first; older alignments are dropped so ISBN arrays of replaced indexes are not kept alive.
+            self._alignments = [(index_isbns, positions)] + self._alignments[:ALIGNMENT_CACHE_SIZE - 1]
+        return (positions >= 0) & mask[positions]
+
+
+def as_book_table(books: "BookTable | pd.DataFrame") -> BookTable:
+    """Returns `books` unchanged if it is already a BookTable, otherwise indexes the DataFrame by ISBN."""
+    if isinstance(books, BookTable):
+        return books
+    return BookTable(books)
+
+
+def open_book_table(store_directory: str, csv_path: str) -> BookTable:
+    """Opens the columnar book store if the pipeline has written one, otherwise loads the CSV."""
+    if BookStore.exists(store_directory):
+        return BookTable.from_store(store_directory)
+    return BookTable.from_csv(csv_path)
@@ -0,0 +1,148 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import numpy as np
+
+from src.filters import RecommendationFilter
+
+EMBEDDING_CACHE_ENTRIES = 10_000
+EMBEDDING_CACHE_BYTES = 64 << 20
+RESULT_CACHE_ENTRIES = 50_000
+RESULT_CACHE_BYTES = 64 << 20
+RESULT_CACHE_TTL_SECONDS = 3600.0
+
+
+def normalize_query(query: str) -> str:
+    """Canonicalizes a query for cache lookups: case-folded, with whitespace collapsed."""
+    return re.sub(r"\s+", " ", query).strip().casefold()
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and approximate byte size, with an optional TTL."""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries: OrderedDict[Hashable, tuple[Any, int, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns the cached value and marks it most recently used, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None and time.monotonic() - entry[2] > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int) -> None:
+        """Stores a value of roughly `nbytes`, evicting least recently used entries to stay within bounds."""
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, nbytes, time.monotonic())
+            self.nbytes += nbytes
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> None:
+        _, nbytes, _ = self._entries.pop(key)
+        self.nbytes -= nbytes
+
+    def clear(self) -> None:
+        """Drops every entry; hit and miss counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict:
+        """Returns hit/miss/eviction counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class RetrievalCache:
+    """Caches query embeddings and ranked search hits in front of the retriever.
+
+    Query embeddings are keyed by normalized query text; ranked (isbns, scores) hits by (normalized query, filter, top_k). Both caches are cleared whenever the index manifest file changes, so a rebuilt index never serves stale results.
+    """
+
+    def __init__(
+        self,
+        embedding_entries: int = EMBEDDING_CACHE_ENTRIES,
+        embedding_bytes: int = EMBEDDING_CACHE_BYTES,
+        result_entries: int = RESULT_CACHE_ENTRIES,
+        result_bytes: int = RESULT_CACHE_BYTES,
+        result_ttl_seconds: Optional[float] = RESULT_CACHE_TTL_SECONDS,
+    ):
+        self.embeddings = LRUCache(embedding_entries, embedding_bytes)
+        self.results = LRUCache(result_entries, result_bytes, ttl_seconds=result_ttl_seconds)
+        self.invalidations = 0
+        self._manifest_state: Optional[tuple] = None
+
+    def validate(self, index) -> None:
+        """Clears the caches if the manifest of `index` was rewritten since the last check."""
+        path = getattr(index, "manifest_path", None)
+        try:
+            stat = os.stat(path) if path else None
+            state = (path, stat.st_mtime_ns, stat.st_size) if stat else (path, None, None)
+        except OSError:
+            state = (path, None, None)
+        if state != self._manifest_state:
+            if self._manifest_state is not None:
+                self.invalidations += 1
+            self.embeddings.clear()
+            self.results.clear()
+            self._manifest_state = state
+
+    def get_embedding(self, query: str) -> Optional[np.ndarray]:
+        return self.embeddings.get(normalize_query(query))
+
+    def put_embedding(self, query: str, vector: np.ndarray) -> None:
+        key = normalize_query(query)
+        self.embeddings.put(key, vector, vector.nbytes + sys.getsizeof(key))
+
+    def result_key(self, query: str, filters: Optional[RecommendationFilter], top_k: int) -> tuple:
+        return normalize_query(query), filters, top_k
+
+    def get_results(self, key: tuple) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        return self.results.get(key)
+
+    def put_results(self, key: tuple, isbns: np.ndarray, scores: np.ndarray) -> None:
+        self.results.put(key, (isbns, scores), isbns.nbytes + scores.nbytes + sys.getsizeof(key[0]))
+
+    def stats(self) -> dict:
+        """Returns counters for both caches plus the number of manifest-triggered invalidations."""
+        return {
+            "embeddings": self.embeddings.stats(),
+            "results": self.results.stats(),
+            "invalidations": self.invalidations,
+        }
@@ -1,17 +1,122 @@
+import time
+from typing import Optional
+
 import pandas as pd
 import numpy as np
-from transformers import pipeline
 from tqdm import tqdm
-from src.config import FICTION_CATEGORIES
+from src.config import FICTION_CATEGORIES, EMBEDDING_CONFIDENCE_THRESHOLD, ZERO_SHOT_BATCH_SIZE, ZERO_SHOT_MODEL_NAME
+from src.metrics import increment, timer
+from src.models import MODEL_METRIC, hf_pipeline
+
+
+class EmbeddingCategoryClassifier:
+    """Logistic-regression probe that labels books as Fiction or Nonfiction from their description embeddings.
+
+    It is fit on the books `map_categories` already labels and runs in microseconds per book, so only the books it is unsure about need the zero-shot model.
+    """
+
+    def __init__(self, categories: list[str] = FICTION_CATEGORIES, epochs: int = 300, learning_rate: float = 1.0, l2: float = 1e-4):
+        if len(categories) != 2:
+            raise ValueError("EmbeddingCategoryClassifier is a binary classifier")
+        self.categories = list(categories)
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.weights: Optional[np.ndarray] = None
+        self.bias = 0.0
+
+    def fit(self, embeddings: np.ndarray, labels: pd.Series | np.ndarray) -> "EmbeddingCategoryClassifier":
+        """Fits the probe with class-balanced, full-batch gradient descent.
+
+        Args:
+            embeddings (np.ndarray): A (books x dim) embedding matrix.
+            labels (pd.Series | np.ndarray): The category of each book; must be one of `categories`.
+
+        Returns:
+            EmbeddingCategoryClassifier: The fitted classifier.
+        """
+        x = np.asarray(embeddings, dtype=np.float32)
+        y = (np.asarray(labels) == self.categories[1]).astype(np.float32)
+        positives = max(y.sum(), 1.0)
+        negatives = max(len(y) - y.sum(), 1.0)
+        sample_weights = np.where(y == 1, len(y) / (2 * positives), len(y) / (2 * negatives)).astype(np.float32)
+
+        self.weights = np.zeros(x.shape[1], dtype=np.float32)
+        self.bias = 0.0
+        for _ in range(self.epochs):
+            error = (self._sigmoid(x @ self.weights + self.bias) - y) * sample_weights
+            self.weights -= self.learning_rate * (x.T @ error / len(y) + self.l2 * self.weights)
+            self.bias -= self.learning_rate * float(error.mean())
+        return self
+
+    @staticmethod
+    def _sigmoid(z: np.ndarray) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+    def predict(self, embeddings: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Predicts a category and a confidence in [0.5, 1] for each embedding.
+
+        Args:
+            embeddings (np.ndarray): A (books x dim) embedding matrix.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Predicted category labels and the probability of each prediction.
+        """
+        if self.weights is None:
+            raise ValueError("EmbeddingCategoryClassifier must be fit before predicting")
+        probability = self._sigmoid(np.asarray(embeddings, dtype=np.float32) @ self.weights + self.bias)
+        labels = np.where(probability >= 0.5, self.categories[1], self.categories[0])
+        return labels, np.maximum(probability, 1.0 - probability)
+
+
+def predict_confident_categories(books_df: pd.DataFrame, missing: pd.DataFrame, index, confidence_threshold: float = EMBEDDING_CONFIDENCE_THRESHOLD) -> pd.Series:
+    """Labels uncategorized books with an embedding probe fit on the categorized ones, keeping only confident predictions.
+
+    Args:
+        books_df (pd.DataFrame): Books with 'isbn13' and 'simple_categories'; those labeled Fiction or Nonfiction are the training set.
+        missing (pd.DataFrame): Books to label, with 'isbn13'.
+        index: Vector index holding the description embeddings (e.g. `NumpyVectorIndex`).
+        confidence_threshold (float, optional): Minimum probe probability for accepting a prediction.
+
+    Returns:
+        pd.Series: One entry per row of `missing` (positionally), holding the predicted category or None where the probe is unsure or has no embedding.
+    """
+    predictions = pd.Series([None] * len(missing), dtype=object)
+    labeled = books_df[books_df["simple_categories"].isin(FICTION_CATEGORIES)]
+    train_vectors, train_found = index.vectors_for(labeled["isbn13"])
+    if not train_found.any() or not len(missing):
+        return predictions
+
+    probe = EmbeddingCategoryClassifier().fit(train_vectors, labeled["simple_categories"].to_numpy()[train_found])
+    vectors, found = index.vectors_for(missing["isbn13"])
+    labels, confidence = probe.predict(vectors)
+    confident = confidence >= confidence_threshold
+    predictions[np.flatnonzero(found)[confident]] = labels[confident]
+    print(f"Embedding classifier labeled {int(confident.sum())} of {len(missing)} books.")
+    return predictions
+
+
+def zero_shot_shard_task(shard_df: pd.DataFrame) -> pd.DataFrame:
+    """Sharded-executor task: zero-shot classifies one shard with this worker's shared model instance.
+
+    Args:
+        shard_df (pd.DataFrame): Books with 'isbn13' and 'description'; other columns (e.g. 'input_hash') are passed through.
+
+    Returns:
+        pd.DataFrame: The shard without 'description', plus the predicted 'simple_categories'.
+    """
+    predictions = ZeroShotBookClassifier().predict_categories(shard_df["description"].tolist())
+    return shard_df.drop(columns=["description"]).assign(simple_categories=predictions)
 
 
 class ZeroShotBookClassifier:
-    def __init__(self, model_name: str = "facebook/bart-large-mnli"):
-        self.pipe = pipeline("zero-shot-classification", model=model_name)
+    def __init__(self, model_name: str = ZERO_SHOT_MODEL_NAME, pipe=None):
+        # Shared through the model registry, so constructing another classifier does not reload the model.
+        self.pipe = pipe if pipe is not None else hf_pipeline("zero-shot-classification", model_name)
 
     def predict_category(self, sequence: str, categories: list[str] = FICTION_CATEGORIES) -> str:
         """Predicts the most likely category for a given text sequence using a zero-shot classification pipeline.
-        
+
         This method applies the Hugging Face `pipeline` for zero-shot classification to determine  hich category from the provided list best fits the input text. It selects the category with the highest confidence score.
 
         Args:
@@ -21,34 +126,63 @@ class ZeroShotBookClassifier:
         Returns:
             str: The label from `categories` that best matches the input text based on the model's prediction.
         """
-        prediction = self.pipe(sequence, categories)
+        with timer(MODEL_METRIC, model="zero-shot"):
+            prediction = self.pipe(sequence, categories)
+        increment("model_inputs", model="zero-shot")
         max_index = np.argmax(prediction["scores"])
         return prediction["labels"][max_index]
 
-    def evaluate_model(self, books_df: pd.DataFrame, sample_size: int = 300) -> pd.DataFrame:
+    def predict_categories(self, sequences: list[str], categories: list[str] = FICTION_CATEGORIES, batch_size: int = ZERO_SHOT_BATCH_SIZE) -> list[str]:
+        """Predicts the most likely category for many text sequences, running the model in batches.
+
+        Args:
+            sequences (list[str]): The input texts (e.g., book descriptions) to classify.
+            categories (list[str], optional): A list of possible category labels. Defaults to FICTION_CATEGORIES.
+            batch_size (int, optional): Sequences per forward pass. Defaults to ZERO_SHOT_BATCH_SIZE.
+
+        Returns:
+            list[str]: The best matching label for each sequence, in input order.
+        """
+        predictions = []
+        for start in tqdm(range(0, len(sequences), batch_size), desc="Zero-shot classification"):
+            batch = sequences[start:start + batch_size]
+            with timer(MODEL_METRIC, model="zero-shot"):
+                results = self.pipe(batch, candidate_labels=categories, batch_size=batch_size)
+            increment("model_inputs", len(batch), model="zero-shot")
+            if isinstance(results, dict):
+                results = [results]
+            predictions.extend(result["labels"][int(np.argmax(result["scores"]))] for result in results)
+        return predictions
+
+    def evaluate_model(self, books_df: pd.DataFrame, sample_size: int = 300, index=None, confidence_threshold: float = EMBEDDING_CONFIDENCE_THRESHOLD) -> pd.DataFrame:
         """Evaluates the zero-shot classification model on a balanced subset of Fiction and Nonfiction books.
 
+        If a vector index is given, the embedding probe is also evaluated on the same sample, after being fit on the remaining labeled books.
+
         Args:
             books_df (pd.DataFrame): The DataFrame containing book metadata, including descriptions and category labels.
             sample_size (int, optional): Number of samples to evaluate from each category (Fiction and Nonfiction). Defaults to 300.
+            index (optional): Vector index holding the description embeddings (e.g. `NumpyVectorIndex`). Defaults to None.
+            confidence_threshold (float, optional): Probability at which the embedding prediction would be accepted without the zero-shot model.
 
         Returns:
-            pd.DataFrame: A DataFrame with actual vs. predicted categories and a correctness flag for each prediction.
+            pd.DataFrame: A DataFrame with actual vs. predicted categories and a correctness flag for each prediction, plus the embedding probe's predictions and confidence when `index` is given.
 
         Prints:
-            Accuracy score (%) based on the selected sample.
+            Accuracy score (%) and throughput (books/s) for each path.
         """
-        actual, predicted = [], []
+        sample = pd.concat([
+            books_df[books_df["simple_categories"] == label].head(sample_size)
+            for label in FICTION_CATEGORIES
+        ]).reset_index(drop=True)
 
-        for label in FICTION_CATEGORIES:
-            subset = books_df[books_df["simple_categories"] == label].reset_index(drop=True)
-            for i in tqdm(range(min(sample_size, len(subset)))):
-                desc = subset["description"][i]
-                actual.append(label)
-                predicted.append(self.predict_category(desc))
+        start = time.perf_counter()
+        predicted = self.predict_categories(sample["description"].tolist())
+        zero_shot_seconds = time.perf_counter() - start
 
         predictions_df = pd.DataFrame({
-            "actual_categories": actual,
+            "isbn13": sample["isbn13"],
+            "actual_categories": sample["simple_categories"],
             "predicted_categories": predicted
         })
 
@@ -57,24 +191,67 @@ class ZeroShotBookClassifier:
         ).astype(int)
 
         accuracy = predictions_df["correct_prediction"].mean()
-        print(f"Accuracy on {2 * sample_size} samples: {accuracy:.2%}")
+        print(f"Zero-shot accuracy on {len(sample)} samples: {accuracy:.2%} "
+              f"({len(sample) / max(zero_shot_seconds, 1e-9):.1f} books/s)")
+
+        if index is not None:
+            train = books_df[
+                books_df["simple_categories"].isin(FICTION_CATEGORIES)
+                & ~books_df["isbn13"].isin(sample["isbn13"])
+            ]
+            train_vectors, train_found = index.vectors_for(train["isbn13"])
+            probe = EmbeddingCategoryClassifier().fit(train_vectors, train["simple_categories"].to_numpy()[train_found])
+
+            start = time.perf_counter()
+            sample_vectors, sample_found = index.vectors_for(sample["isbn13"])
+            labels, confidence = probe.predict(sample_vectors)
+            embedding_seconds = time.perf_counter() - start
+
+            predictions_df["embedding_predicted_categories"] = None
+            predictions_df["embedding_confidence"] = np.nan
+            predictions_df.loc[sample_found, "embedding_predicted_categories"] = labels
+            predictions_df.loc[sample_found, "embedding_confidence"] = confidence
+
+            evaluated = predictions_df[sample_found]
+            embedding_correct = evaluated["embedding_predicted_categories"] == evaluated["actual_categories"]
+            confident = evaluated["embedding_confidence"] >= confidence_threshold
+            print(f"Embedding accuracy on {len(evaluated)} samples: {embedding_correct.mean():.2%} "
+                  f"({len(evaluated) / max(embedding_seconds, 1e-9):.1f} books/s)")
+            print(f"Embedding accuracy above confidence {confidence_threshold}: "
+                  f"{embedding_correct[confident].mean():.2%} on {confident.mean():.2%} of samples")
+
         return predictions_df
 
-    def fill_missing_categories(self, books_df: pd.DataFrame) -> pd.DataFrame:
+    def fill_missing_categories(
+        self,
+        books_df: pd.DataFrame,
+        index=None,
+        confidence_threshold: float = EMBEDDING_CONFIDENCE_THRESHOLD,
+        batch_size: int = ZERO_SHOT_BATCH_SIZE,
+    ) -> pd.DataFrame:
         """Predicts and fills missing values in the 'simple_categories' column using a zero-shot classification model.
 
+        If a vector index is given, an `EmbeddingCategoryClassifier` is first fit on the already categorized books and labels every missing book it is at least `confidence_threshold` sure about. Only the remaining books are sent to the zero-shot model, in batches.
+
         Args:
             books_df (pd.DataFrame): The DataFrame containing book metadata, including 'isbn13', 'description', and potentially missing 'simple_categories'.
+            index (optional): Vector index holding the description embeddings (e.g. `NumpyVectorIndex`). Defaults to None, which sends every missing book to the zero-shot model.
+            confidence_threshold (float, optional): Minimum probe probability for accepting an embedding prediction. Defaults to EMBEDDING_CONFIDENCE_THRESHOLD.
+            batch_size (int, optional): Descriptions per zero-shot forward pass. Defaults to ZERO_SHOT_BATCH_SIZE.
 
         Returns:
             pd.DataFrame: Updated DataFrame with missing 'simple_categories' filled in using predicted values. The temporary 'predicted_categories' column is dropped after merging.
         """
         missing = books_df[books_df["simple_categories"].isna()][["isbn13", "description"]].reset_index(drop=True)
-        predictions = []
+        predictions = pd.Series([None] * len(missing), dtype=object)
 
-        for i in tqdm(range(len(missing))):
-            pred = self.predict_category(missing["description"][i])
-            predictions.append(pred)
+        if index is not None and len(missing):
+            predictions = predict_confident_categories(books_df, missing, index, confidence_threshold)
+
+        remaining = np.flatnonzero(predictions.isna().to_numpy())
+        if len(remaining):
+            print(f"Zero-shot classifying {len(remaining)} books...")
+            predictions[remaining] = self.predict_categories(missing["description"][remaining].tolist(), batch_size=batch_size)
 
         predicted_df = pd.DataFrame({
             "isbn13": missing["isbn13"],
@@ -84,4 +261,4 @@ class ZeroShotBookClassifier:
         books_df = pd.merge(books_df, predicted_df, on="isbn13", how="left")
         books_df["simple_categories"] = books_df["simple_categories"].fillna(books_df["predicted_categories"])
         return books_df.drop(columns=["predicted_categories"])
-    
+
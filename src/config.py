@@ -13,4 +13,52 @@ CATEGORY_MAPPING = {
     'Poetry': "Fiction"
 }
 
-FICTION_CATEGORIES = ["Fiction", "Nonfiction"]
\ No newline at end of file
+FICTION_CATEGORIES = ["Fiction", "Nonfiction"]
+
+ZERO_SHOT_MODEL_NAME = "facebook/bart-large-mnli"
+
+# Books the embedding probe labels with at least this probability skip the zero-shot model.
+EMBEDDING_CONFIDENCE_THRESHOLD = 0.9
+
+ZERO_SHOT_BATCH_SIZE = 16
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+VECTORSTORE_MANIFEST = "manifest.json"
+
+# Intra-op threads each worker process gives torch; workers x threads should not exceed the core count.
+TORCH_THREADS_PER_WORKER = 1
+
+# Apply dynamic int8 quantization to the transformer classifiers when running on CPU (see src.models).
+QUANTIZE_MODELS = False
+
+# Resident memory the model registry may use before evicting least recently used models; None means no limit.
+MODEL_MEMORY_BUDGET_MB = None
+
+# Shards the sharded vector index is split into when no count is given.
+DEFAULT_SHARDS = 4
+
+# CSV the vectorstore is built from, by the pipeline and by every reader; its hash is recorded in the vectorstore manifest,
+# so all of them must pass the same file for a warm index to be reused.
+VECTORSTORE_SOURCE_CSV = "data/preprocessed/books_cleaned.csv"
+
+# Columnar copy of books_with_emotions.csv read by the CLI, service and dashboard.
+BOOK_STORE_DIR = "data/preprocessed/book_store"
+
+# Requests slower than this are written to the metrics log with their per-stage breakdown.
+SLOW_REQUEST_MS = 1000.0
+
+# Where `SlowRequestProfiler` writes cProfile dumps of slow requests.
+PROFILE_DIR = "profiles"
+
+# Emotion weights behind each dashboard tone; a tone re-ranks the retrieved candidates by these emotions.
+TONE_EMOTIONS = {
+    "Happy": {"joy": 1.0},
+    "Surprising": {"surprise": 1.0},
+    "Angry": {"anger": 1.0},
+    "Suspenseful": {"fear": 1.0},
+    "Sad": {"sadness": 1.0},
+}
+
+# Share of the re-ranking score given to a query's weighted emotions; the rest is its normalized similarity.
+EMOTION_STRENGTH = 0.5
@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from typing import Mapping, Optional
+
+
+@dataclass(frozen=True)
+class RecommendationFilter:
+    """Predicates a recommended book must satisfy, evaluated inside the vector search before top-k selection.
+
+    Instances are immutable and hashable so they can be used as cache keys.
+
+    Attributes:
+        category (Optional[str]): Required `simple_categories` value; None or "All" disables the filter.
+        category_contains (bool): Match categories containing `category` as a whole word, case-insensitively (e.g. "Fiction" also matches "Children's Fiction" but not "Nonfiction"), instead of exactly.
+        emotions (tuple[tuple[str, float], ...]): (emotion column, minimum score) pairs that must all hold.
+        min_rating (Optional[float]): Minimum `average_rating`.
+        min_pages (Optional[int]): Minimum `num_pages`.
+        max_pages (Optional[int]): Maximum `num_pages`.
+    """
+    category: Optional[str] = None
+    category_contains: bool = False
+    emotions: tuple[tuple[str, float], ...] = ()
+    min_rating: Optional[float] = None
+    min_pages: Optional[int] = None
+    max_pages: Optional[int] = None
+
+    @classmethod
+    def build(
+        cls,
+        category: Optional[str] = None,
+        emotions: Optional[Mapping[str, float]] = None,
+        category_contains: bool = False,
+        min_rating: Optional[float] = None,
+        min_pages: Optional[int] = None,
+        max_pages: Optional[int] = None,
+    ) -> "RecommendationFilter":
+        """Creates a filter from UI-style arguments, treating "All" as no constraint."""
+        return cls(
+            category=None if category in (None, "All") else category,
+            category_contains=category_contains,
+            emotions=tuple(sorted((emotions or {}).items())),
+            min_rating=min_rating,
+            min_pages=min_pages,
+            max_pages=max_pages,
+        )
+
+    def is_empty(self) -> bool:
+        """True when the filter accepts every book."""
+        return (
+            self.category is None
+            and not self.emotions
+            and self.min_rating is None
+            and self.min_pages is None
+            and self.max_pages is None
+        )
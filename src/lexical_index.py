@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from src.vectorstore import file_sha256
+
+LEXICAL_MANIFEST = "manifest.json"
+VOCABULARY_FILE = "vocabulary.json"
+
+# Text fields indexed for BM25 and how much each occurrence of a term in them counts.
+FIELD_WEIGHTS = {"title_and_subtitle": 3.0, "authors": 2.0, "description": 1.0}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text) -> list[str]:
+    """Lowercases text and splits it into word tokens, keeping stopwords."""
+    if not isinstance(text, str):
+        return []
+    return _TOKEN.findall(text.lower())
+
+
+def title_key(text) -> np.uint64:
+    """Hashes a title or query after normalizing case, punctuation and whitespace, for exact title matching."""
+    normalized = " ".join(tokenize(text))
+    return np.frombuffer(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), dtype=np.uint64)[0]
+
+
+class LexicalIndex:
+    """BM25 inverted index over book titles, authors and descriptions.
+
+    Postings are stored in CSR form: for term t, `doc_ids[indptr[t]:indptr[t + 1]]` are the books containing it and `weights` holds their precomputed BM25 contributions, so a query score is a gather and a `bincount` over a few postings lists. Titles are additionally hashed into a sorted key array for exact-title lookups that need no scoring at all.
+    """
+
+    def __init__(
+        self,
+        vocabulary: dict[str, int],
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        weights: np.ndarray,
+        isbns: np.ndarray,
+        title_keys: np.ndarray,
+        title_positions: np.ndarray,
+        directory: Optional[str] = None,
+    ):
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.isbns = isbns
+        self.title_keys = title_keys
+        self.title_positions = title_positions
+        self.directory = directory
+
+    def __len__(self) -> int:
+        return len(self.isbns)
+
+    @classmethod
+    def from_books(cls, books_df: pd.DataFrame, k1: float = BM25_K1, b: float = BM25_B) -> "LexicalIndex":
+        """Builds the index in memory.
+
+        Args:
+            books_df (pd.DataFrame): Books with 'isbn13', 'title' and the FIELD_WEIGHTS columns; duplicate ISBNs keep their last row.
+            k1 (float, optional): BM25 term-frequency saturation. Defaults to BM25_K1.
+            b (float, optional): BM25 length normalization. Defaults to BM25_B.
+
+        Returns:
+            LexicalIndex: The index, with documents ordered by ISBN.
+        """
+        books = books_df.drop_duplicates(subset="isbn13", keep="last").sort_values("isbn13", kind="stable")
+        vocabulary: dict[str, int] = {}
+        term_ids, docs, frequencies = [], [], []
+        lengths = np.zeros(len(books), dtype=np.float32)
+
+        fields = [books[field].tolist() if field in books.columns else [None] * len(books) for field in FIELD_WEIGHTS]
+        for doc, values in enumerate(zip(*fields)):
+            counts: Counter = Counter()
+            for weight, value in zip(FIELD_WEIGHTS.values(), values):
+                for token in tokenize(value):
+                    if token not in STOPWORDS:
+                        counts[token] += weight
+            lengths[doc] = sum(counts.values())
+            for token, frequency in counts.items():
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                docs.append(doc)
+                frequencies.append(frequency)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        docs = np.asarray(docs, dtype=np.int32)
+        frequencies = np.asarray(frequencies, dtype=np.float32)
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, docs, frequencies = term_ids[order], docs[order], frequencies[order]
+
+        document_frequency = np.bincount(term_ids, minlength=len(vocabulary))
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=indptr[1:])
+
+        n_docs = max(len(books), 1)
+        idf = np.log1p((n_docs - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        average_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+        norm = k1 * (1 - b + b * lengths[docs] / average_length)
+        weights = (idf[term_ids] * frequencies * (k1 + 1) / (frequencies + norm)).astype(np.float32)
+
+        # Both the bare title and title-with-subtitle resolve to the book.
+        keys, positions = [], []
+        for column in ("title", "title_and_subtitle"):
+            if column in books.columns:
+                for doc, title in enumerate(books[column].tolist()):
+                    if tokenize(title):
+                        keys.append(title_key(title))
+                        positions.append(doc)
+        keys = np.asarray(keys, dtype=np.uint64)
+        positions = np.asarray(positions, dtype=np.int32)
+        key_order = np.argsort(keys, kind="stable")
+
+        return cls(
+            vocabulary, indptr, docs, weights, books["isbn13"].to_numpy(dtype=np.int64),
+            keys[key_order], positions[key_order],
+        )
+
+    def save(self, directory: str, metadata: Optional[dict] = None) -> "LexicalIndex":
+        """Writes the index to `directory` and reopens it with memory-mapped postings."""
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename, so processes that still memory-map the old files keep a valid mapping.
+        for name, array in (
+            ("indptr.npy", self.indptr), ("doc_ids.npy", self.doc_ids), ("weights.npy", self.weights),
+            ("isbns.npy", self.isbns), ("title_keys.npy", self.title_keys), ("title_positions.npy", self.title_positions),
+        ):
+            tmp_path = os.path.join(directory, f"{name}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, os.path.join(directory, name))
+
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        manifest = dict(metadata or {})
+        manifest.update({"count": int(len(self)), "terms": len(terms), "field_weights": FIELD_WEIGHTS})
+        for name, payload in ((VOCABULARY_FILE, terms), (LEXICAL_MANIFEST, manifest)):
+            tmp_path = os.path.join(directory, f"{name}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, os.path.join(directory, name))
+
+        return self.load(directory)
+
+    @classmethod
+    def load(cls, directory: str) -> "LexicalIndex":
+        """Opens an index written by `save`."""
+        with open(os.path.join(directory, VOCABULARY_FILE), "r", encoding="utf-8") as f:
+            vocabulary = {term: i for i, term in enumerate(json.load(f))}
+
+        def array(name: str, mmap: bool = True) -> np.ndarray:
+            return np.load(os.path.join(directory, name), mmap_mode="r" if mmap else None)
+
+        return cls(
+            vocabulary, array("indptr.npy", mmap=False), array("doc_ids.npy"), array("weights.npy"),
+            array("isbns.npy", mmap=False), array("title_keys.npy", mmap=False), array("title_positions.npy", mmap=False),
+            directory=directory,
+        )
+
+    @staticmethod
+    def read_manifest(directory: str) -> Optional[dict]:
+        """Reads the manifest of the index stored in `directory`, or None if there is none."""
+        path = os.path.join(directory, LEXICAL_MANIFEST)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def score(self, query: str, mask: Optional[np.ndarray] = None) -> tuple[np.ndarray, np.ndarray]:
+        """Scores every book sharing a term with `query`.
+
+        Args:
+            query (str): Free-text query.
+            mask (Optional[np.ndarray]): Boolean filter aligned with `isbns`.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Positions of the matching books, in ascending order, and their BM25 scores.
+        """
+        terms = self._query_terms(query)
+        if not terms:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        postings = [np.arange(self.indptr[t], self.indptr[t + 1]) for t in terms]
+        slots = np.concatenate(postings) if len(postings) > 1 else postings[0]
+        # BM25 weights are positive, so the books with a non-zero total are exactly those matching a term.
+        totals = np.bincount(np.asarray(self.doc_ids[slots]), weights=np.asarray(self.weights[slots]), minlength=len(self))
+        positions = np.flatnonzero(totals)
+        if mask is not None:
+            positions = positions[mask[positions]]
+        return positions, totals[positions].astype(np.float32)
+
+    def score_positions(self, query: str, positions: np.ndarray) -> np.ndarray:
+        """BM25 scores of `query` for the books at `positions` only, found by binary search in each term's postings."""
+        scores = np.zeros(len(positions), dtype=np.float32)
+        for t in self._query_terms(query):
+            docs = self.doc_ids[self.indptr[t]:self.indptr[t + 1]]
+            if len(docs) == 0:
+                continue
+            slots = np.minimum(np.searchsorted(docs, positions), len(docs) - 1)
+            found = docs[slots] == positions
+            scores[found] += self.weights[self.indptr[t] + slots[found]]
+        return scores
+
+    def _query_terms(self, query: str) -> set[int]:
+        return {self.vocabulary[t] for t in tokenize(query) if t not in STOPWORDS and t in self.vocabulary}
+
+    def search(self, query: str, top_k: int = 10, mask: Optional[np.ndarray] = None) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the ISBNs and BM25 scores of the `top_k` best lexical matches, best first."""
+        positions, scores = self.score(query, mask)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return self.isbns[positions[order]], scores[order]
+
+    def title_matches(self, query: str, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Positions of books whose title (with or without subtitle) equals the query, ignoring case and punctuation."""
+        key = title_key(query)
+        start = np.searchsorted(self.title_keys, key, side="left")
+        end = np.searchsorted(self.title_keys, key, side="right")
+        positions = np.unique(self.title_positions[start:end]).astype(np.int64)
+        if mask is not None:
+            positions = positions[mask[positions]]
+        return positions
+
+
+def load_or_build_lexical_index(csv_path: str, directory: str = "lexical_index") -> LexicalIndex:
+    """Opens the persisted BM25 index, rebuilding it when the book CSV has changed.
+
+    Args:
+        csv_path (str): Path to the cleaned book CSV.
+        directory (str): Directory holding the lexical index files.
+
+    Returns:
+        LexicalIndex: An index with memory-mapped postings.
+    """
+    csv_hash = file_sha256(csv_path)
+    manifest = LexicalIndex.read_manifest(directory)
+    if manifest is not None and manifest.get("csv_sha256") == csv_hash and manifest.get("field_weights") == FIELD_WEIGHTS:
+        return LexicalIndex.load(directory)
+
+    columns = ["isbn13", "title", *FIELD_WEIGHTS]
+    books = pd.read_csv(csv_path, usecols=lambda c: c in columns)
+    return LexicalIndex.from_books(books).save(directory, metadata={"csv_sha256": csv_hash})
@@ -0,0 +1,289 @@
+import bisect
+import contextvars
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import IO, Iterator, Optional
+
+from src.config import SLOW_REQUEST_MS
+
+# Upper bounds, in seconds, of the latency histogram buckets; values above the last bound land in +Inf.
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0,
+)
+
+# Stage timings of the request being handled by the current thread or task; see `trace`.
+_current_trace: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values, as exposed by Prometheus."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile; the largest finite bound for the +Inf bucket."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """Thread-safe counters and latency histograms, keyed by name and labels.
+
+    Metrics are kept per process: stages run in worker processes are only counted there.
+    """
+
+    def __init__(self):
+        self._counters: dict[tuple, float] = {}
+        self._histograms: dict[tuple, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        """Adds `value` to the counter `name` with the given labels."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Records one value, in seconds for latencies, in the histogram `name` with the given labels."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Times the enclosed block into the histogram `name`, and into the current trace under its 'stage' label or name.
+
+        Blocks that raise are timed too, and counted in '<name>_errors'.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.increment(f"{name}_errors", **labels)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(name, elapsed, **labels)
+            stages = _current_trace.get()
+            if stages is not None:
+                stage = str(labels.get("stage", name))
+                stages[stage] = stages.get(stage, 0.0) + elapsed
+
+    def snapshot(self) -> dict:
+        """Current values as JSON-serializable 'counters' and 'histograms' lists (histograms with count, sum, p50 and p99)."""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(self._counters.items())]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": round(h.sum, 6),
+                    "p50": h.quantile(0.5),
+                    "p99": h.quantile(0.99),
+                }
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+
+    def render_text(self) -> str:
+        """Formats every metric in the Prometheus text exposition format, for a /metrics endpoint."""
+        def series(name: str, labels: tuple, extra: tuple = ()) -> str:
+            pairs = ",".join(f'{k}="{v}"' for k, v in labels + extra)
+            return f"{name}{{{pairs}}}" if pairs else name
+
+        lines, typed = [], set()
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{series(name, labels)} {value:g}")
+            for (name, labels), h in sorted(self._histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f"{series(name + '_bucket', labels, (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{series(name + '_bucket', labels, (('le', '+Inf'),))} {h.count}")
+                lines.append(f"{series(name + '_sum', labels)} {h.sum:.6f}")
+                lines.append(f"{series(name + '_count', labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Drops every metric."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+_metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Returns this process's metrics registry."""
+    return _metrics
+
+
+def increment(name: str, value: float = 1, **labels) -> None:
+    """Adds to a counter in the process registry."""
+    _metrics.increment(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Records a value in a histogram of the process registry."""
+    _metrics.observe(name, value, **labels)
+
+
+def timer(name: str, **labels):
+    """Context manager timing a block into a histogram of the process registry."""
+    return _metrics.timer(name, **labels)
+
+
+@contextmanager
+def trace() -> Iterator[dict]:
+    """Collects the seconds spent in each timed stage within the block, for a per-request breakdown.
+
+    Yields a dict that fills in as `timer` blocks finish, mapping each stage (the timer's 'stage' label, or its name) to its total seconds. Traces are per thread and per asyncio task; a nested trace shadows the outer one.
+    """
+    stages: dict = {}
+    token = _current_trace.set(stages)
+    try:
+        yield stages
+    finally:
+        _current_trace.reset(token)
+
+
+_log_stream: Optional[IO[str]] = None
+_log_lock = threading.Lock()
+
+
+def configure_log(path: Optional[str]) -> None:
+    """Sends `log_event` records to `path` as JSON lines ('-' for standard error); None turns the log off."""
+    global _log_stream
+    with _log_lock:
+        if _log_stream is not None and _log_stream is not sys.stderr:
+            _log_stream.close()
+        if path is None:
+            _log_stream = None
+        elif path == "-":
+            _log_stream = sys.stderr
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            _log_stream = open(path, "a", encoding="utf-8", buffering=1)
+
+
+def log_event(event: str, **fields) -> None:
+    """Writes one structured JSON log line with a timestamp, the event name and `fields`, if a log is configured."""
+    if _log_stream is None:
+        return
+    record = {"ts": round(time.time(), 3), "event": event, "pid": os.getpid(), **fields}
+    line = json.dumps(record, default=str) + "\n"
+    with _log_lock:
+        if _log_stream is not None:
+            _log_stream.write(line)
+
+
+def stage_breakdown_ms(stages: dict) -> dict:
+    """Rounds a trace's stage seconds to milliseconds for logs and responses."""
+    return {stage: round(seconds * 1000, 3) for stage, seconds in stages.items()}
+
+
+@contextmanager
+def traced_request(endpoint: str, slow_request_ms: Optional[float] = SLOW_REQUEST_MS, **fields) -> Iterator[dict]:
+    """Traces one request: times it into 'request_seconds' and logs it with its stage breakdown if it took `slow_request_ms` or longer.
+
+    Requests that raise are timed and logged too, with the error, and counted in 'request_errors'.
+
+    Args:
+        endpoint (str): Label of the request histogram and the log event.
+        slow_request_ms (Optional[float], optional): Threshold for the 'slow_request' log event; None never logs. Defaults to SLOW_REQUEST_MS.
+        **fields: Extra fields for the log event, e.g. the query.
+
+    Yields:
+        dict: The request's stage timings in seconds, as from `trace`.
+    """
+    start = time.perf_counter()
+    error = None
+    with trace() as stages:
+        try:
+            yield stages
+        except BaseException as e:
+            increment("request_errors", endpoint=endpoint)
+            error = repr(e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            observe("request_seconds", elapsed, endpoint=endpoint)
+            if slow_request_ms is not None and elapsed * 1000 >= slow_request_ms:
+                increment("slow_requests", endpoint=endpoint)
+                if error is not None:
+                    fields["error"] = error
+                log_event("slow_request", endpoint=endpoint, total_ms=round(elapsed * 1000, 3), stages_ms=stage_breakdown_ms(stages), **fields)
+
+
+class SlowRequestProfiler:
+    """Profiles requests with cProfile and keeps the profiles of those slower than a threshold.
+
+    Profiles are written as `<name>-<timestamp>-<ms>ms.prof` for `python -m pstats` or snakeviz, up to `max_dumps` per process. Only one request is profiled at a time; requests arriving meanwhile run unprofiled. cProfile slows the profiled code down, so enable it only while chasing a slow request; `py-spy record --pid <pid>` (the pid is in every log line) samples a live process without that cost.
+    """
+
+    def __init__(self, threshold_ms: float, directory: str = "profiles", max_dumps: int = 1):
+        self.threshold_ms = threshold_ms
+        self.directory = directory
+        self.max_dumps = max_dumps
+        self.dumps = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, name: str) -> Iterator[None]:
+        """Profiles the enclosed block and dumps the profile if it ran longer than the threshold."""
+        if self.dumps >= self.max_dumps or not self._lock.acquire(blocking=False):
+            yield
+            return
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if elapsed_ms >= self.threshold_ms and self.dumps < self.max_dumps:
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{elapsed_ms:.0f}ms.prof")
+                profiler.dump_stats(path)
+                self.dumps += 1
+                log_event("profile_dumped", name=name, path=path, elapsed_ms=round(elapsed_ms, 3))
+        finally:
+            self._lock.release()
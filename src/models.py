@@ -0,0 +1,256 @@
+import gc
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from src.config import EMBEDDING_MODEL_NAME, MODEL_MEMORY_BUDGET_MB, QUANTIZE_MODELS
+from src.metrics import increment, observe
+
+# Histogram of model forward-pass calls, labelled by model; call sites time their calls with `timer(MODEL_METRIC, model=...)`.
+MODEL_METRIC = "model_inference_seconds"
+
+
+def resident_memory_bytes() -> int:
+    """Current resident set size of this process, from /proc where available, else the peak RSS."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def torch_module(model) -> Optional[Any]:
+    """Finds the torch module behind a model object: the object itself, a pipeline's `.model` or an embedding wrapper's `.client`."""
+    try:
+        import torch
+    except ImportError:
+        return None
+    for candidate in (model, getattr(model, "model", None), getattr(model, "client", None)):
+        if isinstance(candidate, torch.nn.Module):
+            return candidate
+    return None
+
+
+def quantize_dynamic_int8(model) -> bool:
+    """Replaces the Linear layers of a model's torch module with dynamically quantized int8 versions, in place.
+
+    Weights are stored as int8 and activations are quantized on the fly, which shrinks transformer encoders by roughly 2-4x and speeds up CPU inference. Returns False if the model has no torch module to quantize.
+    """
+    module = torch_module(model)
+    if module is None:
+        return False
+    import torch
+    torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return True
+
+
+@dataclass
+class ModelStats:
+    """Load statistics for one registry entry."""
+
+    key: str
+    load_seconds: float
+    rss_bytes: int
+    quantized: bool
+    uses: int = 0
+    last_used: float = 0.0
+
+
+class ModelRegistry:
+    """Loads each model once per process and shares it between every caller.
+
+    Models are loaded lazily by key on first `get`, with torch limited to `torch_threads` intra-op threads and, for CPU inference, optionally with dynamic int8 quantization. The load time and resident-memory growth of every load are recorded. With a memory budget, the least recently used models are evicted once the loaded models together exceed it; an evicted model is freed once callers drop their own references, and is reloaded on its next `get`.
+    """
+
+    def __init__(
+        self,
+        torch_threads: Optional[int] = None,
+        quantize: bool = QUANTIZE_MODELS,
+        memory_budget_mb: Optional[float] = MODEL_MEMORY_BUDGET_MB,
+        device: Optional[str] = None,
+    ):
+        self.torch_threads = torch_threads
+        self.quantize = quantize
+        self.memory_budget_mb = memory_budget_mb
+        self.device = device
+        self.evictions = 0
+        self._models: OrderedDict[str, Any] = OrderedDict()
+        self._stats: dict[str, ModelStats] = {}
+        self._lock = threading.RLock()
+        self._threads_applied = False
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._models
+
+    @property
+    def quantizes_on_cpu(self) -> bool:
+        """Whether quantizable models are quantized, which only applies to CPU inference."""
+        return self.quantize and self.device in (None, "cpu")
+
+    def variant(self, model_name: str) -> str:
+        """Names the model as it is actually run, for cache keys: quantized models give different scores."""
+        return f"{model_name}@int8" if self.quantizes_on_cpu else model_name
+
+    def _apply_threads(self) -> None:
+        if self._threads_applied or not self.torch_threads:
+            return
+        try:
+            import torch
+            torch.set_num_threads(self.torch_threads)
+        except ImportError:
+            pass
+        self._threads_applied = True
+
+    def get(self, key: str, loader: Callable[[], Any], quantizable: bool = True) -> Any:
+        """Returns the model stored under `key`, loading it with `loader` on first use.
+
+        Args:
+            key (str): Registry key; callers asking for the same key share one instance.
+            loader (Callable[[], Any]): Builds the model.
+            quantizable (bool, optional): Whether dynamic int8 quantization may be applied when enabled. Defaults to True.
+
+        Returns:
+            Any: The loaded model.
+        """
+        with self._lock:
+            if key not in self._models:
+                self._apply_threads()
+                rss_before = resident_memory_bytes()
+                start = time.perf_counter()
+                model = loader()
+                quantized = quantizable and self.quantizes_on_cpu and quantize_dynamic_int8(model)
+                self._models[key] = model
+                self._stats[key] = ModelStats(
+                    key=key,
+                    load_seconds=time.perf_counter() - start,
+                    rss_bytes=max(resident_memory_bytes() - rss_before, 0),
+                    quantized=quantized,
+                )
+                observe("model_load_seconds", self._stats[key].load_seconds, model=key)
+                self._enforce_budget(keep=key)
+            self._models.move_to_end(key)
+            stats = self._stats[key]
+            stats.uses += 1
+            stats.last_used = time.time()
+            return self._models[key]
+
+    def _enforce_budget(self, keep: str) -> None:
+        if self.memory_budget_mb is None:
+            return
+        budget = self.memory_budget_mb * (1 << 20)
+        for key in list(self._models):
+            if self.resident_bytes <= budget:
+                break
+            if key != keep:
+                self.evict(key)
+
+    @property
+    def resident_bytes(self) -> int:
+        """Resident memory attributed to the loaded models, measured when each was loaded."""
+        return sum(self._stats[key].rss_bytes for key in self._models)
+
+    def evict(self, key: str) -> bool:
+        """Drops the registry's reference to a model; returns False if it was not loaded."""
+        with self._lock:
+            if self._models.pop(key, None) is None:
+                return False
+            self.evictions += 1
+            increment("model_evictions", model=key)
+            gc.collect()
+            return True
+
+    def clear(self) -> None:
+        """Evicts every loaded model."""
+        with self._lock:
+            for key in list(self._models):
+                self.evict(key)
+
+    def report(self) -> list[dict]:
+        """Load time, resident memory, quantization and use count of every model loaded so far, in load order."""
+        with self._lock:
+            return [
+                {
+                    "model": stats.key,
+                    "loaded": stats.key in self._models,
+                    "load_seconds": round(stats.load_seconds, 2),
+                    "rss_mb": round(stats.rss_bytes / (1 << 20), 1),
+                    "quantized": stats.quantized,
+                    "uses": stats.uses,
+                }
+                for stats in self._stats.values()
+            ]
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """Returns this process's model registry, creating one with the default settings on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
+
+
+def configure_models(
+    torch_threads: Optional[int] = None,
+    quantize: bool = QUANTIZE_MODELS,
+    memory_budget_mb: Optional[float] = MODEL_MEMORY_BUDGET_MB,
+    device: Optional[str] = None,
+) -> ModelRegistry:
+    """Replaces this process's model registry with one using the given settings, releasing previously loaded models.
+
+    Args:
+        torch_threads (Optional[int], optional): Torch intra-op threads; None keeps torch's default. Defaults to None.
+        quantize (bool, optional): Apply dynamic int8 quantization to quantizable models on CPU. Defaults to QUANTIZE_MODELS.
+        memory_budget_mb (Optional[float], optional): Evict least recently used models beyond this much resident memory; None means no limit. Defaults to MODEL_MEMORY_BUDGET_MB.
+        device (Optional[str], optional): Device models are loaded on, e.g. 'cpu' or 'cuda'; None uses the library default. Defaults to None.
+
+    Returns:
+        ModelRegistry: The new process registry.
+    """
+    global _registry
+    registry = ModelRegistry(torch_threads=torch_threads, quantize=quantize, memory_budget_mb=memory_budget_mb, device=device)
+    with _registry_lock:
+        previous, _registry = _registry, registry
+    if previous is not None:
+        previous.clear()
+    return registry
+
+
+def hf_pipeline(task: str, model_name: str, **kwargs):
+    """Returns the shared Hugging Face pipeline for `task` and `model_name`, loading it on first use."""
+    registry = get_registry()
+
+    def load():
+        from transformers import pipeline
+        return pipeline(task, model=model_name, device=registry.device, **kwargs)
+
+    options = ",".join(f"{name}={value}" for name, value in sorted(kwargs.items()))
+    return registry.get(f"{task}:{model_name}:{options}", load)
+
+
+def sentence_embedding(model_name: str = EMBEDDING_MODEL_NAME):
+    """Returns the shared sentence-transformer embedding model, loading it on first use.
+
+    It is never quantized: stored book vectors and query vectors must come from the same weights.
+    """
+    registry = get_registry()
+
+    def load():
+        from dotenv import load_dotenv
+        from langchain.embeddings import SentenceTransformerEmbeddings
+
+        load_dotenv()
+        model_kwargs = {"device": registry.device} if registry.device else {}
+        return SentenceTransformerEmbeddings(model_name=model_name, model_kwargs=model_kwargs)
+
+    return registry.get(f"embedding:{model_name}", load, quantizable=False)
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+
+from src.vector_index import NumpyVectorIndex, top_k_rows
+
+NEIGHBORS_FILE = "neighbors.npy"
+SCORES_FILE = "scores.npy"
+ISBNS_FILE = "isbns.npy"
+DIGESTS_FILE = "digests.npy"
+NEIGHBOR_MANIFEST = "manifest.json"
+
+# Neighbours stored per book; lookups can ask for at most this many.
+NEIGHBOR_COUNT = 20
+
+# Books whose neighbours are computed together, and books they are scored against per tile; the
+# (rows x columns) float32 score tile is the largest buffer, 64 MB with these defaults.
+NEIGHBOR_BLOCK_ROWS = 1024
+NEIGHBOR_BLOCK_COLUMNS = 16384
+
+
+def row_digests(embeddings: np.ndarray) -> np.ndarray:
+    """Fingerprints each embedding row, so a refresh can tell which books' vectors changed."""
+    digests = np.empty(len(embeddings), dtype=np.uint64)
+    for i, row in enumerate(embeddings):
+        digest = hashlib.blake2b(np.ascontiguousarray(row).tobytes(), digest_size=8).digest()
+        digests[i] = np.frombuffer(digest, dtype=np.uint64)[0]
+    return digests
+
+
+def _neighbors_of(
+    embeddings: np.ndarray,
+    rows: np.ndarray,
+    columns: np.ndarray,
+    k: int,
+    block_rows: int,
+    block_columns: int = NEIGHBOR_BLOCK_COLUMNS,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Top-k neighbours of `rows` among `columns` (both positions into `embeddings`, `columns` sorted), excluding each row itself.
+
+    Scores are computed one (block_rows x block_columns) tile at a time and merged into a running top-k per row, so peak memory does not grow with the catalog.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (len(rows) x k) neighbour positions, padded with -1, and their float32 scores, padded with -inf.
+    """
+    neighbors = np.full((len(rows), k), -1, dtype=np.int32)
+    scores = np.full((len(rows), k), -np.inf, dtype=np.float32)
+    for start in range(0, len(rows), block_rows):
+        block = rows[start:start + block_rows]
+        vectors = np.asarray(embeddings[block])
+        best, best_scores = neighbors[start:start + len(block)], scores[start:start + len(block)]
+        for column_start in range(0, len(columns), block_columns):
+            tile = columns[column_start:column_start + block_columns]
+            tile_scores = vectors @ np.asarray(embeddings[tile]).T
+            # A row's own position appears at most once in the sorted tile; blank it out by position.
+            self_at = np.minimum(np.searchsorted(tile, block), len(tile) - 1)
+            is_self = tile[self_at] == block
+            tile_scores[np.flatnonzero(is_self), self_at[is_self]] = -np.inf
+            top, top_scores = top_k_rows(tile_scores, k)
+            best, best_scores = _merge_neighbors(
+                best, best_scores, np.where(np.isfinite(top_scores), tile[top], -1).astype(np.int32), top_scores, k,
+            )
+        neighbors[start:start + len(block)], scores[start:start + len(block)] = best, best_scores
+    return neighbors, scores
+
+
+def _pair_scores(embeddings: np.ndarray, rows: np.ndarray, neighbors: np.ndarray, block_rows: int) -> np.ndarray:
+    """Exact float32 scores between each row and its listed neighbours (-inf for -1 padding).
+
+    Stored scores are float16, so reused lists are rescored before being merged with fresh candidates.
+    """
+    scores = np.full(neighbors.shape, -np.inf, dtype=np.float32)
+    for start in range(0, len(rows), block_rows):
+        block = neighbors[start:start + block_rows]
+        vectors = np.asarray(embeddings[np.maximum(block, 0).ravel()]).reshape(*block.shape, -1)
+        block_scores = np.einsum("nd,nkd->nk", np.asarray(embeddings[rows[start:start + block_rows]]), vectors)
+        scores[start:start + len(block)] = np.where(block >= 0, block_scores, -np.inf)
+    return scores
+
+
+def _merge_neighbors(
+    neighbors: np.ndarray, scores: np.ndarray, extra_neighbors: np.ndarray, extra_scores: np.ndarray, k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Keeps the k best of two neighbour lists per row."""
+    merged = np.concatenate([neighbors, extra_neighbors], axis=1)
+    merged_scores = np.concatenate([scores, extra_scores], axis=1)
+    merged_scores = np.where(merged >= 0, merged_scores, -np.inf)
+    top, top_scores = top_k_rows(merged_scores, k)
+    return np.take_along_axis(merged, top, axis=1), top_scores
+
+
+class NeighborTable:
+    """Precomputed "more like this" table: the nearest books to every book in the vector index.
+
+    Row i holds the neighbours of the i-th ISBN (sorted) as int32 positions into the same ISBN array, best first and padded with -1, with float16 cosine scores. Lookups are a binary search plus a row read from memory-mapped files, so no model runs at query time.
+    """
+
+    def __init__(
+        self,
+        isbns: np.ndarray,
+        neighbors: np.ndarray,
+        scores: np.ndarray,
+        digests: Optional[np.ndarray] = None,
+        directory: Optional[str] = None,
+    ):
+        self.isbns = isbns
+        self.neighbors = neighbors
+        self.scores = scores
+        self.digests = digests
+        self.directory = directory
+
+    def __len__(self) -> int:
+        return len(self.isbns)
+
+    @property
+    def k(self) -> int:
+        return self.neighbors.shape[1]
+
+    @classmethod
+    def compute(
+        cls,
+        index: NumpyVectorIndex,
+        k: int = NEIGHBOR_COUNT,
+        block_rows: int = NEIGHBOR_BLOCK_ROWS,
+        previous: Optional["NeighborTable"] = None,
+    ) -> "NeighborTable":
+        """Computes the neighbour table of an index blockwise, reusing `previous` where it is still valid.
+
+        When a previous table with the same `k` is given, only books that are new, whose embedding changed, or whose stored neighbours were removed or changed are searched against the whole catalog. Every other book is only compared with the new and changed books, and the result is merged into its stored list.
+
+        Args:
+            index (NumpyVectorIndex): Index holding L2-normalized embeddings, sorted by ISBN.
+            k (int, optional): Neighbours per book. Defaults to NEIGHBOR_COUNT.
+            block_rows (int, optional): Books scored per block. Defaults to NEIGHBOR_BLOCK_ROWS.
+            previous (Optional[NeighborTable]): Table computed from an earlier version of the index.
+
+        Returns:
+            NeighborTable: The in-memory table.
+        """
+        order = np.argsort(index.isbns, kind="stable")
+        isbns = np.asarray(index.isbns)[order]
+        embeddings = index.embeddings if np.array_equal(order, np.arange(len(order))) else np.asarray(index.embeddings)[order]
+        digests = row_digests(embeddings)
+        everything = np.arange(len(isbns))
+
+        if previous is None or previous.k != k or previous.digests is None or len(previous) == 0 or len(isbns) == 0:
+            neighbors, scores = _neighbors_of(embeddings, everything, everything, k, block_rows)
+            return cls(isbns, neighbors, scores.astype(np.float16), digests)
+
+        # Map previous rows onto the new ISBN positions; -1 marks books that are gone.
+        old_positions = np.minimum(np.searchsorted(isbns, previous.isbns), len(isbns) - 1)
+        old_to_new = np.where(isbns[old_positions] == previous.isbns, old_positions, -1)
+        unchanged_old = (old_to_new >= 0) & (previous.digests == digests[np.maximum(old_to_new, 0)])
+
+        unchanged = np.zeros(len(isbns), dtype=bool)
+        unchanged[old_to_new[unchanged_old]] = True
+        added = np.flatnonzero(~unchanged)
+
+        # Stored lists that mention a removed or changed book are recomputed from scratch.
+        old_neighbors = np.asarray(previous.neighbors)
+        valid_neighbor = (old_neighbors < 0) | unchanged_old[np.maximum(old_neighbors, 0)]
+        reusable_old = unchanged_old & valid_neighbor.all(axis=1)
+        reusable = old_to_new[reusable_old]
+
+        neighbors = np.full((len(isbns), k), -1, dtype=np.int32)
+        scores = np.full((len(isbns), k), -np.inf, dtype=np.float32)
+
+        stale = np.setdiff1d(everything, reusable)
+        if len(stale):
+            neighbors[stale], scores[stale] = _neighbors_of(embeddings, stale, everything, k, block_rows)
+
+        if len(reusable):
+            kept = old_neighbors[reusable_old]
+            kept = np.where(kept >= 0, old_to_new[np.maximum(kept, 0)], -1).astype(np.int32)
+            kept_scores = _pair_scores(embeddings, reusable, kept, block_rows)
+            extra, extra_scores = _neighbors_of(embeddings, reusable, added, k, block_rows)
+            neighbors[reusable], scores[reusable] = _merge_neighbors(kept, kept_scores, extra, extra_scores, k)
+
+        print(f"Neighbour refresh: {len(stale)} books searched in full, {len(reusable)} updated against {len(added)} new or changed books.")
+        return cls(isbns, neighbors, scores.astype(np.float16), digests)
+
+    def save(self, directory: str, metadata: Optional[dict] = None) -> "NeighborTable":
+        """Writes the table to `directory` and reopens it memory-mapped."""
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename, so processes that still memory-map the old files keep a valid mapping.
+        for name, array in (
+            (ISBNS_FILE, np.asarray(self.isbns, dtype=np.int64)),
+            (NEIGHBORS_FILE, np.asarray(self.neighbors, dtype=np.int32)),
+            (SCORES_FILE, np.asarray(self.scores, dtype=np.float16)),
+            (DIGESTS_FILE, np.asarray(self.digests, dtype=np.uint64)),
+        ):
+            tmp_path = os.path.join(directory, f"{name}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, os.path.join(directory, name))
+
+        manifest = dict(metadata or {})
+        manifest.update({"count": int(len(self)), "k": int(self.k)})
+        tmp_path = os.path.join(directory, f"{NEIGHBOR_MANIFEST}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(directory, NEIGHBOR_MANIFEST))
+
+        return self.load(directory)
+
+    @classmethod
+    def load(cls, directory: str) -> "NeighborTable":
+        """Opens a table written by `save`, memory-mapping the neighbour and score arrays."""
+        return cls(
+            np.load(os.path.join(directory, ISBNS_FILE)),
+            np.load(os.path.join(directory, NEIGHBORS_FILE), mmap_mode="r"),
+            np.load(os.path.join(directory, SCORES_FILE), mmap_mode="r"),
+            np.load(os.path.join(directory, DIGESTS_FILE), mmap_mode="r"),
+            directory=directory,
+        )
+
+    @staticmethod
+    def read_manifest(directory: str) -> Optional[dict]:
+        """Reads the manifest of the table stored in `directory`, or None if there is none."""
+        path = os.path.join(directory, NEIGHBOR_MANIFEST)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def similar(self, isbn: int, top_k: int = 10) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the ISBNs and scores of the books most similar to `isbn`, best first.
+
+        Args:
+            isbn (int): ISBN-13 of the source book.
+            top_k (int, optional): Number of neighbours; at most `k`. Defaults to 10.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Neighbour ISBNs and float32 cosine similarities; empty when the book is unknown.
+        """
+        position = int(np.searchsorted(self.isbns, isbn))
+        if position >= len(self.isbns) or self.isbns[position] != isbn:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        row = np.asarray(self.neighbors[position, :top_k])
+        found = row >= 0
+        return self.isbns[row[found]], np.asarray(self.scores[position, :top_k], dtype=np.float32)[found]
+
+    def similar_batch(self, isbns: Sequence[int], top_k: int = 10) -> list[tuple[np.ndarray, np.ndarray]]:
+        """Looks up the neighbours of several books."""
+        return [self.similar(int(isbn), top_k) for isbn in isbns]
+
+
+def load_or_build_neighbor_table(
+    index: NumpyVectorIndex,
+    directory: str = "neighbor_index",
+    k: int = NEIGHBOR_COUNT,
+    block_rows: int = NEIGHBOR_BLOCK_ROWS,
+) -> NeighborTable:
+    """Opens the persisted neighbour table, refreshing it when the vector index has changed since it was built.
+
+    Args:
+        index (NumpyVectorIndex): The up-to-date vector index, e.g. from `load_or_build_numpy_index`.
+        directory (str): Directory holding the neighbour table files.
+        k (int): Neighbours per book.
+        block_rows (int): Books scored per block while computing.
+
+    Returns:
+        NeighborTable: A memory-mapped table covering every book in `index`.
+    """
+    source = NumpyVectorIndex.read_manifest(index.directory) if index.directory else None
+    fingerprint = (source or {}).get("source_fingerprint")
+    existing = NeighborTable.read_manifest(directory)
+    if existing is not None and fingerprint is not None and existing.get("source_fingerprint") == fingerprint and existing.get("k") == k:
+        return NeighborTable.load(directory)
+
+    previous = NeighborTable.load(directory) if existing is not None else None
+    table = NeighborTable.compute(index, k=k, block_rows=block_rows, previous=previous)
+    return table.save(directory, metadata={"source_fingerprint": fingerprint})
@@ -1,48 +1,122 @@
+import os
+import time
 from typing import Optional
 import pandas as pd
 import numpy as np
 
-def clean_books_dataset(input_csv_path: str, output_csv_path: Optional[str] = None) -> pd.DataFrame:
-    """Cleans the book dataset by applying filtering, transformations, and feature engineering.
+# Rows read per chunk by `stream_clean_books_dataset`; peak memory scales with this, not with the catalog.
+CLEAN_CHUNK_ROWS = 50_000
+
+# Pinned so every chunk parses the same way (e.g. ISBN-10s keep leading zeros, years stay floats).
+RAW_DTYPES = {
+    "isbn13": np.int64,
+    "isbn10": str,
+    "title": str,
+    "subtitle": str,
+    "authors": str,
+    "categories": str,
+    "thumbnail": str,
+    "description": str,
+    "published_year": np.float64,
+    "average_rating": np.float64,
+    "num_pages": np.float64,
+    "ratings_count": np.float64,
+}
+
+
+def clean_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """Applies the cleaning rules to one block of raw rows with vectorized string operations.
 
     Args:
-        input_csv_path (str): Path to the input CSV file.
-        output_csv_path (Optional[str], optional): If provided, saves the cleaned dataset to this path. Defaults to None.
+        df (pd.DataFrame): Raw book rows.
 
     Returns:
-        pd.DataFrame: The cleaned and filtered books DataFrame.
+        pd.DataFrame: The rows that pass the filters, with 'subtitle' folded into 'title_and_subtitle' and an added 'tagged_description'.
     """
-    df = pd.read_csv(input_csv_path)
-
-    # Create missing description and age_of_books columns
-    df['missing_description'] = np.where(df['description'].isnull(), 1, 0)
-    df['age_of_books'] = 2025 - df['published_year']
-
     # Filter out books with missing values in specific columns
-    books = df.dropna(subset=['description', 'num_pages', 'average_rating', 'published_year']).copy()
+    books = df.dropna(subset=['description', 'num_pages', 'average_rating', 'published_year'])
 
     # Filter out books with less than 30 words in the description
-    books['words_in_description'] = books['description'].apply(lambda x: len(str(x).split()))
-    filtered_books = books[books['words_in_description'] > 30].copy()
+    words_in_description = books['description'].astype(str).str.count(r"\S+")
+    books = books[words_in_description > 30].copy()
 
     # Combine title and subtitle
-    filtered_books['title_and_subtitle'] = np.where(
-        filtered_books['subtitle'].isna(),
-        filtered_books['title'],
-        filtered_books[['title', 'subtitle']].astype(str).agg(": ".join, axis=1)
+    books['title_and_subtitle'] = books['title'].where(
+        books['subtitle'].isna(),
+        books['title'].astype(str) + ": " + books['subtitle'].astype(str),
     )
 
     # Create tagged_description
-    filtered_books['tagged_description'] = filtered_books[['isbn13', 'description']].astype(str).agg(" ".join, axis=1)
+    books['tagged_description'] = books['isbn13'].astype(str) + " " + books['description'].astype(str)
 
     # Drop unneeded columns
-    cleaned_books = filtered_books.drop(
-        ['subtitle', 'missing_description', 'age_of_books', 'words_in_description'],
-        axis=1
-    )
+    return books.drop(['subtitle'], axis=1)
+
+
+def clean_books_dataset(input_csv_path: str, output_csv_path: Optional[str] = None) -> pd.DataFrame:
+    """Cleans the book dataset by applying filtering, transformations, and feature engineering.
+
+    Args:
+        input_csv_path (str): Path to the input CSV file.
+        output_csv_path (Optional[str], optional): If provided, saves the cleaned dataset to this path. Defaults to None.
+
+    Returns:
+        pd.DataFrame: The cleaned and filtered books DataFrame.
+    """
+    cleaned_books = clean_chunk(pd.read_csv(input_csv_path, dtype=RAW_DTYPES))
 
     # Save if output path provided
     if output_csv_path:
         cleaned_books.to_csv(output_csv_path, index=False)
 
-    return cleaned_books
\ No newline at end of file
+    return cleaned_books
+
+
+def stream_clean_books_dataset(
+    input_csv_path: str,
+    output_csv_path: str,
+    description_txt_path: Optional[str] = None,
+    chunk_size: int = CLEAN_CHUNK_ROWS,
+) -> dict:
+    """Cleans the book dataset chunk by chunk, appending each cleaned chunk to the output.
+
+    Produces the same rows as `clean_books_dataset`, but only `chunk_size` raw rows are held in memory at a time, so catalogs larger than RAM can be cleaned. Outputs are written to temporary files and renamed once complete, so an interrupted run never leaves a truncated dataset behind.
+
+    Args:
+        input_csv_path (str): Path to the input CSV file.
+        output_csv_path (str): Where to write the cleaned dataset.
+        description_txt_path (Optional[str], optional): If provided, the tagged descriptions are also written here, one per line. Defaults to None.
+        chunk_size (int, optional): Raw rows read per chunk. Defaults to CLEAN_CHUNK_ROWS.
+
+    Returns:
+        dict: Ingestion statistics: 'rows_read', 'rows_written', 'seconds' and 'rows_per_second'.
+    """
+    tmp_output = f"{output_csv_path}.tmp"
+    tmp_descriptions = f"{description_txt_path}.tmp" if description_txt_path else None
+    rows_read = rows_written = 0
+    start = time.perf_counter()
+
+    with open(tmp_output, "w", encoding="utf-8", newline="") as out, \
+            open(tmp_descriptions or os.devnull, "w", encoding="utf-8") as descriptions:
+        for i, chunk in enumerate(pd.read_csv(input_csv_path, dtype=RAW_DTYPES, chunksize=chunk_size)):
+            cleaned = clean_chunk(chunk)
+            cleaned.to_csv(out, index=False, header=(i == 0))
+            if tmp_descriptions:
+                cleaned['tagged_description'].to_csv(descriptions, sep='\n', index=False, header=False)
+
+            rows_read += len(chunk)
+            rows_written += len(cleaned)
+            elapsed = time.perf_counter() - start
+            print(f"Cleaned {rows_read} rows ({rows_read / max(elapsed, 1e-9):,.0f} rows/s), kept {rows_written}.")
+
+    os.replace(tmp_output, output_csv_path)
+    if tmp_descriptions:
+        os.replace(tmp_descriptions, description_txt_path)
+
+    seconds = time.perf_counter() - start
+    return {
+        "rows_read": rows_read,
+        "rows_written": rows_written,
+        "seconds": seconds,
+        "rows_per_second": rows_read / max(seconds, 1e-9),
+    }
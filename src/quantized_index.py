@@ -0,0 +1,288 @@
+import json
+import os
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+from src.vector_index import (
+    QUERY_BLOCK_SIZE, SUBSET_SCAN_FRACTION, NumpyVectorIndex, SearchResult, normalize_rows, top_k_rows,
+)
+
+QUANTIZATION_MODES = ("int8", "float16")
+
+# Candidates kept from the compressed scan per requested result, then rescored at full precision.
+RESCORE_FACTOR = 4
+
+# Minimum shortlist size, so small top-k requests still rescore a useful number of candidates.
+MIN_SHORTLIST = 32
+
+# Code rows decoded to float32 at once during a scan; bounds the temporary buffer to (rows x dim).
+SCAN_BLOCK_ROWS = 16384
+
+# Norm of the random offset added to each sampled book embedding to make a report query, relative to the unit embedding.
+REPORT_QUERY_NOISE = 0.5
+
+
+def quantize(embeddings: np.ndarray, mode: str = "int8") -> tuple[np.ndarray, np.ndarray]:
+    """Compresses a (books x dim) float32 matrix.
+
+    Args:
+        embeddings (np.ndarray): L2-normalized float32 embeddings.
+        mode (str, optional): 'int8' for symmetric scalar quantization with one scale per dimension, or 'float16'. Defaults to 'int8'.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The codes and the float32 per-dimension scale (all ones for float16), such that `codes * scale` approximates `embeddings`.
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode '{mode}'; expected one of {QUANTIZATION_MODES}")
+    dim = embeddings.shape[1] if embeddings.ndim == 2 else 0
+    if mode == "float16":
+        return np.asarray(embeddings, dtype=np.float16), np.ones(dim, dtype=np.float32)
+
+    max_abs = np.zeros(dim, dtype=np.float32)
+    for start in range(0, len(embeddings), SCAN_BLOCK_ROWS):
+        np.maximum(max_abs, np.abs(embeddings[start:start + SCAN_BLOCK_ROWS]).max(axis=0), out=max_abs)
+    scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+
+    codes = np.empty(embeddings.shape, dtype=np.int8)
+    for start in range(0, len(embeddings), SCAN_BLOCK_ROWS):
+        block = np.asarray(embeddings[start:start + SCAN_BLOCK_ROWS], dtype=np.float32) / scale
+        codes[start:start + len(block)] = np.clip(np.rint(block), -127, 127)
+    return codes, scale
+
+
+def _codes_file(mode: str) -> str:
+    return f"codes_{mode}.npy"
+
+
+def _scale_file(mode: str) -> str:
+    return f"scale_{mode}.npy"
+
+
+def _quantized_manifest(mode: str) -> str:
+    return f"quantized_{mode}.json"
+
+
+class QuantizedVectorIndex:
+    """Two-stage cosine index: a scan over compressed codes, then exact rescoring of a shortlist.
+
+    The int8 (or float16) codes are the only per-book data scanned, so the resident index is a quarter (or half) the size of the float32 matrix. The full-precision matrix of the source `NumpyVectorIndex` stays memory-mapped and only the shortlisted rows, `RESCORE_FACTOR` times the requested top-k, are read from it.
+    """
+
+    def __init__(
+        self,
+        codes: np.ndarray,
+        scale: np.ndarray,
+        source: NumpyVectorIndex,
+        mode: str = "int8",
+        rescore_factor: int = RESCORE_FACTOR,
+    ):
+        if len(codes) != len(source):
+            raise ValueError(f"{len(codes)} codes but {len(source)} books in the source index")
+        self.codes = codes
+        self.scale = scale
+        self.source = source
+        self.mode = mode
+        self.rescore_factor = rescore_factor
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    @property
+    def isbns(self) -> np.ndarray:
+        return self.source.isbns
+
+    @property
+    def embedding(self):
+        return self.source.embedding
+
+    @property
+    def manifest_path(self) -> Optional[str]:
+        """Manifest of the source index; the codes are rebuilt whenever it changes."""
+        return self.source.manifest_path
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes scanned per query: the codes plus the per-dimension scale."""
+        return int(self.codes.nbytes + self.scale.nbytes)
+
+    @classmethod
+    def build(cls, source: NumpyVectorIndex, mode: str = "int8") -> "QuantizedVectorIndex":
+        """Quantizes a persisted NumPy index, writing the codes next to its files, and opens the result.
+
+        Args:
+            source (NumpyVectorIndex): Index opened from a directory with `NumpyVectorIndex.load` or `build`.
+            mode (str, optional): 'int8' or 'float16'. Defaults to 'int8'.
+
+        Returns:
+            QuantizedVectorIndex: The compressed index, rescoring against `source`.
+        """
+        if source.directory is None:
+            raise ValueError("QuantizedVectorIndex.build needs an index persisted to a directory")
+        codes, scale = quantize(source.embeddings, mode)
+
+        # Write then rename, so processes that still memory-map the old files keep a valid mapping.
+        for name, array in ((_codes_file(mode), codes), (_scale_file(mode), scale)):
+            tmp_path = os.path.join(source.directory, f"{name}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, os.path.join(source.directory, name))
+
+        manifest = {"mode": mode, "count": int(len(codes)), "source": NumpyVectorIndex.read_manifest(source.directory)}
+        tmp_path = os.path.join(source.directory, f"{_quantized_manifest(mode)}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(source.directory, _quantized_manifest(mode)))
+
+        return cls.load(source, mode)
+
+    @classmethod
+    def load(cls, source: NumpyVectorIndex, mode: str = "int8") -> "QuantizedVectorIndex":
+        """Opens codes written by `build` for `source`, memory-mapped."""
+        codes = np.load(os.path.join(source.directory, _codes_file(mode)), mmap_mode="r")
+        scale = np.load(os.path.join(source.directory, _scale_file(mode)))
+        return cls(codes, scale, source, mode=mode)
+
+    @staticmethod
+    def is_current(source: NumpyVectorIndex, mode: str = "int8") -> bool:
+        """True when `source` has codes for `mode` built from its current manifest."""
+        if source.directory is None:
+            return False
+        path = os.path.join(source.directory, _quantized_manifest(mode))
+        if not os.path.exists(path):
+            return False
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return manifest.get("source") == NumpyVectorIndex.read_manifest(source.directory)
+
+    def embed_queries(self, queries: Sequence[str]) -> np.ndarray:
+        """Embeds a batch of query strings with the source index's embedding model."""
+        return self.source.embed_queries(queries)
+
+    def _approximate_scores(self, vectors: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        # Folding the scale into the queries turns the scan into one product with the raw codes.
+        scaled = vectors * self.scale
+        codes = self.codes if rows is None else self.codes[rows]
+        scores = np.empty((len(vectors), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+            block = np.asarray(codes[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + len(block)] = scaled @ block.T
+        return scores
+
+    def _rescore(self, vector: np.ndarray, candidates: np.ndarray, top_k: int) -> SearchResult:
+        candidates = np.sort(candidates)
+        exact = np.asarray(self.source.embeddings[candidates]) @ vector
+        order = np.argsort(-exact, kind="stable")[:top_k]
+        return self.isbns[candidates[order]], exact[order]
+
+    def search_vectors(self, vectors: np.ndarray, top_k: int = 10, mask: Optional[np.ndarray] = None) -> list[SearchResult]:
+        """Runs a compressed scan followed by exact rescoring for a batch of query vectors.
+
+        Args:
+            vectors (np.ndarray): A (queries x dim) array, or a single vector.
+            top_k (int): Number of neighbours to return per query.
+            mask (Optional[np.ndarray]): Boolean row filter, either shared (books,) or per query (queries x books).
+
+        Returns:
+            list[SearchResult]: One (isbns, scores) pair per query, ordered by descending exact similarity.
+        """
+        vectors = normalize_rows(vectors)
+        mask = None if mask is None else np.asarray(mask, dtype=bool)
+        shortlist = max(top_k * self.rescore_factor, MIN_SHORTLIST)
+
+        subset = None
+        if mask is not None and mask.ndim == 1 and mask.sum() < len(self) * SUBSET_SCAN_FRACTION:
+            subset = np.flatnonzero(mask)
+
+        results = []
+        for start in range(0, len(vectors), QUERY_BLOCK_SIZE):
+            block = vectors[start:start + QUERY_BLOCK_SIZE]
+            scores = self._approximate_scores(block, subset)
+            if subset is None and mask is not None:
+                block_mask = mask if mask.ndim == 1 else mask[start:start + QUERY_BLOCK_SIZE]
+                scores = np.where(block_mask, scores, -np.inf)
+            rows, row_scores = top_k_rows(scores, shortlist)
+            for vector, r, s in zip(block, rows, row_scores):
+                candidates = r[np.isfinite(s)]
+                if subset is not None:
+                    candidates = subset[candidates]
+                results.append(self._rescore(vector, candidates, top_k))
+        return results
+
+    def search(self, queries: Sequence[str], top_k: int = 10, mask: Optional[np.ndarray] = None) -> list[SearchResult]:
+        """Embeds a batch of queries and returns the top-k (isbns, scores) for each of them."""
+        return self.search_vectors(self.embed_queries(queries), top_k, mask=mask)
+
+
+def load_or_build_quantized_index(source: NumpyVectorIndex, mode: str = "int8") -> QuantizedVectorIndex:
+    """Opens the compressed codes of `source`, rebuilding them when the source index has changed."""
+    if QuantizedVectorIndex.is_current(source, mode):
+        return QuantizedVectorIndex.load(source, mode)
+    return QuantizedVectorIndex.build(source, mode)
+
+
+def quantization_report(
+    source: NumpyVectorIndex,
+    modes: Sequence[str] = QUANTIZATION_MODES,
+    top_k: int = 10,
+    sample_queries: int = 200,
+    seed: int = 0,
+) -> dict:
+    """Measures memory savings and recall@k of each quantization mode against the exact index.
+
+    Queries are the stored embeddings of a random sample of books, moved by a random offset of norm REPORT_QUERY_NOISE, so no model is needed. The sampled book itself is dropped from both the exact and the compressed results, so a query finding its own vector does not inflate recall. Recall is reported both for the compressed scan alone and after exact rescoring of the shortlist.
+
+    Args:
+        source (NumpyVectorIndex): The exact, persisted index.
+        modes (Sequence[str], optional): Quantization modes to evaluate. Defaults to all of QUANTIZATION_MODES.
+        top_k (int, optional): k used for recall@k. Defaults to 10.
+        sample_queries (int, optional): Number of books used as queries. Defaults to 200.
+        seed (int, optional): Seed for the query sample. Defaults to 0.
+
+    Returns:
+        dict: Per-mode index bytes, compression ratio, recall@k (for k = 'top_k') with and without rescoring, and mean search latency, alongside the float32 baseline.
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(source), size=min(sample_queries, len(source)), replace=False))
+    queries = np.asarray(source.embeddings[rows], dtype=np.float32)
+    offsets = rng.normal(size=queries.shape).astype(np.float32)
+    queries = normalize_rows(queries + REPORT_QUERY_NOISE * normalize_rows(offsets))
+    query_isbns = np.asarray(source.isbns)[rows]
+
+    # One extra result per query, so top_k remain once the sampled book is dropped.
+    started = time.perf_counter()
+    exact = source.search_vectors(queries, top_k=top_k + 1)
+    baseline_ms = (time.perf_counter() - started) * 1000 / max(len(queries), 1)
+
+    def recall(results: list[SearchResult]) -> float:
+        hits = []
+        for (found, _), (truth, _), isbn in zip(results, exact, query_isbns):
+            found, truth = found[found != isbn][:top_k], truth[truth != isbn][:top_k]
+            hits.append(len(np.intersect1d(found, truth)) / max(len(truth), 1))
+        return round(float(np.mean(hits)), 4) if hits else 0.0
+
+    report = {
+        "books": int(len(source)),
+        "dim": int(source.dim),
+        "top_k": top_k,
+        "queries": int(len(queries)),
+        "float32": {"bytes": int(source.embeddings.nbytes), "ms_per_query": round(baseline_ms, 3)},
+    }
+    for mode in modes:
+        index = load_or_build_quantized_index(source, mode)
+        scan_only = []
+        for start in range(0, len(queries), QUERY_BLOCK_SIZE):
+            block_rows, block_scores = top_k_rows(index._approximate_scores(queries[start:start + QUERY_BLOCK_SIZE]), top_k + 1)
+            scan_only.extend((source.isbns[r], s) for r, s in zip(block_rows, block_scores))
+        started = time.perf_counter()
+        rescored = index.search_vectors(queries, top_k=top_k + 1)
+        elapsed_ms = (time.perf_counter() - started) * 1000 / max(len(queries), 1)
+        report[mode] = {
+            "bytes": index.nbytes,
+            "compression": round(source.embeddings.nbytes / max(index.nbytes, 1), 2),
+            "recall_scan_only": recall(scan_only),
+            "recall_rescored": recall(rescored),
+            "ms_per_query": round(elapsed_ms, 3),
+        }
+    return report
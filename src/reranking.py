@@ -0,0 +1,130 @@
+import math
+from dataclasses import dataclass
+from typing import Mapping, Optional
+
+import numpy as np
+
+from src.book_table import BookTable
+from src.config import EMOTION_STRENGTH, TONE_EMOTIONS
+from src.sentiment.config import EMOTION_LABELS
+
+# Candidates retrieved for a query with an emotion preference, re-ranked before truncating to top_k.
+RERANK_CANDIDATES = 1000
+
+# Latency budget for re-ranking one query's candidates; `python benchmark.py run` reports it against this.
+RERANK_BUDGET_MS = 2.0
+
+
+@dataclass(frozen=True)
+class EmotionPreference:
+    """Emotions a query wants more of, used to re-rank retrieved candidates rather than to filter them.
+
+    Instances are immutable and hashable, like `RecommendationFilter`.
+
+    Attributes:
+        weights (tuple[tuple[str, float], ...]): (emotion column, weight) pairs; weights are non-negative and sum to 1.
+        strength (float): Share of the blended score given to emotions, between 0 (similarity only) and 1 (emotions only).
+    """
+    weights: tuple[tuple[str, float], ...] = ()
+    strength: float = EMOTION_STRENGTH
+
+    @classmethod
+    def build(
+        cls,
+        emotions: Optional[Mapping[str, float]] = None,
+        tone: Optional[str] = None,
+        strength: float = EMOTION_STRENGTH,
+    ) -> "EmotionPreference":
+        """Creates a preference from emotion weights and/or a dashboard tone, treating "All" as no preference.
+
+        Args:
+            emotions (Optional[Mapping[str, float]]): Relative weight per emotion, e.g. {"joy": 0.8, "surprise": 0.2}.
+            tone (Optional[str]): A key of TONE_EMOTIONS, whose weights are added to `emotions`.
+            strength (float, optional): Share of the blended score given to emotions. Defaults to EMOTION_STRENGTH.
+
+        Returns:
+            EmotionPreference: The preference, with weights normalized to sum to 1.
+        """
+        weights = dict(emotions or {})
+        if tone not in (None, "All"):
+            if tone not in TONE_EMOTIONS:
+                raise ValueError(f"Unknown tone '{tone}'; expected one of {', '.join(TONE_EMOTIONS)}")
+            for emotion, weight in TONE_EMOTIONS[tone].items():
+                weights[emotion] = weights.get(emotion, 0.0) + weight
+        unknown = sorted(set(weights) - set(EMOTION_LABELS))
+        if unknown:
+            raise ValueError(f"Unknown emotions {unknown}; expected any of {', '.join(EMOTION_LABELS)}")
+        if not all(math.isfinite(weight) for weight in weights.values()):
+            raise ValueError("Emotion weights must be finite numbers")
+        if any(weight < 0 for weight in weights.values()):
+            raise ValueError("Emotion weights must not be negative")
+        if not 0.0 <= strength <= 1.0:  # also rejects NaN
+            raise ValueError("Emotion strength must be between 0 and 1")
+        total = sum(weights.values())
+        return cls(
+            weights=tuple(sorted((emotion, weight / total) for emotion, weight in weights.items() if weight > 0)),
+            strength=strength,
+        )
+
+    def is_empty(self) -> bool:
+        """True when the preference leaves the similarity ranking unchanged."""
+        return not self.weights or self.strength == 0.0
+
+
+def parse_emotion_weights(text: str) -> dict[str, float]:
+    """Parses 'joy=0.8, surprise=0.2' into {'joy': 0.8, 'surprise': 0.2}; a bare emotion name has weight 1."""
+    weights = {}
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, weight = item.partition("=")
+        try:
+            weights[name.strip().lower()] = float(weight) if weight.strip() else 1.0
+        except ValueError:
+            raise ValueError(f"Invalid emotion weight '{item}'; expected emotion=weight")
+    return weights
+
+
+def rerank_by_emotion(
+    books: BookTable,
+    isbns: np.ndarray,
+    scores: np.ndarray,
+    preference: EmotionPreference,
+    top_k: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Re-ranks a query's candidates by similarity blended with their weighted emotion scores.
+
+    Similarities are min-max normalized over the candidates, so the blend works the same for cosine, BM25 and fusion scores. Emotion scores are gathered from the table's cached columns for the candidates only, so the cost grows with the number of candidates, not the catalog. Candidates missing from the table, or without scores, count as 0 for every emotion.
+
+    Args:
+        books (BookTable): Book metadata holding the emotion columns.
+        isbns (np.ndarray): Candidate ISBNs, best first.
+        scores (np.ndarray): Candidate similarity scores, aligned with `isbns`.
+        preference (EmotionPreference): Emotion weights and their share of the blended score.
+        top_k (int): Number of candidates to keep.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: The top ISBNs, their original similarities and their blended scores, best first.
+    """
+    isbns = np.asarray(isbns, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float32)
+    if len(isbns) == 0:
+        return isbns, scores, scores
+
+    positions = books.positions(isbns)
+    found = positions >= 0
+    emotion = np.zeros(len(isbns), dtype=np.float32)
+    for name, weight in preference.weights:
+        emotion[found] += weight * np.nan_to_num(books.numeric_column(name)[positions[found]])
+
+    low, high = scores.min(), scores.max()
+    relevance = (scores - low) / (high - low) if high > low else np.ones_like(scores)
+    blended = (1.0 - preference.strength) * relevance + preference.strength * emotion
+
+    # Select the top_k before sorting them; the stable sort keeps equal blended scores in retrieval order.
+    order = np.arange(len(blended))
+    if top_k < len(blended):
+        order = np.sort(np.argpartition(-blended, top_k - 1)[:top_k])
+    order = order[np.argsort(-blended[order], kind="stable")]
+    return isbns[order], scores[order], blended[order]
@@ -1,24 +1,313 @@
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Optional, Sequence
+
+import numpy as np
 import pandas as pd
-from langchain_chroma import Chroma
 
-def retrieve_semantic_recommendations(query: str, db: Chroma, books_df: pd.DataFrame, top_k: int = 10) -> pd.DataFrame:
+from src.book_table import BookTable, as_book_table
+from src.cache import RetrievalCache
+from src.filters import RecommendationFilter
+from src.lexical_index import LexicalIndex
+from src.metrics import increment, timer
+from src.reranking import RERANK_CANDIDATES, EmotionPreference, rerank_by_emotion
+from src.vector_index import NumpyVectorIndex, as_vector_index
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+# Reciprocal rank fusion constant: a book at rank r in one ranking contributes 1 / (RRF_K + r).
+RRF_K = 60
+
+# Candidates taken from each of the lexical and dense rankings before fusing them.
+FUSION_CANDIDATES = 50
+
+# Histogram of the time spent in each retrieval stage ('cache', 'embed', 'filter', 'search', 'rerank', 'join', 'lexical', 'fuse').
+STAGE_METRIC = "retrieval_stage_seconds"
+
+
+def retrieve_semantic_recommendations(
+    query: str,
+    db: "Chroma | NumpyVectorIndex",
+    books_df: BookTable | pd.DataFrame,
+    top_k: int = 10,
+    filters: Optional[RecommendationFilter] = None,
+    cache: Optional[RetrievalCache] = None,
+    preference: Optional[EmotionPreference] = None,
+) -> pd.DataFrame:
     """
     Retrieves semantically similar books to a query using vector search.
 
     Args:
         query (str): User query or book description.
-        db (Chroma): Chroma vector DB instance.
-        books_df (pd.DataFrame): Full DataFrame with book metadata.
+        db (Chroma | NumpyVectorIndex): Chroma vector DB instance or in-process NumPy index.
+        books_df (BookTable | pd.DataFrame): Book metadata. Pass a BookTable built once at startup; a DataFrame is re-indexed on every call.
+        top_k (int): Number of top recommendations to return.
+        filters (Optional[RecommendationFilter]): Category, emotion, rating and page-count constraints, applied inside the search so up to `top_k` matching books are returned.
+        cache (Optional[RetrievalCache]): Query embedding and result cache to consult before calling the model or searching.
+        preference (Optional[EmotionPreference]): Emotions to favour; the top RERANK_CANDIDATES books are re-ranked by similarity blended with these emotions before truncation.
+
+    Returns:
+        pd.DataFrame: Recommended books, best first, with 'similarity' and 'rank' columns. When re-ranked by `preference`, they are ordered by the blended score, given in a 'score' column.
+    """
+    return retrieve_batch_recommendations([query], db, books_df, top_k=top_k, filters=[filters], cache=cache, preferences=[preference])[0]
+
+
+def retrieve_batch_recommendations(
+    queries: Sequence[str],
+    db: "Chroma | NumpyVectorIndex",
+    books_df: BookTable | pd.DataFrame,
+    top_k: int = 10,
+    filters: Optional[Sequence[Optional[RecommendationFilter]]] = None,
+    query_vectors: Optional[np.ndarray] = None,
+    cache: Optional[RetrievalCache] = None,
+    preferences: Optional[Sequence[Optional[EmotionPreference]]] = None,
+) -> list[pd.DataFrame]:
+    """
+    Retrieves recommendations for several queries with one batched embedding pass and one vectorized search.
+
+    Args:
+        queries (Sequence[str]): User queries.
+        db (Chroma | NumpyVectorIndex): Chroma vector DB instance or in-process NumPy index.
+        books_df (BookTable | pd.DataFrame): Book metadata, preferably a BookTable built once at startup.
+        top_k (int): Number of top recommendations to return per query.
+        filters (Optional[Sequence[Optional[RecommendationFilter]]]): One filter (or None) per query.
+        query_vectors (Optional[np.ndarray]): Precomputed query embeddings; the queries are embedded if omitted.
+        cache (Optional[RetrievalCache]): Query embedding and result cache. Only queries missing from the result cache are searched, and only those missing from the embedding cache are embedded.
+        preferences (Optional[Sequence[Optional[EmotionPreference]]]): One emotion preference (or None) per query. If any query has one, the batch is searched RERANK_CANDIDATES deep and those queries' candidates are re-ranked before truncation.
+
+    Returns:
+        list[pd.DataFrame]: One ranked DataFrame per query, as returned by `retrieve_semantic_recommendations`.
+    """
+    books = as_book_table(books_df)
+    preferences = [p if p is not None and not p.is_empty() else None for p in preferences or [None] * len(queries)]
+    depth = max(top_k, RERANK_CANDIDATES) if any(preferences) else top_k
+    hits = search_hits(queries, db, books, top_k=depth, filters=filters, query_vectors=query_vectors, cache=cache)
+    return rank_hits(books, hits, preferences, top_k)
+
+
+def search_hits(
+    queries: Sequence[str],
+    db: "Chroma | NumpyVectorIndex",
+    books: BookTable,
+    top_k: int = 10,
+    filters: Optional[Sequence[Optional[RecommendationFilter]]] = None,
+    query_vectors: Optional[np.ndarray] = None,
+    cache: Optional[RetrievalCache] = None,
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Embeds and searches a batch of queries, returning each query's ranked (ISBNs, scores) without gathering metadata.
+
+    Arguments are as for `retrieve_batch_recommendations`.
+    """
+    index = as_vector_index(db)
+    filters = list(filters) if filters is not None else [None] * len(queries)
+    hits: list = [None] * len(queries)
+
+    increment("retrieval_queries", len(queries))
+
+    if cache is not None:
+        with timer(STAGE_METRIC, stage="cache"):
+            cache.validate(index)
+            keys = [cache.result_key(q, f, top_k) for q, f in zip(queries, filters)]
+            hits = [cache.get_results(key) for key in keys]
+    pending = [i for i, hit in enumerate(hits) if hit is None]
+    if cache is not None:
+        increment("retrieval_cache_hits", len(queries) - len(pending))
+
+    if pending:
+        if query_vectors is not None:
+            vectors = np.asarray(query_vectors)[pending]
+        else:
+            vectors = embed_queries(index, [queries[i] for i in pending], cache)
+
+        with timer(STAGE_METRIC, stage="filter"):
+            pending_filters = [filters[i] for i in pending]
+            if any(f is not None and not f.is_empty() for f in pending_filters):
+                masks = [books.index_mask(index.isbns, f) for f in pending_filters]
+            else:
+                # Unfiltered searches never need the index's ISBN list, which a Chroma store fetches in full.
+                masks = [None] * len(pending_filters)
+            if all(m is None for m in masks):
+                mask = None
+            elif len(set(pending_filters)) == 1:
+                mask = masks[0]
+            else:
+                mask = np.stack([np.ones(len(index.isbns), dtype=bool) if m is None else m for m in masks])
+
+        with timer(STAGE_METRIC, stage="search"):
+            results = index.search_vectors(vectors, top_k=top_k, mask=mask)
+        for i, hit in zip(pending, results):
+            hits[i] = hit
+            if cache is not None:
+                cache.put_results(keys[i], *hit)
+
+    return hits
+
+
+def rank_hits(
+    books: BookTable,
+    hits: Sequence[tuple[np.ndarray, np.ndarray]],
+    preferences: Sequence[Optional[EmotionPreference]],
+    top_k: int,
+) -> list[pd.DataFrame]:
+    """Re-ranks each query's candidates by its emotion preference, truncates them to `top_k` and gathers their rows.
+
+    Queries re-ranked by a preference get a 'score' column with the blended score.
+    """
+    ranked = []
+    with timer(STAGE_METRIC, stage="rerank") if any(preferences) else nullcontext():
+        for (isbns, scores), preference in zip(hits, preferences):
+            if preference is None:
+                ranked.append((isbns[:top_k], scores[:top_k], None))
+            else:
+                ranked.append(rerank_by_emotion(books, isbns, scores, preference, top_k))
+
+    with timer(STAGE_METRIC, stage="join"):
+        recs = []
+        for isbns, scores, blended in ranked:
+            rows = books.take(isbns, scores)
+            if blended is not None:
+                rows["score"] = blended[books.positions(isbns) >= 0]
+            recs.append(rows)
+        return recs
+
+
+def embed_queries(index, queries: list[str], cache: Optional[RetrievalCache] = None) -> np.ndarray:
+    """Embeds queries in one batch with the index's model, reusing cached vectors for queries seen before."""
+    if cache is None:
+        increment("model_inputs", len(queries), model="embedding")
+        with timer(STAGE_METRIC, stage="embed"):
+            return index.embed_queries(queries)
+    vectors = [cache.get_embedding(q) for q in queries]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+    if missing:
+        increment("model_inputs", len(missing), model="embedding")
+        with timer(STAGE_METRIC, stage="embed"):
+            embedded = index.embed_queries([queries[i] for i in missing])
+        for i, vector in zip(missing, embedded):
+            cache.put_embedding(queries[i], vector)
+            vectors[i] = vector
+    return np.stack(vectors)
+
+
+def fuse_rankings(rankings: Sequence[np.ndarray], top_k: int = 10, rrf_k: int = RRF_K) -> tuple[np.ndarray, np.ndarray]:
+    """Merges ranked ISBN lists with reciprocal rank fusion.
+
+    Args:
+        rankings (Sequence[np.ndarray]): ISBN arrays, each ordered best first.
+        top_k (int): Number of fused results to return.
+        rrf_k (int): Fusion constant; larger values flatten the advantage of top ranks.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Fused ISBNs and their fusion scores, best first.
+    """
+    rankings = [np.asarray(r, dtype=np.int64) for r in rankings if len(r)]
+    if not rankings:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    isbns = np.concatenate(rankings)
+    contributions = np.concatenate([1.0 / (rrf_k + np.arange(1, len(r) + 1)) for r in rankings])
+    unique, inverse = np.unique(isbns, return_inverse=True)
+    scores = np.bincount(inverse, weights=contributions).astype(np.float32)
+    order = np.argsort(-scores, kind="stable")[:top_k]
+    return unique[order], scores[order]
+
+
+def retrieve_hybrid_recommendations(
+    query: str,
+    db: "Chroma | NumpyVectorIndex",
+    books_df: BookTable | pd.DataFrame,
+    lexical: LexicalIndex,
+    top_k: int = 10,
+    filters: Optional[RecommendationFilter] = None,
+    cache: Optional[RetrievalCache] = None,
+    preference: Optional[EmotionPreference] = None,
+) -> pd.DataFrame:
+    """
+    Retrieves books for a query by fusing BM25 and dense rankings, answering exact title queries from the lexical index alone.
+
+    Args:
+        query (str): User query, book title or author name.
+        db (Chroma | NumpyVectorIndex): Chroma vector DB instance or in-process NumPy index.
+        books_df (BookTable | pd.DataFrame): Book metadata, preferably a BookTable built once at startup.
+        lexical (LexicalIndex): BM25 index over titles, authors and descriptions.
         top_k (int): Number of top recommendations to return.
+        filters (Optional[RecommendationFilter]): Constraints applied inside both searches.
+        cache (Optional[RetrievalCache]): Query embedding and result cache for the dense search.
+        preference (Optional[EmotionPreference]): Emotions to favour when re-ranking the fused candidates; exact title matches are not re-ranked.
+
+    Returns:
+        pd.DataFrame: Recommended books, best first, with 'similarity' (the fusion or BM25 score) and 'rank' columns, and 'score' when re-ranked.
+    """
+    return retrieve_hybrid_batch([query], db, books_df, lexical, top_k=top_k, filters=[filters], cache=cache, preferences=[preference])[0]
+
+
+def retrieve_hybrid_batch(
+    queries: Sequence[str],
+    db: "Chroma | NumpyVectorIndex",
+    books_df: BookTable | pd.DataFrame,
+    lexical: LexicalIndex,
+    top_k: int = 10,
+    filters: Optional[Sequence[Optional[RecommendationFilter]]] = None,
+    cache: Optional[RetrievalCache] = None,
+    preferences: Optional[Sequence[Optional[EmotionPreference]]] = None,
+) -> list[pd.DataFrame]:
+    """
+    Hybrid retrieval for several queries; only queries without an exact title match are embedded and searched densely.
+
+    A query equal to a book title (ignoring case and punctuation) returns the matching books first, followed by the best BM25 matches, without running the embedding model. Other queries take the top FUSION_CANDIDATES books from BM25 and from a batched dense search and fuse them with reciprocal rank fusion.
+
+    Args:
+        queries (Sequence[str]): User queries.
+        db (Chroma | NumpyVectorIndex): Chroma vector DB instance or in-process NumPy index.
+        books_df (BookTable | pd.DataFrame): Book metadata, preferably a BookTable built once at startup.
+        lexical (LexicalIndex): BM25 index over titles, authors and descriptions.
+        top_k (int): Number of top recommendations to return per query.
+        filters (Optional[Sequence[Optional[RecommendationFilter]]]): One filter (or None) per query.
+        cache (Optional[RetrievalCache]): Query embedding and result cache for the dense search.
+        preferences (Optional[Sequence[Optional[EmotionPreference]]]): One emotion preference (or None) per query. Queries with one fuse RERANK_CANDIDATES candidates from each ranking and re-rank them before truncation.
 
     Returns:
-        pd.DataFrame: Filtered DataFrame of recommended books.
+        list[pd.DataFrame]: One ranked DataFrame per query, as returned by `retrieve_hybrid_recommendations`.
     """
+    books = as_book_table(books_df)
+    filters = list(filters) if filters is not None else [None] * len(queries)
+    preferences = [p if p is not None and not p.is_empty() else None for p in preferences or [None] * len(queries)]
+    depth = max(top_k, FUSION_CANDIDATES, RERANK_CANDIDATES if any(preferences) else 0)
+    results: list = [None] * len(queries)
+    lexical_rankings: dict[int, np.ndarray] = {}
+
+    for i, (query, query_filter) in enumerate(zip(queries, filters)):
+        with timer(STAGE_METRIC, stage="filter"):
+            mask = books.index_mask(lexical.isbns, query_filter)
+        with timer(STAGE_METRIC, stage="lexical"):
+            titles = lexical.title_matches(query, mask)
+            if len(titles) >= top_k:
+                # Exact title hits fill the list on their own, so the full BM25 pass is skipped.
+                positions, scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            else:
+                positions, scores = lexical.score(query, mask)
+            order = np.argsort(-scores, kind="stable")
+        if len(titles):
+            # Exact title hits lead, ordered by BM25; the rest of the list is filled with lexical matches.
+            with timer(STAGE_METRIC, stage="lexical"):
+                title_scores = lexical.score_positions(query, titles)
+            title_order = np.argsort(-title_scores, kind="stable")
+            rest = order[~np.isin(positions[order], titles)]
+            ranked_isbns = np.concatenate([lexical.isbns[titles[title_order]], lexical.isbns[positions[rest]]])[:top_k]
+            ranked_scores = np.concatenate([title_scores[title_order], scores[rest]])[:top_k]
+            increment("retrieval_title_matches")
+            with timer(STAGE_METRIC, stage="join"):
+                results[i] = books.take(ranked_isbns, ranked_scores)
+        else:
+            lexical_rankings[i] = lexical.isbns[positions[order[:depth]]]
 
-    recs = db.similarity_search(query, k=top_k)
-    books_list = []
+    pending = sorted(lexical_rankings)
+    if pending:
+        dense = search_hits([queries[i] for i in pending], db, books, top_k=depth, filters=[filters[i] for i in pending], cache=cache)
+        fused = []
+        for i, (dense_isbns, _) in zip(pending, dense):
+            with timer(STAGE_METRIC, stage="fuse"):
+                fused.append(fuse_rankings([dense_isbns, lexical_rankings[i]], top_k=depth if preferences[i] else top_k))
+        for i, recs in zip(pending, rank_hits(books, fused, [preferences[i] for i in pending], top_k)):
+            results[i] = recs
 
-    for i in range(0, len(recs)):
-        books_list += [int(recs[i].page_content.split()[0].strip())]
-    
-    return books_df[books_df['isbn13'].isin(books_list)]
\ No newline at end of file
+    return results
@@ -1,33 +1,91 @@
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
-from .config import get_emotion_classifier, EMOTION_LABELS
-from .utils import calculate_max_emotion_scores
+from src.metrics import increment, timer
+from src.models import MODEL_METRIC
+from .config import get_emotion_classifier, EMOTION_LABELS, EMOTION_BATCH_SIZE
+from .utils import segment_max
 
-def analyze_book_emotions(books_df: pd.DataFrame) -> pd.DataFrame:
+# Sentences handed to the pipeline per call; each call is split into `batch_size` forward passes.
+SENTENCES_PER_CALL = 4096
+
+
+def split_sentences(description: str) -> list[str]:
+    """Splits a description on '.' into stripped, non-empty sentences."""
+    return [sentence.strip() for sentence in str(description).split(".") if sentence.strip()]
+
+
+def score_sentences(classifier, sentences: list[str], batch_size: int = EMOTION_BATCH_SIZE) -> np.ndarray:
+    """Scores unique sentences with the emotion classifier in length-bucketed batches.
+
+    Sentences are sorted by length before batching so that each forward pass pads to a similar length, then the scores are scattered back to the input order.
+
+    Args:
+        classifier: A Hugging Face text-classification pipeline returning scores for all labels.
+        sentences (list[str]): Sentences to score.
+        batch_size (int, optional): Sentences per forward pass. Defaults to EMOTION_BATCH_SIZE.
+
+    Returns:
+        np.ndarray: A (sentences x EMOTION_LABELS) float32 matrix of emotion scores.
+    """
+    label_columns = {label: j for j, label in enumerate(EMOTION_LABELS)}
+    scores = np.zeros((len(sentences), len(EMOTION_LABELS)), dtype=np.float32)
+    order = np.argsort([len(sentence) for sentence in sentences], kind="stable")
+
+    with tqdm(total=len(sentences), desc="Scoring sentence emotions") as progress:
+        for start in range(0, len(order), SENTENCES_PER_CALL):
+            rows = order[start:start + SENTENCES_PER_CALL]
+            with timer(MODEL_METRIC, model="emotion"):
+                predictions = classifier([sentences[r] for r in rows], batch_size=batch_size, truncation=True)
+            increment("model_inputs", len(rows), model="emotion")
+            for row, prediction in zip(rows, predictions):
+                for item in prediction:
+                    scores[row, label_columns[item["label"]]] = item["score"]
+            progress.update(len(rows))
+
+    return scores
+
+
+def analyze_book_emotions(books_df: pd.DataFrame, batch_size: int = EMOTION_BATCH_SIZE, classifier=None) -> pd.DataFrame:
     """Analyzes the emotional tone of each book description in the provided DataFrame and appends the emotion scores to the original DataFrame.
 
-    This function uses an emotion classifier to evaluate the emotional sentiment of each book's description (e.g., joy, fear, sadness, anger, etc.). It processes the description of each book, calculates the maximum emotion score for each predefined label, and returns the modified DataFrame with added emotion scores.
+    All descriptions are split into sentences up front; empty and duplicate sentences are dropped, and the remaining ones are scored in length-sorted batches of `batch_size`. Each book's score for a label is the maximum over its sentences, computed with a vectorized segment max.
 
     Args:
         books_df (pd.DataFrame): A DataFrame containing the metadata and descriptions of books.
+        batch_size (int, optional): Sentences per forward pass. Defaults to EMOTION_BATCH_SIZE.
+        classifier (optional): A loaded emotion pipeline to reuse across calls. Loaded with `get_emotion_classifier` if None.
 
     Returns:
         pd.DataFrame: A DataFrame with additional columns for each emotion score (e.g., 'joy', 'fear', 'sadness', 'anger', 'surprise') for each book.
     """
-    classifier = get_emotion_classifier()
-    isbn = []
-    emotion_scores = {label: [] for label in EMOTION_LABELS}
-
-    for i in tqdm(range(len(books_df)), desc="Analyzing book emotions"):
-        isbn.append(books_df["isbn13"][i])
-        sentences = books_df["description"][i].split(".")
-        predictions = classifier(sentences)
-        max_scores = calculate_max_emotion_scores(predictions)
-        for label in EMOTION_LABELS:
-            emotion_scores[label].append(max_scores[label])
-
-    emotions_df = pd.DataFrame(emotion_scores)
-    emotions_df["isbn13"] = isbn
-
-    return pd.merge(books_df, emotions_df, on="isbn13") 
+    unique_sentences: dict[str, int] = {}
+    sentence_ids = []
+    offsets = [0]
+    for description in books_df["description"]:
+        for sentence in split_sentences(description):
+            sentence_ids.append(unique_sentences.setdefault(sentence, len(unique_sentences)))
+        offsets.append(len(sentence_ids))
+
+    if classifier is None:
+        classifier = get_emotion_classifier()
+    sentence_scores = score_sentences(classifier, list(unique_sentences), batch_size=batch_size)
+    book_scores = segment_max(sentence_scores[np.asarray(sentence_ids, dtype=np.int64)], np.asarray(offsets))
+
+    emotions_df = pd.DataFrame(book_scores, columns=EMOTION_LABELS)
+    emotions_df["isbn13"] = books_df["isbn13"].to_numpy()
+
+    return pd.merge(books_df, emotions_df.drop_duplicates(subset="isbn13"), on="isbn13")
+
+
+def emotion_shard_task(shard_df: pd.DataFrame) -> pd.DataFrame:
+    """Sharded-executor task: scores one shard of books with this worker's shared emotion model instance.
+
+    Args:
+        shard_df (pd.DataFrame): Books with 'isbn13' and 'description'; other columns (e.g. 'input_hash') are passed through.
+
+    Returns:
+        pd.DataFrame: The shard without 'description', plus one column per emotion label.
+    """
+    return analyze_book_emotions(shard_df, classifier=get_emotion_classifier()).drop(columns=["description"])
@@ -1,15 +1,20 @@
-from transformers import pipeline
+from src.models import hf_pipeline
+
+EMOTION_MODEL_NAME = "j-hartmann/emotion-english-distilroberta-base"
 
 def get_emotion_classifier():
-    """Loads and returns an emotion classification pipeline for analyzing text sentiment.
+    """Returns the emotion classification pipeline for analyzing text sentiment, loaded once per process by the model registry.
 
     Returns:
         pipeline: A Hugging Face `pipeline` object configured for text classification using the `j-hartmann/emotion-english-distilroberta-base` model.
     """
-    return pipeline(
+    return hf_pipeline(
         "text-classification",
-        model="j-hartmann/emotion-english-distilroberta-base",
+        EMOTION_MODEL_NAME,
         top_k=None
     )
 
-EMOTION_LABELS = ["anger", "disgust", "fear", "joy", "sadness", "surprise", "neutral"]
\ No newline at end of file
+EMOTION_LABELS = ["anger", "disgust", "fear", "joy", "sadness", "surprise", "neutral"]
+
+# Sentences per forward pass in `analyze_book_emotions`; sentences are length-sorted first so each batch pads to similar lengths.
+EMOTION_BATCH_SIZE = 64
@@ -1,23 +1,21 @@
 import numpy as np
-from typing import List, Dict
-from .config import EMOTION_LABELS
 
-def calculate_max_emotion_scores(predictions: List[List[Dict]]) -> Dict[str, float]:
-    """Calculate the maximum emotion scores from the predictions for each emotion label.
+def segment_max(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Computes the row-wise maximum of each contiguous segment of `values`.
 
-    This function processes the predictions returned by the emotion classifier, which contain the predicted emotion labels and their associated scores. It then extracts the maximum score for each emotion label (e.g., joy, sadness, fear, etc.) across all predictions for a single book.
+    Segment `i` spans rows `offsets[i]:offsets[i + 1]`. The analyzer uses it to reduce a flattened sentence-by-emotion score matrix to one row of maximum scores per book.
 
     Args:
-        predictions (List[List[Dict]]): A list of predictions, where each prediction is a list of dictionaries containing a "label" (emotion) and its corresponding "score". This list represents the classification output for a book description.
+        values (np.ndarray): A (rows x columns) score matrix.
+        offsets (np.ndarray): Monotonic segment boundaries of length `segments + 1`, starting at 0 and ending at `len(values)`.
 
     Returns:
-        Dict[str, float]: A dictionary where each key is an emotion label (e.g., "joy", "sadness", etc.) and the corresponding value is the maximum score for that emotion across all predictions.
+        np.ndarray: A (segments x columns) float32 array of per-segment maxima; empty segments are NaN.
     """
-    per_emotion_scores = {label: [] for label in EMOTION_LABELS}
-    
-    for prediction in predictions:
-        sorted_predictions = sorted(prediction, key=lambda x: x["label"])
-        for index, label in enumerate(EMOTION_LABELS):
-            per_emotion_scores[label].append(sorted_predictions[index]["score"])
-
-    return {label: np.max(scores) for label, scores in per_emotion_scores.items()}
\ No newline at end of file
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    result = np.full((len(counts), values.shape[1]), np.nan, dtype=np.float32)
+    non_empty = counts > 0
+    if non_empty.any():
+        result[non_empty] = np.maximum.reduceat(values, offsets[:-1][non_empty], axis=0)
+    return result
@@ -0,0 +1,382 @@
+import asyncio
+import json
+import time
+from typing import Any, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.batcher import MicroBatcher
+from src.book_table import BookTable
+from src.cache import RetrievalCache
+from src.config import SLOW_REQUEST_MS
+from src.filters import RecommendationFilter
+from src.lexical_index import LexicalIndex
+from src.metrics import SlowRequestProfiler, get_metrics, increment, log_event, observe, stage_breakdown_ms, timer, trace
+from src.neighbors import NeighborTable
+from src.retriever import embed_queries, retrieve_batch_recommendations, retrieve_hybrid_batch
+from src.sentiment.config import EMOTION_LABELS
+from src.vector_index import as_vector_index
+
+RESPONSE_COLUMNS = [
+    "isbn13", "title", "authors", "simple_categories", "average_rating", "num_pages", "thumbnail",
+    "anger", "disgust", "fear", "joy", "sadness", "surprise", "neutral", "similarity", "rank",
+]
+MAX_TOP_K = 100
+MAX_BODY_BYTES = 1 << 20
+ROUTES = {("GET", "/health"), ("GET", "/metrics"), ("POST", "/recommend"), ("POST", "/similar")}
+
+
+class BadRequest(ValueError):
+    """Raised for malformed recommendation requests; reported to the client as HTTP 400."""
+
+
+def parse_request(payload: dict) -> tuple[str, int, Optional[RecommendationFilter]]:
+    """Validates a JSON recommendation request, raising `BadRequest` for any field the filter could not apply, so one bad request never fails the batch it shares.
+
+    Args:
+        payload (dict): Request body with a required 'query' and optional 'top_k', 'category', 'category_contains', 'emotion' + 'min_emotion_score' or 'emotions' ({emotion: minimum}), 'min_rating', 'min_pages' and 'max_pages'.
+
+    Returns:
+        tuple[str, int, Optional[RecommendationFilter]]: The query, number of results and filter.
+    """
+    if not isinstance(payload, dict):
+        raise BadRequest("Request body must be a JSON object")
+    query = payload.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise BadRequest("'query' must be a non-empty string")
+    try:
+        top_k = int(payload.get("top_k", 10))
+    except (TypeError, ValueError):
+        raise BadRequest("'top_k' must be an integer")
+    if not 1 <= top_k <= MAX_TOP_K:
+        raise BadRequest(f"'top_k' must be between 1 and {MAX_TOP_K}")
+
+    try:
+        emotions = {str(name): float(score) for name, score in dict(payload.get("emotions") or {}).items()}
+    except (TypeError, ValueError):
+        raise BadRequest("'emotions' must map emotion names to minimum scores")
+    emotion = payload.get("emotion")
+    if emotion not in (None, "All"):
+        if not isinstance(emotion, str):
+            raise BadRequest("'emotion' must be an emotion name")
+        try:
+            emotions[emotion] = float(payload.get("min_emotion_score", 0.0))
+        except (TypeError, ValueError):
+            raise BadRequest("'min_emotion_score' must be a number")
+    unknown = sorted(set(emotions) - set(EMOTION_LABELS))
+    if unknown:
+        raise BadRequest(f"Unknown emotions {unknown}; expected any of {', '.join(EMOTION_LABELS)}")
+
+    category = payload.get("category")
+    if category is not None and not isinstance(category, str):
+        raise BadRequest("'category' must be a string")
+
+    bounds = {}
+    for name, kind in (("min_rating", float), ("min_pages", int), ("max_pages", int)):
+        if payload.get(name) is not None:
+            try:
+                bounds[name] = kind(payload[name])
+            except (TypeError, ValueError):
+                raise BadRequest(f"'{name}' must be a number")
+
+    filters = RecommendationFilter.build(
+        category=category,
+        category_contains=bool(payload.get("category_contains", False)),
+        emotions=emotions,
+        **bounds,
+    )
+    return query, top_k, None if filters.is_empty() else filters
+
+
+def parse_similar_request(payload: dict) -> tuple[int, int]:
+    """Validates a JSON "more like this" request with a required 'isbn' and optional 'top_k'."""
+    if not isinstance(payload, dict):
+        raise BadRequest("Request body must be a JSON object")
+    try:
+        isbn = int(payload.get("isbn"))
+    except (TypeError, ValueError):
+        raise BadRequest("'isbn' must be an ISBN-13")
+    try:
+        top_k = int(payload.get("top_k", 10))
+    except (TypeError, ValueError):
+        raise BadRequest("'top_k' must be an integer")
+    if not 1 <= top_k <= MAX_TOP_K:
+        raise BadRequest(f"'top_k' must be between 1 and {MAX_TOP_K}")
+    return isbn, top_k
+
+
+def to_records(recs: pd.DataFrame) -> list[dict]:
+    """Converts ranked recommendations to JSON-safe dicts, with NaN mapped to null."""
+    columns = [c for c in RESPONSE_COLUMNS if c in recs.columns]
+    frame = recs[columns].astype(object)
+    return frame.where(frame.notna(), None).to_dict(orient="records")
+
+
+class RecommendationService:
+    """Warm recommendation engine that answers concurrent queries in micro-batches.
+
+    The vector index, book table and embedding model are loaded once. Queries arriving within `max_wait_ms` of each other are embedded in a single forward pass and searched together. An optional `RetrievalCache` skips the model and the search for repeated queries. An optional `NeighborTable` answers "more like this" requests without the model, and an optional `LexicalIndex` switches to hybrid retrieval, where exact title queries skip the model entirely.
+
+    Every response's timing holds the milliseconds its batch spent in each retrieval stage. Requests slower than `slow_request_ms` are written to the metrics log with that breakdown, and an optional `SlowRequestProfiler` keeps a cProfile dump of a slow batch.
+    """
+
+    def __init__(
+        self,
+        index,
+        books: BookTable,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        cache: Optional[RetrievalCache] = None,
+        neighbors: Optional[NeighborTable] = None,
+        lexical: Optional[LexicalIndex] = None,
+        slow_request_ms: Optional[float] = SLOW_REQUEST_MS,
+        profiler: Optional[SlowRequestProfiler] = None,
+    ):
+        self.index = as_vector_index(index)
+        self.books = books
+        self.cache = cache
+        self.neighbors = neighbors
+        self.lexical = lexical
+        self.slow_request_ms = slow_request_ms
+        self.profiler = profiler
+        self.batcher = MicroBatcher(self._process_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    def warm_up(self) -> None:
+        """Runs one query end to end so model weights and index pages are resident before serving."""
+        retrieve_batch_recommendations(["warm up"], self.index, self.books, top_k=1)
+
+    def _process_batch(self, items: Sequence[tuple[str, int, Optional[RecommendationFilter], float]]) -> list[dict]:
+        increment("service_batches")
+        increment("service_batch_queries", len(items))
+        if self.profiler is None:
+            return self._answer_batch(items)
+        with self.profiler.profile(f"batch{len(items)}"):
+            return self._answer_batch(items)
+
+    def _answer_batch(self, items: Sequence[tuple[str, int, Optional[RecommendationFilter], float]]) -> list[dict]:
+        started = time.perf_counter()
+        queries = [query for query, _, _, _ in items]
+        if self.cache is not None:
+            self.cache.validate(self.index)
+        # Items are searched in groups of equal top_k, as in src.batch, so results and cache keys never depend on
+        # which other requests happened to share the batch.
+        groups: dict[int, list[int]] = {}
+        for i, (_, k, _, _) in enumerate(items):
+            groups.setdefault(k, []).append(i)
+        results = [None] * len(items)
+
+        with trace() as stages:
+            if self.lexical is None:
+                vectors = embed_queries(self.index, queries, self.cache)
+                embedded = time.perf_counter()
+                for top_k, rows in groups.items():
+                    group = retrieve_batch_recommendations(
+                        [queries[i] for i in rows], self.index, self.books, top_k=top_k, filters=[items[i][2] for i in rows],
+                        query_vectors=vectors[rows], cache=self.cache,
+                    )
+                    for i, recs in zip(rows, group):
+                        results[i] = recs
+            else:
+                # Only queries without an exact title match are embedded, inside the hybrid search; search_ms includes that.
+                embedded = started
+                for top_k, rows in groups.items():
+                    group = retrieve_hybrid_batch(
+                        [queries[i] for i in rows], self.index, self.books, self.lexical, top_k=top_k,
+                        filters=[items[i][2] for i in rows], cache=self.cache,
+                    )
+                    for i, recs in zip(rows, group):
+                        results[i] = recs
+            searched = time.perf_counter()
+            with timer("retrieval_stage_seconds", stage="serialize"):
+                records = [to_records(recs) for recs in results]
+
+        stages_ms = stage_breakdown_ms(stages)
+        responses = []
+        for (_, _, _, enqueued), recs in zip(items, records):
+            responses.append({
+                "results": recs,
+                "timing": {
+                    "queue_ms": round((started - enqueued) * 1000, 3),
+                    "embed_ms": round((embedded - started) * 1000, 3),
+                    "search_ms": round((searched - embedded) * 1000, 3),
+                    "batch_size": len(items),
+                    "stages_ms": stages_ms,
+                },
+            })
+        return responses
+
+    async def recommend(self, payload: dict) -> dict:
+        """Answers one JSON request, adding the end-to-end time to the response timing; failed requests are timed and logged too."""
+        received = time.perf_counter()
+        query, top_k, filters = parse_request(payload)
+        response, error = None, None
+        try:
+            response = await self.batcher.submit((query, top_k, filters, received))
+        except Exception as e:
+            increment("service_request_errors", endpoint="recommend")
+            error = repr(e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - received
+            timing = response["timing"] if response is not None else {}
+            timing["total_ms"] = round(elapsed * 1000, 3)
+            observe("service_request_seconds", elapsed, endpoint="recommend")
+            if self.slow_request_ms is not None and elapsed * 1000 >= self.slow_request_ms:
+                increment("service_slow_requests", endpoint="recommend")
+                extra = {} if error is None else {"error": error}
+                log_event("slow_request", endpoint="recommend", query=query, top_k=top_k, timing=timing, **extra)
+        return response
+
+    def similar(self, payload: dict) -> dict:
+        """Answers one JSON "more like this" request from the neighbour table."""
+        received = time.perf_counter()
+        if self.neighbors is None:
+            raise BadRequest("This service was started without a neighbour table")
+        isbn, top_k = parse_similar_request(payload)
+        isbns, scores = self.neighbors.similar(isbn, top_k)
+        results = to_records(self.books.take(isbns, scores))
+        elapsed = time.perf_counter() - received
+        observe("service_request_seconds", elapsed, endpoint="similar")
+        return {"results": results, "timing": {"total_ms": round(elapsed * 1000, 3)}}
+
+
+async def _read_request(reader: asyncio.StreamReader) -> tuple[str, str, bytes]:
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    method, path, _ = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise BadRequest("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, path, body
+
+
+def _http_response(status: int, payload: Any, content_type: str = "application/json") -> bytes:
+    reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+    body = (payload if isinstance(payload, str) else json.dumps(payload)).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {reasons[status]}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+async def handle_connection(service: RecommendationService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Serves one HTTP/1.1 request: POST /recommend or POST /similar with a JSON body, GET /health, or GET /metrics in the Prometheus text format."""
+    method = path = None
+    content_type = "application/json"
+    try:
+        try:
+            method, path, body = await _read_request(reader)
+            status = 200
+            if method == "GET" and path == "/metrics":
+                payload, content_type = get_metrics().render_text(), "text/plain; version=0.0.4"
+            elif method == "GET" and path == "/health":
+                payload = {"status": "ok", "books": len(service.books)}
+                if service.cache is not None:
+                    payload["cache"] = service.cache.stats()
+            elif method == "POST" and path == "/recommend":
+                payload = await service.recommend(json.loads(body or b"{}"))
+            elif method == "POST" and path == "/similar":
+                payload = service.similar(json.loads(body or b"{}"))
+            else:
+                status, payload = 404, {"error": f"No route for {method} {path}"}
+        except (BadRequest, json.JSONDecodeError) as e:
+            status, payload = 400, {"error": str(e)}
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+        # Unknown paths share one label, so clients cannot create unbounded metric series.
+        increment("http_responses", route=path if (method, path) in ROUTES else "other", status=status)
+        writer.write(_http_response(status, payload, content_type))
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(service: RecommendationService, host: str = "127.0.0.1", port: int = 8000) -> None:
+    """Runs the HTTP/JSON recommendation server until cancelled."""
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port, backlog=1024)
+    print(f"Serving recommendations on http://{host}:{port} (POST /recommend, POST /similar, GET /health, GET /metrics)")
+    async with server:
+        await server.serve_forever()
+
+
+async def _post_json(host: str, port: int, path: str, payload: dict) -> dict:
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, response_body = raw.partition(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    if status != 200:
+        raise RuntimeError(f"HTTP {status}: {response_body.decode('utf-8', 'replace')}")
+    return json.loads(response_body)
+
+
+async def run_load_test(
+    queries: Sequence[str],
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    total_requests: int = 500,
+    concurrency: int = 32,
+    top_k: int = 10,
+) -> dict:
+    """Sends `total_requests` recommendation requests with `concurrency` in flight and summarizes latency.
+
+    Args:
+        queries (Sequence[str]): Queries to cycle through.
+        host (str): Server host.
+        port (int): Server port.
+        total_requests (int): Number of requests to send.
+        concurrency (int): Maximum number of requests in flight.
+        top_k (int): Results requested per query.
+
+    Returns:
+        dict: Throughput, client-side latency percentiles, mean server-side batch size and error count.
+    """
+    latencies, batch_sizes, errors = [], [], 0
+    counter = iter(range(total_requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await _post_json(host, port, "/recommend", {"query": queries[i % len(queries)], "top_k": top_k})
+            except Exception:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            batch_sizes.append(response["timing"]["batch_size"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latency = np.asarray(latencies) if latencies else np.zeros(1)
+    return {
+        "requests": total_requests,
+        "errors": errors,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms_p50": round(float(np.percentile(latency, 50)), 2),
+        "latency_ms_p90": round(float(np.percentile(latency, 90)), 2),
+        "latency_ms_p99": round(float(np.percentile(latency, 99)), 2),
+        "mean_batch_size": round(float(np.mean(batch_sizes)), 2) if batch_sizes else 0.0,
+    }
@@ -0,0 +1,229 @@
+import heapq
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Sequence
+
+import numpy as np
+
+from src.config import DEFAULT_SHARDS
+from src.sharding import shard_ids
+from src.vector_index import NumpyVectorIndex, SearchResult, normalize_rows
+
+SHARD_LAYOUT = "shards.json"
+SHARD_PREFIX = "shard-"
+SHARD_SCHEMES = ("hash", "range")
+
+_worker_shards: dict[str, NumpyVectorIndex] = {}
+
+
+def _open_shard(directory: str) -> NumpyVectorIndex:
+    """Opens a shard once per worker process; later searches reuse the memory-mapped index.
+
+    Each `ShardedVectorIndex` owns its pool, so a rebuilt layout is always read by fresh workers.
+    """
+    if directory not in _worker_shards:
+        _worker_shards[directory] = NumpyVectorIndex.load(directory)
+    return _worker_shards[directory]
+
+
+def search_shard(directory: str, vectors: np.ndarray, top_k: int, mask: Optional[np.ndarray]) -> list[SearchResult]:
+    """Worker task: exact top-k search of one shard, with the same scoring and filtering as the unsharded index."""
+    return _open_shard(directory).search_vectors(vectors, top_k=top_k, mask=mask)
+
+
+def merge_top_k(shard_results: Sequence[SearchResult], top_k: int) -> SearchResult:
+    """Merges per-shard rankings, each sorted by descending score, into one global top-k with a heap."""
+    streams = [zip((-s for s in scores.tolist()), isbns.tolist()) for isbns, scores in shard_results]
+    merged = list(itertools.islice(heapq.merge(*streams), top_k))
+    return (
+        np.asarray([isbn for _, isbn in merged], dtype=np.int64),
+        np.asarray([-score for score, _ in merged], dtype=np.float32),
+    )
+
+
+class ShardedVectorIndex:
+    """Exact cosine index split into shards that are searched in parallel and merged.
+
+    Every shard is a self-contained `NumpyVectorIndex` directory, so shards can later be served from different nodes. A layout file records the partitioning scheme and each shard's row range in the global row order (shards concatenated), which is what `isbns` and row masks refer to. Searches fan out to a process pool whose workers memory-map the shards they are asked to scan; each returns its own top-k, and the lists are merged with a heap.
+    """
+
+    def __init__(self, directory: str, embedding=None, workers: int = 0):
+        self.directory = directory
+        self.embedding = embedding
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            self.layout = json.load(f)
+        self.shard_directories = [os.path.join(directory, shard["path"]) for shard in self.layout["shards"]]
+        self.offsets = np.cumsum([0] + [shard["count"] for shard in self.layout["shards"]])
+        self.isbns = np.concatenate([np.load(os.path.join(d, "isbns.npy")) for d in self.shard_directories]) \
+            if self.shard_directories else np.empty(0, dtype=np.int64)
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._local_shards: list[NumpyVectorIndex] = []
+        if workers > 1:
+            self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self._local_shards = [NumpyVectorIndex.load(d) for d in self.shard_directories]
+
+    def __len__(self) -> int:
+        return len(self.isbns)
+
+    @property
+    def manifest_path(self) -> str:
+        """Layout file rewritten whenever the shards are rebuilt."""
+        return os.path.join(self.directory, SHARD_LAYOUT)
+
+    @staticmethod
+    def read_layout(directory: str) -> Optional[dict]:
+        """Reads the shard layout stored in `directory`, or None if there is none."""
+        path = os.path.join(directory, SHARD_LAYOUT)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @classmethod
+    def build(
+        cls,
+        source: NumpyVectorIndex,
+        directory: str,
+        n_shards: int = DEFAULT_SHARDS,
+        scheme: str = "hash",
+        embedding=None,
+        workers: int = 0,
+    ) -> "ShardedVectorIndex":
+        """Partitions an index into `n_shards` shard directories and opens the result.
+
+        Args:
+            source (NumpyVectorIndex): The full index to partition.
+            directory (str): Directory to write the shards and layout file to.
+            n_shards (int, optional): Number of shards. Defaults to DEFAULT_SHARDS.
+            scheme (str, optional): 'hash' spreads ISBNs evenly with a stable hash; 'range' gives each shard a contiguous ISBN range. Defaults to 'hash'.
+            embedding: Embedding model used to embed queries. Defaults to the source index's model.
+            workers (int, optional): Worker processes used for searches; 0 or 1 searches shards in-process. Defaults to 0.
+
+        Returns:
+            ShardedVectorIndex: The persisted, sharded index.
+        """
+        if scheme not in SHARD_SCHEMES:
+            raise ValueError(f"Unknown shard scheme '{scheme}'; expected one of {SHARD_SCHEMES}")
+        order = np.argsort(source.isbns, kind="stable")
+        isbns = np.asarray(source.isbns)[order]
+        if scheme == "hash":
+            assignment = shard_ids(isbns, n_shards)
+        else:
+            assignment = np.minimum(np.arange(len(isbns)) * n_shards // max(len(isbns), 1), n_shards - 1)
+
+        source_manifest = NumpyVectorIndex.read_manifest(source.directory) if source.directory else None
+        shards = []
+        for shard in range(n_shards):
+            rows = order[assignment == shard]
+            shard_isbns = isbns[assignment == shard]
+            path = f"{SHARD_PREFIX}{shard:03d}"
+            NumpyVectorIndex.build(
+                os.path.join(directory, path), np.asarray(source.embeddings[rows]), shard_isbns,
+                metadata={"shard": shard, "scheme": scheme},
+            )
+            shards.append({
+                "path": path,
+                "count": int(len(rows)),
+                "min_isbn": int(shard_isbns.min()) if len(rows) else None,
+                "max_isbn": int(shard_isbns.max()) if len(rows) else None,
+            })
+
+        layout = {
+            "scheme": scheme,
+            "n_shards": n_shards,
+            "source_fingerprint": (source_manifest or {}).get("source_fingerprint"),
+            "shards": shards,
+        }
+        tmp_path = os.path.join(directory, f"{SHARD_LAYOUT}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(layout, f, indent=2)
+        os.replace(tmp_path, os.path.join(directory, SHARD_LAYOUT))
+        cls._prune(directory, keep={shard["path"] for shard in shards})
+
+        return cls(directory, embedding=embedding if embedding is not None else source.embedding, workers=workers)
+
+    @staticmethod
+    def _prune(directory: str, keep: set) -> None:
+        """Removes shard directories that are not part of the current layout, e.g. after rebuilding with fewer shards."""
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.startswith(SHARD_PREFIX) and name not in keep and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def close(self) -> None:
+        """Shuts down the worker pool."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def embed_queries(self, queries: Sequence[str]) -> np.ndarray:
+        """Embeds a batch of query strings in one forward pass and L2-normalizes them."""
+        if self.embedding is None:
+            raise ValueError("ShardedVectorIndex was opened without an embedding model; use search_vectors instead.")
+        return normalize_rows(self.embedding.embed_documents(list(queries)))
+
+    def search_vectors(self, vectors: np.ndarray, top_k: int = 10, mask: Optional[np.ndarray] = None) -> list[SearchResult]:
+        """Searches every shard for a batch of query vectors and merges the per-shard top-k lists.
+
+        Args:
+            vectors (np.ndarray): A (queries x dim) array, or a single vector.
+            top_k (int): Number of neighbours to return per query.
+            mask (Optional[np.ndarray]): Boolean row filter aligned with `isbns`, either shared (books,) or per query (queries x books).
+
+        Returns:
+            list[SearchResult]: One (isbns, scores) pair per query, ordered by descending similarity.
+        """
+        vectors = normalize_rows(vectors)
+        mask = None if mask is None else np.asarray(mask, dtype=bool)
+
+        tasks = []
+        for shard, directory in enumerate(self.shard_directories):
+            start, end = self.offsets[shard], self.offsets[shard + 1]
+            if start == end:
+                continue
+            shard_mask = None if mask is None else mask[..., start:end]
+            if shard_mask is not None and not shard_mask.any():
+                continue
+            tasks.append((shard, directory, shard_mask))
+
+        if self._pool is None:
+            shard_results = [self._local_shards[shard].search_vectors(vectors, top_k=top_k, mask=m) for shard, _, m in tasks]
+        elif tasks:
+            _, directories, masks = zip(*tasks)
+            shard_results = list(self._pool.map(search_shard, directories, [vectors] * len(tasks), [top_k] * len(tasks), masks))
+        else:
+            shard_results = []
+
+        return [merge_top_k([results[q] for results in shard_results], top_k) for q in range(len(vectors))]
+
+    def search(self, queries: Sequence[str], top_k: int = 10, mask: Optional[np.ndarray] = None) -> list[SearchResult]:
+        """Embeds a batch of queries and returns the top-k (isbns, scores) for each of them."""
+        return self.search_vectors(self.embed_queries(queries), top_k, mask=mask)
+
+
+def load_or_build_sharded_index(
+    source: NumpyVectorIndex,
+    directory: str = "vector_shards",
+    n_shards: int = DEFAULT_SHARDS,
+    scheme: str = "hash",
+    workers: int = 0,
+) -> ShardedVectorIndex:
+    """Opens the shards of `source`, repartitioning when the source index, shard count or scheme changed."""
+    layout = ShardedVectorIndex.read_layout(directory)
+    source_manifest = NumpyVectorIndex.read_manifest(source.directory) if source.directory else None
+    fingerprint = (source_manifest or {}).get("source_fingerprint")
+    if (
+        layout is not None
+        and fingerprint is not None
+        and layout.get("source_fingerprint") == fingerprint
+        and layout.get("n_shards") == n_shards
+        and layout.get("scheme") == scheme
+    ):
+        return ShardedVectorIndex(directory, embedding=source.embedding, workers=workers)
+    return ShardedVectorIndex.build(source, directory, n_shards=n_shards, scheme=scheme, workers=workers)
@@ -0,0 +1,106 @@
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.config import QUANTIZE_MODELS, TORCH_THREADS_PER_WORKER
+from src.models import configure_models
+
+
+def shard_ids(isbns: pd.Series | np.ndarray, n_shards: int) -> np.ndarray:
+    """Assigns each ISBN to one of `n_shards` shards with a stable multiplicative hash."""
+    hashed = np.asarray(isbns, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    return ((hashed >> np.uint64(32)) % np.uint64(n_shards)).astype(np.int64)
+
+
+def split_by_isbn(books_df: pd.DataFrame, n_shards: int) -> list[pd.DataFrame]:
+    """Partitions books into `n_shards` disjoint, non-empty shards by hashed ISBN."""
+    ids = shard_ids(books_df["isbn13"], n_shards)
+    return [shard for shard in (books_df[ids == i] for i in range(n_shards)) if len(shard)]
+
+
+def _init_worker(torch_threads: int, quantize_models: bool) -> None:
+    os.environ["OMP_NUM_THREADS"] = str(torch_threads)
+    os.environ["MKL_NUM_THREADS"] = str(torch_threads)
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    configure_models(torch_threads=torch_threads, quantize=quantize_models)
+
+
+class ShardedExecutor:
+    """Runs model-heavy stages over ISBN shards in a pool of worker processes.
+
+    Each worker process has its own model registry (see `src.models`), so it loads each model once and reuses it across shards, with torch limited to `torch_threads` intra-op threads and optional int8 quantization. Completed shards are handed to an `on_result` callback in the parent, which stages use to checkpoint partial results. Several stages can submit shards to the same executor concurrently. With `workers <= 1` shards run in-process, in order.
+    """
+
+    def __init__(self, workers: int = 1, torch_threads: int = TORCH_THREADS_PER_WORKER, quantize_models: bool = QUANTIZE_MODELS):
+        self.workers = workers
+        self.torch_threads = torch_threads
+        self.quantize_models = quantize_models
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        if workers > 1:
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(torch_threads, quantize_models),
+            )
+
+    def __enter__(self) -> "ShardedExecutor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def run(
+        self,
+        task: Callable[[pd.DataFrame], pd.DataFrame],
+        books_df: pd.DataFrame,
+        max_shard_rows: int = 500,
+        on_result: Optional[Callable[[pd.DataFrame], None]] = None,
+        desc: str = "shards",
+    ) -> pd.DataFrame:
+        """Applies `task` to ISBN shards of `books_df` and merges the partial results.
+
+        Args:
+            task (Callable[[pd.DataFrame], pd.DataFrame]): Picklable module-level function mapping a shard to its results.
+            books_df (pd.DataFrame): Books to process; must contain 'isbn13'.
+            max_shard_rows (int, optional): Upper bound on shard size, i.e. the checkpoint granularity. Defaults to 500.
+            on_result (Optional[Callable[[pd.DataFrame], None]]): Called in the parent with each completed shard's results.
+            desc (str, optional): Label used in progress messages.
+
+        Returns:
+            pd.DataFrame: The concatenated results of all shards.
+        """
+        if books_df.empty:
+            return pd.DataFrame()
+        n_shards = max(self.workers, math.ceil(len(books_df) / max_shard_rows))
+        shards = split_by_isbn(books_df, n_shards)
+        results = []
+
+        def collect(result: pd.DataFrame) -> None:
+            with self._lock:
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+                print(f"Completed {len(results)}/{len(shards)} {desc}.")
+
+        if self._pool is None:
+            for shard in shards:
+                collect(task(shard))
+        else:
+            futures: list[Future] = [self._pool.submit(task, shard) for shard in shards]
+            for future in as_completed(futures):
+                collect(future.result())
+
+        return pd.concat(results, ignore_index=True)
@@ -0,0 +1,109 @@
+import glob
+import hashlib
+import json
+import os
+from typing import Optional, Sequence
+
+import pandas as pd
+
+STAGE_STATE_FILE = "stages.json"
+
+
+def stage_key(*parts) -> str:
+    """Hashes a stage's inputs and configuration (file hashes, model names, thresholds) into one key."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    """Records the input key each pipeline stage last completed with, so up-to-date stages can be skipped."""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.state_path = os.path.join(cache_dir, STAGE_STATE_FILE)
+        self._state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self._state = json.load(f)
+
+    def is_fresh(self, stage: str, key: str, outputs: Sequence[str] = ()) -> bool:
+        """True when `stage` last completed with `key` and all of its output files still exist."""
+        return self._state.get(stage) == key and all(os.path.exists(path) for path in outputs)
+
+    def mark(self, stage: str, key: str) -> None:
+        """Records that `stage` completed with `key`."""
+        self._state[stage] = key
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def rows(self, stage: str, key: str) -> "RowCache":
+        """Returns the per-ISBN result cache of `stage` for one configuration key."""
+        return RowCache(os.path.join(self.cache_dir, f"{stage}-{key[:16]}"))
+
+
+class RowCache:
+    """Per-ISBN results of an expensive model stage, stored as checkpoint files.
+
+    Each row holds an ISBN, a hash of the input it was computed from, and the stage's output columns. Every `append` writes a new part file atomically, so a crash loses at most the chunk in progress and a rerun resumes from the last completed part.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _parts(self) -> list[str]:
+        return sorted(glob.glob(os.path.join(self.directory, "part-*.csv")))
+
+    def _next_part_path(self) -> str:
+        parts = self._parts()
+        number = int(os.path.basename(parts[-1])[5:-4]) + 1 if parts else 0
+        return os.path.join(self.directory, f"part-{number:06d}.csv")
+
+    def load(self) -> Optional[pd.DataFrame]:
+        """Reads all checkpointed rows, keeping the latest result per (isbn13, input_hash)."""
+        parts = self._parts()
+        if not parts:
+            return None
+        rows = pd.concat([pd.read_csv(path) for path in parts], ignore_index=True)
+        return rows.drop_duplicates(subset=["isbn13", "input_hash"], keep="last")
+
+    def lookup(self, books_df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+        """Splits books into those with cached results and those that still need computing.
+
+        Args:
+            books_df (pd.DataFrame): Books to process, with 'isbn13' and 'input_hash' (a hash of the book's stage input) columns.
+
+        Returns:
+            tuple[pd.DataFrame, pd.DataFrame]: Cached result rows (isbn13 plus output columns) for books whose input is unchanged, and the subset of `books_df` without a valid cached result.
+        """
+        keys = books_df[["isbn13", "input_hash"]]
+        cached = self.load()
+        if cached is None:
+            return keys.iloc[0:0][["isbn13"]], books_df
+        hits = keys.merge(cached, on=["isbn13", "input_hash"], how="inner")
+        todo = books_df[~books_df["isbn13"].isin(hits["isbn13"])]
+        return hits.drop(columns=["input_hash"]), todo
+
+    def append(self, results: pd.DataFrame) -> None:
+        """Checkpoints a chunk of results (isbn13, input_hash and output columns) as a new part file."""
+        if results.empty:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._next_part_path()
+        tmp_path = f"{path}.tmp"
+        results.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def compact(self) -> None:
+        """Merges all part files into one, dropping superseded rows."""
+        parts = self._parts()
+        if len(parts) <= 1:
+            return
+        # The merged file is written as the newest part before older parts are removed, so an interruption never loses rows.
+        path = self._next_part_path()
+        tmp_path = f"{path}.tmp"
+        self.load().to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        for old_path in parts:
+            os.remove(old_path)
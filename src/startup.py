@@ -0,0 +1,154 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Optional, Sequence
+
+import typer
+
+# Wall-clock target for `--help` on a developer machine; about two thirds of it is the interpreter plus typer and rich.
+HELP_BUDGET_MS = 300
+# What the entry points may add on top of `python -c "import typer"`, which is the part this repo controls.
+# Checked instead of HELP_BUDGET_MS by default, so the check means the same thing on slow CI machines.
+HELP_OVERHEAD_BUDGET_MS = 100
+# With a warm (already built and current) NumPy index; dominated by loading the embedding model once.
+FIRST_RECOMMENDATION_BUDGET_MS = 5000
+
+# Heavy dependencies the entry points may only import once a command needs them.
+DEFERRED_MODULES = (
+    "numpy", "pandas", "langchain", "langchain_chroma", "chromadb", "sentence_transformers",
+    "torch", "transformers", "gradio", "dotenv", "tqdm",
+)
+
+# Invocations that must start without touching data, models or the deferred modules.
+ENTRY_POINTS = {
+    "cli.py --help": ["cli.py", "--help"],
+    "service.py --help": ["service.py", "--help"],
+    "main.py --help": ["main.py", "--help"],
+    "benchmark.py --help": ["benchmark.py", "--help"],
+    "import dashboard": ["-c", "import dashboard"],
+}
+
+BASELINE = ["-c", "import typer"]
+
+FIRST_RECOMMENDATION = ["cli.py", "recommend", "--query", "A story about forgiveness", "--backend", "numpy", "--top-k", "5"]
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$")
+
+app = typer.Typer()
+
+
+def parse_importtime(stderr: str) -> dict[str, int]:
+    """Parses `python -X importtime` output into cumulative import microseconds per module."""
+    modules = {}
+    for line in stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(2))
+    return modules
+
+
+def time_command(args: Sequence[str], runs: int = 5) -> float:
+    """Runs `python <args>` in the repository root `runs` times and returns the fastest wall time in milliseconds."""
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], cwd=REPO_ROOT, capture_output=True, check=True)
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def profile_entry_point(args: Sequence[str], runs: int = 5, top: int = 5) -> dict:
+    """Measures one entry point's startup and lists the imports it pulls in.
+
+    Args:
+        args (Sequence[str]): Arguments passed to the interpreter, e.g. ["cli.py", "--help"].
+        runs (int, optional): Timed runs; the fastest is reported. Defaults to 5.
+        top (int, optional): Number of slowest top-level imports to report. Defaults to 5.
+
+    Returns:
+        dict: 'wall_ms', 'deferred_imported' (deferred modules that were imported) and 'slowest_imports' (module name to cumulative ms).
+    """
+    profile = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    modules = parse_importtime(profile.stderr)
+    top_level = {name: us for name, us in modules.items() if "." not in name}
+    return {
+        "wall_ms": round(time_command(args, runs), 1),
+        "deferred_imported": sorted(name for name in top_level if name in DEFERRED_MODULES),
+        "slowest_imports": {
+            name: round(us / 1000, 1) for name, us in sorted(top_level.items(), key=lambda item: -item[1])[:top]
+        },
+    }
+
+
+def check_startup(
+    overhead_budget_ms: float = HELP_OVERHEAD_BUDGET_MS,
+    help_budget_ms: Optional[float] = None,
+    recommendation_budget_ms: Optional[float] = FIRST_RECOMMENDATION_BUDGET_MS,
+    runs: int = 5,
+) -> tuple[dict, list[str]]:
+    """Profiles every entry point against the startup budgets.
+
+    Args:
+        overhead_budget_ms (float, optional): Budget for each of ENTRY_POINTS over the typer import baseline. Defaults to HELP_OVERHEAD_BUDGET_MS.
+        help_budget_ms (Optional[float], optional): Absolute budget for each of ENTRY_POINTS, e.g. HELP_BUDGET_MS; None checks only the overhead. Defaults to None.
+        recommendation_budget_ms (Optional[float], optional): Budget for a first CLI recommendation, checked only when the NumPy index has been built; None skips it. Defaults to FIRST_RECOMMENDATION_BUDGET_MS.
+        runs (int, optional): Timed runs per entry point. Defaults to 5.
+
+    Returns:
+        tuple[dict, list[str]]: The report, and a description of every budget that was exceeded.
+    """
+    baseline_ms = round(time_command(BASELINE, runs), 1)
+    report, failures = {"baseline": {"wall_ms": baseline_ms}}, []
+    for name, args in ENTRY_POINTS.items():
+        result = profile_entry_point(args, runs=runs)
+        result["overhead_ms"] = round(result["wall_ms"] - baseline_ms, 1)
+        report[name] = result
+        if result["deferred_imported"]:
+            failures.append(f"{name} imports {', '.join(result['deferred_imported'])} at startup")
+        if result["overhead_ms"] > overhead_budget_ms:
+            failures.append(f"{name} took {result['overhead_ms']} ms over the typer baseline (budget {overhead_budget_ms} ms)")
+        if help_budget_ms is not None and result["wall_ms"] > help_budget_ms:
+            failures.append(f"{name} took {result['wall_ms']} ms (budget {help_budget_ms} ms)")
+
+    if recommendation_budget_ms is not None and os.path.exists(os.path.join(REPO_ROOT, "vector_index", "manifest.json")):
+        wall_ms = round(time_command(FIRST_RECOMMENDATION, runs=1), 1)
+        report["first recommendation"] = {"wall_ms": wall_ms}
+        if wall_ms > recommendation_budget_ms:
+            failures.append(f"first recommendation took {wall_ms} ms (budget {recommendation_budget_ms} ms)")
+    return report, failures
+
+
+@app.command()
+def main(
+    overhead_budget_ms: float = typer.Option(HELP_OVERHEAD_BUDGET_MS, help="Startup budget over a bare typer import"),
+    absolute: bool = typer.Option(False, help=f"Also enforce the absolute {HELP_BUDGET_MS} ms --help budget"),
+    recommendation_budget_ms: float = typer.Option(FIRST_RECOMMENDATION_BUDGET_MS, help="Budget for a first recommendation with a warm index"),
+    recommend: bool = typer.Option(True, help="Also time a first recommendation when the NumPy index exists"),
+    runs: int = typer.Option(5, help="Timed runs per entry point; the fastest is reported"),
+):
+    """
+    Check that the entry points start within budget and defer their heavy imports; exits non-zero otherwise.
+    """
+    report, failures = check_startup(
+        overhead_budget_ms,
+        HELP_BUDGET_MS if absolute else None,
+        recommendation_budget_ms if recommend else None,
+        runs=runs,
+    )
+    print(json.dumps(report, indent=2))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        raise typer.Exit(code=1)
+    print("Startup within budget.")
+
+
+if __name__ == "__main__":
+    app()
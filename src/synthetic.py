@@ -0,0 +1,233 @@
+import os
+import zlib
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.config import CATEGORY_MAPPING
+from src.lexical_index import tokenize
+from src.sentiment.config import EMOTION_LABELS
+
+# Rows generated and written per block by `write_catalog`.
+CATALOG_CHUNK_ROWS = 50_000
+
+# Rows drawn from one random stream; pages start at multiples of this position, so rows never depend on how a catalog is split.
+CATALOG_PAGE_ROWS = 1_000
+
+# Output dimension of `HashingEmbedding`; matches all-MiniLM-L6-v2 so index sizes are realistic.
+EMBEDDING_DIM = 384
+
+_SYLLABLES = ["ka", "lo", "mi", "ra", "ten", "vor", "el", "shi", "dan", "pu", "quo", "zer", "ix", "mon", "tal", "bri"]
+_THEMES = [
+    "love", "war", "magic", "dragon", "murder", "detective", "family", "space", "history", "science",
+    "friendship", "forgiveness", "king", "ocean", "school", "secret", "journey", "god", "city", "dream",
+]
+_CATEGORIES = list(CATEGORY_MAPPING) + ["Cooking", "Travel", "Business & Economics"]
+
+
+def _vocabulary() -> list[str]:
+    """Fixed pseudo-word vocabulary (themes first, so they are the most frequent words)."""
+    words = list(_THEMES)
+    words += [a + b for a in _SYLLABLES for b in _SYLLABLES]
+    words += [a + b + c for a in _SYLLABLES for b in _SYLLABLES for c in _SYLLABLES]
+    return words
+
+
+VOCABULARY = _vocabulary()
+
+
+def _zipf_probabilities(n: int, exponent: float = 1.1) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _texts(rng: np.random.Generator, lengths: np.ndarray, sentence_words: int = 12) -> list[str]:
+    """Generates one Zipf-distributed text per length, with a period after every `sentence_words` words."""
+    words = VOCABULARY + [word + "." for word in VOCABULARY]
+    ids = rng.choice(len(VOCABULARY), size=(len(lengths), int(lengths.max(initial=1))), p=_zipf_probabilities(len(VOCABULARY)))
+    positions = np.arange(ids.shape[1])
+    ends = (positions % sentence_words == sentence_words - 1) | (positions[None, :] == lengths[:, None] - 1)
+    ids = ids + len(VOCABULARY) * ends
+    return [" ".join(map(words.__getitem__, row[:length])) for row, length in zip(ids.tolist(), lengths.tolist())]
+
+
+def generate_catalog(n_books: int, seed: int = 0, start: int = 0) -> pd.DataFrame:
+    """Generates raw book rows with the columns and quirks of data/raw/books.csv.
+
+    Rows are deterministic in (`seed`, position): each page of CATALOG_PAGE_ROWS rows has its own random stream, so a catalog generated in blocks equals one generated at once, and a smaller catalog is a prefix of a larger one. About a quarter of the books are dropped by cleaning (missing fields or short descriptions), as in the real dataset.
+
+    Args:
+        n_books (int): Number of rows to generate.
+        seed (int, optional): Random seed. Defaults to 0.
+        start (int, optional): Position of the first row in the catalog. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: Raw rows with the same columns as data/raw/books.csv.
+    """
+    if n_books <= 0:
+        return _generate_page(seed, 0).iloc[0:0]
+    first, last = start // CATALOG_PAGE_ROWS, (start + n_books - 1) // CATALOG_PAGE_ROWS
+    pages = pd.concat([_generate_page(seed, page) for page in range(first, last + 1)], ignore_index=True)
+    offset = start - first * CATALOG_PAGE_ROWS
+    return pages.iloc[offset:offset + n_books].reset_index(drop=True)
+
+
+def _generate_page(seed: int, page: int) -> pd.DataFrame:
+    n_books = CATALOG_PAGE_ROWS
+    rng = np.random.default_rng([seed, page])
+    positions = np.arange(page * n_books, (page + 1) * n_books, dtype=np.int64)
+    isbns = 9780000000000 + (positions * 7919 + seed) % 10**9
+
+    def missing(fraction: float) -> np.ndarray:
+        return rng.random(n_books) < fraction
+
+    descriptions = pd.Series(_texts(rng, rng.integers(10, 160, n_books)), dtype=object)
+    descriptions[missing(0.04)] = None
+    subtitles = pd.Series(_texts(rng, rng.integers(2, 6, n_books)), dtype=object).str.rstrip(".").str.title()
+    subtitles[~missing(0.35)] = None
+    categories = pd.Series(np.asarray(_CATEGORIES, dtype=object)[rng.integers(0, len(_CATEGORIES), n_books)])
+    categories[missing(0.25)] = None
+    thumbnails = pd.Series([f"http://books.google.com/books/content?id=SYN{p}&printsec=frontcover&img=1" for p in positions.tolist()], dtype=object)
+    thumbnails[missing(0.05)] = None
+
+    def numbers(values: np.ndarray, fraction: float) -> np.ndarray:
+        values = values.astype(np.float64)
+        values[missing(fraction)] = np.nan
+        return values
+
+    authors = [
+        ";".join(name.rstrip(".").title() for name in text.split(" ")[:count])
+        for text, count in zip(_texts(rng, np.full(n_books, 3)), rng.integers(1, 4, n_books).tolist())
+    ]
+    return pd.DataFrame({
+        "isbn13": isbns,
+        "isbn10": [str(isbn)[-10:] for isbn in isbns.tolist()],
+        "title": pd.Series(_texts(rng, rng.integers(1, 5, n_books))).str.rstrip(".").str.title(),
+        "subtitle": subtitles,
+        "authors": authors,
+        "categories": categories,
+        "thumbnail": thumbnails,
+        "description": descriptions,
+        "published_year": numbers(rng.integers(1900, 2021, n_books), 0.02),
+        "average_rating": numbers(np.round(rng.uniform(1.0, 5.0, n_books), 2), 0.03),
+        "num_pages": numbers(rng.integers(40, 1200, n_books), 0.02),
+        "ratings_count": numbers(rng.integers(0, 50_000, n_books), 0.02),
+    })
+
+
+def write_catalog(path: str, n_books: int, seed: int = 0, chunk_rows: int = CATALOG_CHUNK_ROWS) -> str:
+    """Writes a synthetic raw catalog CSV block by block, so memory stays bounded for millions of books.
+
+    Args:
+        path (str): Where to write the CSV.
+        n_books (int): Number of books.
+        seed (int, optional): Random seed. Defaults to 0.
+        chunk_rows (int, optional): Rows generated per block. Defaults to CATALOG_CHUNK_ROWS.
+
+    Returns:
+        str: `path`.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        for start in range(0, n_books, chunk_rows):
+            block = generate_catalog(min(chunk_rows, n_books - start), seed=seed, start=start)
+            block.to_csv(f, index=False, header=(start == 0))
+    os.replace(tmp_path, path)
+    return path
+
+
+def synthetic_queries(n_queries: int, seed: int = 0) -> list[str]:
+    """Short queries drawn from the catalog vocabulary, so they overlap with book descriptions."""
+    rng = np.random.default_rng([seed, 1 << 32])
+    return [text.rstrip(".") for text in _texts(rng, rng.integers(3, 9, n_queries), sentence_words=100)]
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer: scrambles uint64 values so nearby inputs give unrelated outputs."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _hash_uint64(texts: Sequence[str]) -> np.ndarray:
+    """Stable 64-bit hashes of strings (unlike `hash`, independent of PYTHONHASHSEED)."""
+    return _mix(np.asarray([zlib.crc32(text.encode("utf-8")) for text in texts], dtype=np.uint64))
+
+
+def _unit_scores(hashed: np.ndarray, n_labels: int) -> np.ndarray:
+    """Derives a (texts x labels) matrix of pseudo-probabilities, each row summing to 1, from text hashes."""
+    labels = np.arange(1, n_labels + 1, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    scores = (_mix(hashed[:, None] ^ labels) >> np.uint64(40)).astype(np.float64) + 1.0
+    return scores / scores.sum(axis=1, keepdims=True)
+
+
+class HashingEmbedding:
+    """Deterministic, offline stand-in for the sentence-transformer embedding model.
+
+    Texts are embedded as signed feature-hashed bags of words, so texts sharing words are similar. It runs without a network or model weights and has the `embed_documents` / `embed_query` interface the indexes expect.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self._features: dict[str, tuple[int, float]] = {}
+
+    def _feature(self, token: str) -> tuple[int, float]:
+        feature = self._features.get(token)
+        if feature is None:
+            digest = zlib.crc32(token.encode("utf-8"))
+            feature = self._features[token] = (digest % self.dim, 1.0 if digest & 0x80000000 else -1.0)
+        return feature
+
+    def embed_documents(self, texts: Sequence[str]) -> np.ndarray:
+        """Embeds texts into a (texts x dim) float32 matrix."""
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                col, sign = self._feature(token)
+                rows.append(row)
+                cols.append(col)
+                signs.append(sign)
+        flat = np.asarray(rows, dtype=np.int64) * self.dim + np.asarray(cols, dtype=np.int64)
+        counts = np.bincount(flat, weights=np.asarray(signs), minlength=len(texts) * self.dim)
+        return counts.reshape(len(texts), self.dim).astype(np.float32)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_documents([text])[0]
+
+
+class StubEmotionClassifier:
+    """Offline stand-in for the emotion pipeline, returning deterministic pseudo-scores in the pipeline's output format.
+
+    Benchmarks with it measure everything around the model (sentence splitting, deduplication, batching and the per-book max), not the model itself.
+    """
+
+    def __call__(self, sentences: Sequence[str], batch_size: Optional[int] = None, truncation: bool = True, **kwargs) -> list[list[dict]]:
+        scores = _unit_scores(_hash_uint64(sentences), len(EMOTION_LABELS))
+        return [
+            [{"label": label, "score": float(score)} for label, score in zip(EMOTION_LABELS, row)]
+            for row in scores.tolist()
+        ]
+
+
+class StubZeroShotPipeline:
+    """Offline stand-in for the zero-shot classification pipeline, with deterministic pseudo-scores."""
+
+    def __call__(self, sequences, candidate_labels: Sequence[str], batch_size: Optional[int] = None, **kwargs):
+        single = isinstance(sequences, str)
+        texts = [sequences] if single else list(sequences)
+        results = []
+        for scores in _unit_scores(_hash_uint64(texts), len(candidate_labels)):
+            order = np.argsort(-scores, kind="stable")
+            results.append({"labels": [candidate_labels[i] for i in order], "scores": scores[order].tolist()})
+        return results[0] if single else results
+
+
+def synthetic_emotions(isbns: np.ndarray, seed: int = 0) -> pd.DataFrame:
+    """Per-book emotion scores in [0, 1] for filter benchmarks, without running a classifier."""
+    rng = np.random.default_rng([seed, 2 << 32])
+    scores = rng.beta(1.0, 3.0, size=(len(isbns), len(EMOTION_LABELS))).astype(np.float32)
+    frame = pd.DataFrame(scores, columns=EMOTION_LABELS)
+    frame.insert(0, "isbn13", np.asarray(isbns))
+    return frame
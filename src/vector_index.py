@@ -0,0 +1,300 @@
+import json
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+
+from src.config import VECTORSTORE_MANIFEST
+
+EMBEDDINGS_FILE = "embeddings.npy"
+ISBNS_FILE = "isbns.npy"
+INDEX_MANIFEST = "manifest.json"
+
+# Number of query vectors scored against the matrix at once; bounds the (queries x books) score buffer.
+QUERY_BLOCK_SIZE = 64
+
+# A shared filter keeping fewer than this fraction of rows gathers and scores only those rows.
+SUBSET_SCAN_FRACTION = 0.25
+
+# ISBNs per Chroma `$in` filter; each is one bound SQLite parameter, so larger filters are split into several queries.
+CHROMA_FILTER_CHUNK = 10_000
+
+SearchResult = tuple[np.ndarray, np.ndarray]
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalizes each row of a 2D array as float32, leaving all-zero rows untouched."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_rows(scores: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Selects the `top_k` highest scores of every row, sorted in descending order.
+
+    Args:
+        scores (np.ndarray): A (queries x candidates) score matrix.
+        top_k (int): Number of columns to keep per row.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Column indices and their scores, both shaped (queries x k).
+    """
+    k = min(top_k, scores.shape[1])
+    if k <= 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(scores.dtype)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+
+class NumpyVectorIndex:
+    """Exact in-process cosine index over a memory-mapped float32 embedding matrix.
+
+    Embeddings are stored L2-normalized as one contiguous (books x dim) float32 matrix with an aligned int64 ISBN array, so a search is a single matrix-vector product followed by `argpartition`. Opened with `mmap=True`, the matrix is paged in by the OS and shared between processes reading the same files.
+    """
+
+    def __init__(self, embeddings: np.ndarray, isbns: np.ndarray, embedding=None, directory: Optional[str] = None):
+        if len(embeddings) != len(isbns):
+            raise ValueError(f"{len(embeddings)} embeddings but {len(isbns)} ISBNs")
+        self.embeddings = embeddings
+        self.isbns = isbns
+        self.embedding = embedding
+        self.directory = directory
+        self._sorter: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.isbns)
+
+    @property
+    def dim(self) -> int:
+        return self.embeddings.shape[1]
+
+    @property
+    def manifest_path(self) -> Optional[str]:
+        """Manifest file rewritten whenever the index is rebuilt; None for in-memory indexes."""
+        return os.path.join(self.directory, INDEX_MANIFEST) if self.directory else None
+
+    @classmethod
+    def build(
+        cls,
+        directory: str,
+        embeddings: np.ndarray,
+        isbns: Sequence[int],
+        embedding=None,
+        metadata: Optional[dict] = None,
+    ) -> "NumpyVectorIndex":
+        """Normalizes and writes embeddings and ISBNs to `directory`, then opens the result memory-mapped.
+
+        Args:
+            directory (str): Directory to write the index files to.
+            embeddings (np.ndarray): A (books x dim) array of raw embeddings.
+            isbns (Sequence[int]): ISBN-13 of each embedding row.
+            embedding: Embedding model used to embed queries at search time.
+            metadata (Optional[dict]): Extra fields stored in the index manifest (e.g. model name, source fingerprint).
+
+        Returns:
+            NumpyVectorIndex: The persisted index.
+        """
+        os.makedirs(directory, exist_ok=True)
+        matrix = np.ascontiguousarray(normalize_rows(embeddings))
+        isbn_array = np.asarray(isbns, dtype=np.int64)
+
+        # Write then rename, so processes that still memory-map the old files keep a valid mapping.
+        for name, array in ((EMBEDDINGS_FILE, matrix), (ISBNS_FILE, isbn_array)):
+            tmp_path = os.path.join(directory, f"{name}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, os.path.join(directory, name))
+
+        manifest = dict(metadata or {})
+        manifest.update({"count": int(len(isbn_array)), "dim": int(matrix.shape[1])})
+        tmp_path = os.path.join(directory, f"{INDEX_MANIFEST}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(directory, INDEX_MANIFEST))
+
+        return cls.load(directory, embedding=embedding)
+
+    @classmethod
+    def load(cls, directory: str, embedding=None, mmap: bool = True) -> "NumpyVectorIndex":
+        """Opens an index written by `build`, memory-mapping the embedding matrix by default."""
+        mmap_mode = "r" if mmap else None
+        embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode=mmap_mode)
+        isbns = np.load(os.path.join(directory, ISBNS_FILE))
+        return cls(embeddings, isbns, embedding=embedding, directory=directory)
+
+    @staticmethod
+    def read_manifest(directory: str) -> Optional[dict]:
+        """Reads the manifest of the index stored in `directory`, or None if there is none."""
+        path = os.path.join(directory, INDEX_MANIFEST)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def vectors_for(self, isbns: Sequence[int]) -> tuple[np.ndarray, np.ndarray]:
+        """Looks up stored embeddings by ISBN without running the embedding model.
+
+        Args:
+            isbns (Sequence[int]): ISBNs to look up.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: The (found x dim) embeddings, and a boolean mask over `isbns` marking which were found.
+        """
+        if self._sorter is None:
+            self._sorter = np.argsort(self.isbns, kind="stable")
+        isbns = np.asarray(isbns, dtype=np.int64)
+        if len(self.isbns) == 0:
+            return np.empty((0, self.dim), dtype=np.float32), np.zeros(len(isbns), dtype=bool)
+        sorted_isbns = self.isbns[self._sorter]
+        positions = np.minimum(np.searchsorted(sorted_isbns, isbns), len(sorted_isbns) - 1)
+        found = sorted_isbns[positions] == isbns
+        return np.asarray(self.embeddings[self._sorter[positions[found]]]), found
+
+    def embed_queries(self, queries: Sequence[str]) -> np.ndarray:
+        """Embeds a batch of query strings in one forward pass and L2-normalizes them."""
+        if self.embedding is None:
+            raise ValueError("NumpyVectorIndex was opened without an embedding model; use search_vectors instead.")
+        return normalize_rows(self.embedding.embed_documents(list(queries)))
+
+    def search_vectors(self, vectors: np.ndarray, top_k: int = 10, mask: Optional[np.ndarray] = None) -> list[SearchResult]:
+        """Runs an exact top-k cosine search for a batch of query vectors.
+
+        Rows excluded by `mask` are dropped before top-k selection, so every query returns `top_k` hits whenever that many rows pass. A highly selective shared mask scores only the surviving rows.
+
+        Args:
+            vectors (np.ndarray): A (queries x dim) array, or a single vector.
+            top_k (int): Number of neighbours to return per query.
+            mask (Optional[np.ndarray]): Boolean row filter, either shared (books,) or per query (queries x books).
+
+        Returns:
+            list[SearchResult]: One (isbns, scores) pair per query, ordered by descending similarity.
+        """
+        vectors = normalize_rows(vectors)
+        mask = None if mask is None else np.asarray(mask, dtype=bool)
+
+        if mask is not None and mask.ndim == 1 and mask.sum() < len(self) * SUBSET_SCAN_FRACTION:
+            rows = np.flatnonzero(mask)
+            subset = self.embeddings[rows]
+            results = []
+            for start in range(0, len(vectors), QUERY_BLOCK_SIZE):
+                columns, scores = top_k_rows(vectors[start:start + QUERY_BLOCK_SIZE] @ subset.T, top_k)
+                results.extend((self.isbns[rows[c]], s) for c, s in zip(columns, scores))
+            return results
+
+        results = []
+        for start in range(0, len(vectors), QUERY_BLOCK_SIZE):
+            scores = vectors[start:start + QUERY_BLOCK_SIZE] @ self.embeddings.T
+            if mask is not None:
+                block_mask = mask if mask.ndim == 1 else mask[start:start + QUERY_BLOCK_SIZE]
+                scores = np.where(block_mask, scores, -np.inf)
+            rows, row_scores = top_k_rows(scores, top_k)
+            for r, s in zip(rows, row_scores):
+                keep = np.isfinite(s)
+                results.append((self.isbns[r[keep]], s[keep]))
+        return results
+
+    def search(self, queries: Sequence[str], top_k: int = 10, mask: Optional[np.ndarray] = None) -> list[SearchResult]:
+        """Embeds a batch of queries and returns the top-k (isbns, scores) for each of them."""
+        return self.search_vectors(self.embed_queries(queries), top_k, mask=mask)
+
+
+class ChromaVectorIndex:
+    """Adapter exposing a langchain `Chroma` store through the same search interface as `NumpyVectorIndex`.
+
+    Row masks are translated into a metadata `$in` filter on `isbn13`, so filtering still happens inside the Chroma query.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._isbns: Optional[np.ndarray] = None
+
+    @property
+    def isbns(self) -> np.ndarray:
+        """ISBNs of all documents in the collection, sorted; row masks passed to `search_vectors` align with this array."""
+        if self._isbns is None:
+            ids = self.db.get(include=[])["ids"]
+            self._isbns = np.sort(np.asarray([int(doc_id) for doc_id in ids], dtype=np.int64))
+        return self._isbns
+
+    def __len__(self) -> int:
+        return len(self.isbns)
+
+    @property
+    def manifest_path(self) -> Optional[str]:
+        """Manifest written by `load_or_build_vectorstore` whenever the collection changes."""
+        persist_directory = getattr(self.db, "_persist_directory", None)
+        return os.path.join(persist_directory, VECTORSTORE_MANIFEST) if persist_directory else None
+
+    def embed_queries(self, queries: Sequence[str]) -> np.ndarray:
+        """Embeds a batch of query strings with the store's embedding function."""
+        return normalize_rows(self.db.embeddings.embed_documents(list(queries)))
+
+    def _similarity(self, distance: float) -> float:
+        space = (self.db._collection.metadata or {}).get("hnsw:space", "l2")
+        if space == "cosine":
+            return 1.0 - distance
+        if space == "ip":
+            return -distance
+        # Squared L2 between unit vectors is 2 - 2 * cosine.
+        return 1.0 - distance / 2.0
+
+    def _query(self, vector: np.ndarray, top_k: int, where: Optional[dict]) -> SearchResult:
+        hits = self.db.similarity_search_by_vector_with_relevance_scores(vector.tolist(), k=top_k, filter=where)
+        isbns, scores = [], []
+        for doc, distance in hits:
+            isbn = (doc.metadata or {}).get("isbn13")
+            if isbn is None:
+                # Stores built before ISBN metadata was recorded only carry it in the text.
+                isbn = doc.page_content.strip('"').split()[0]
+            isbns.append(int(isbn))
+            scores.append(self._similarity(distance))
+        return np.asarray(isbns, dtype=np.int64), np.asarray(scores, dtype=np.float32)
+
+    def search_vectors(self, vectors: np.ndarray, top_k: int = 10, mask: Optional[np.ndarray] = None) -> list[SearchResult]:
+        """Queries the Chroma collection once per vector and returns (isbns, scores) pairs.
+
+        A mask allowing more than CHROMA_FILTER_CHUNK books is queried in chunks of that many ISBNs, whose hits are merged.
+        """
+        vectors = normalize_rows(vectors)
+        mask = None if mask is None else np.asarray(mask, dtype=bool)
+        results = []
+        for i, vector in enumerate(vectors):
+            if mask is None:
+                results.append(self._query(vector, top_k, None))
+                continue
+            allowed = self.isbns[mask if mask.ndim == 1 else mask[i]]
+            chunks = [
+                self._query(vector, top_k, {"isbn13": {"$in": allowed[start:start + CHROMA_FILTER_CHUNK].tolist()}})
+                for start in range(0, len(allowed), CHROMA_FILTER_CHUNK)
+            ]
+            if not chunks:
+                results.append((np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)))
+            elif len(chunks) == 1:
+                results.append(chunks[0])
+            else:
+                isbns = np.concatenate([c[0] for c in chunks])
+                scores = np.concatenate([c[1] for c in chunks])
+                order = np.argsort(-scores, kind="stable")[:top_k]
+                results.append((isbns[order], scores[order]))
+        return results
+
+    def search(self, queries: Sequence[str], top_k: int = 10, mask: Optional[np.ndarray] = None) -> list[SearchResult]:
+        """Embeds a batch of queries and returns the top-k (isbns, scores) for each of them."""
+        return self.search_vectors(self.embed_queries(queries), top_k, mask=mask)
+
+
+def as_vector_index(db):
+    """Wraps a langchain `Chroma` store in `ChromaVectorIndex`; index objects are returned unchanged.
+
+    Entry points wrap their store once at load time, so the adapter's ISBN list is fetched once rather than per request.
+    """
+    if hasattr(db, "search_vectors"):
+        return db
+    return ChromaVectorIndex(db)
@@ -1,41 +1,277 @@
+import hashlib
+import json
 import os
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
 import pandas as pd
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import CharacterTextSplitter
-from langchain.embeddings import SentenceTransformerEmbeddings
-from langchain_chroma import Chroma
-from dotenv import load_dotenv
 
-def build_vectorstore(csv_path: str, description_txt_path: str, persist_directory: str = "chroma_db") -> Chroma:
+from src.config import EMBEDDING_MODEL_NAME, VECTORSTORE_MANIFEST
+from src.models import sentence_embedding
+from src.vector_index import NumpyVectorIndex
+
+if TYPE_CHECKING:
+    # langchain, Chroma and sentence-transformers take seconds to import; they are loaded only when a model or collection is opened.
+    from langchain.embeddings import SentenceTransformerEmbeddings
+    from langchain_chroma import Chroma
+
+COLLECTION_NAME = "books"
+UPSERT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 5000
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Computes the SHA-256 hex digest of a file without loading it into memory at once.
+
+    Args:
+        path (str): Path to the file to hash.
+        chunk_size (int, optional): Number of bytes read per iteration. Defaults to 1 MiB.
+
+    Returns:
+        str: Hex digest of the file contents.
     """
-    Builds and persists a Chroma vector database from book descriptions.
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def text_sha1(text: str) -> str:
+    """Returns a short, stable fingerprint of a single document's text."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def manifest_path(persist_directory: str) -> str:
+    """Returns the location of the manifest describing the contents of `persist_directory`."""
+    return os.path.join(persist_directory, VECTORSTORE_MANIFEST)
+
+
+def read_manifest(persist_directory: str) -> Optional[dict]:
+    """Reads the vectorstore manifest, returning None when it is missing or unreadable."""
+    path = manifest_path(persist_directory)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def write_manifest(persist_directory: str, manifest: dict) -> None:
+    """Atomically writes the vectorstore manifest next to the persisted collection."""
+    os.makedirs(persist_directory, exist_ok=True)
+    path = manifest_path(persist_directory)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def get_embedding_model(model_name: str = EMBEDDING_MODEL_NAME) -> "SentenceTransformerEmbeddings":
+    """Returns the sentence-transformer embedding model used for book descriptions and queries, shared through the model registry."""
+    return sentence_embedding(model_name)
+
+
+def open_vectorstore(persist_directory: str = "chroma_db", embedding: Optional["SentenceTransformerEmbeddings"] = None) -> "Chroma":
+    """Opens the persisted Chroma collection without embedding anything.
+
+    Args:
+        persist_directory (str): Directory the Chroma DB was persisted to.
+        embedding (Optional[SentenceTransformerEmbeddings]): Embedding model used for queries. Loaded on demand if None.
+
+    Returns:
+        Chroma: The vectorstore bound to the persisted collection.
+    """
+    from langchain_chroma import Chroma
+
+    return Chroma(
+        collection_name=COLLECTION_NAME,
+        embedding_function=embedding or get_embedding_model(),
+        persist_directory=persist_directory,
+        collection_metadata={"hnsw:space": "cosine"},
+    )
+
+
+def _upsert_books(db: "Chroma", books: pd.DataFrame) -> None:
+    """Embeds and upserts the given books, keyed by ISBN so re-runs never duplicate documents."""
+    for start in range(0, len(books), UPSERT_BATCH_SIZE):
+        batch = books.iloc[start:start + UPSERT_BATCH_SIZE]
+        db.add_texts(
+            texts=batch["tagged_description"].tolist(),
+            metadatas=[{"isbn13": int(isbn)} for isbn in batch["isbn13"]],
+            ids=[str(isbn) for isbn in batch["isbn13"]],
+        )
+
+
+def load_or_build_vectorstore(
+    csv_path: str,
+    description_txt_path: str,
+    persist_directory: str = "chroma_db",
+    model_name: str = EMBEDDING_MODEL_NAME,
+) -> "Chroma":
+    """Opens the persisted vectorstore, embedding only the books that changed since it was built.
+
+    A manifest stored in `persist_directory` records the CSV content hash, the embedding model name, the document count and a per-ISBN hash of each tagged description. When the CSV hash, model and count match, the existing collection is opened as-is. Otherwise only added or changed ISBNs are embedded and removed ones are deleted, diffing against the ids actually stored when the collection's count disagrees with the manifest; a different embedding model forces a full rebuild.
 
     Args:
         csv_path (str): Path to the cleaned book CSV.
         description_txt_path (str): Where to save tagged descriptions as .txt
         persist_directory (str): Directory to persist the Chroma DB.
+        model_name (str): Sentence-transformer model used to embed descriptions.
 
     Returns:
-        Chroma: The built vectorstore object.
+        Chroma: The up-to-date vectorstore object.
     """
-    load_dotenv()
-    books = pd.read_csv(csv_path)
+    csv_hash = file_sha256(csv_path)
+    manifest = read_manifest(persist_directory)
+    embedding = get_embedding_model(model_name)
+
+    if (
+        manifest is not None
+        and manifest.get("csv_sha256") == csv_hash
+        and manifest.get("embedding_model") == model_name
+        and os.path.isdir(persist_directory)
+    ):
+        db = open_vectorstore(persist_directory, embedding)
+        if db._collection.count() == manifest.get("document_count"):
+            return db
+
+    books = pd.read_csv(csv_path, usecols=["isbn13", "tagged_description"])
+    books = books.drop_duplicates(subset="isbn13", keep="last")
     books['tagged_description'].to_csv(
         description_txt_path, sep='\n', index=False, header=False
     )
 
-    loader = TextLoader(description_txt_path, encoding='utf-8')
-    raw_documents = loader.load()
+    hashes = {str(isbn): text_sha1(text) for isbn, text in zip(books["isbn13"], books["tagged_description"])}
 
-    text_splitter = CharacterTextSplitter(separator='\n', chunk_size=0, chunk_overlap=0)
-    documents = text_splitter.split_documents(raw_documents)
+    db = open_vectorstore(persist_directory, embedding)
+    if manifest is None or manifest.get("embedding_model") != model_name:
+        # Vectors from a different model (or an untracked store) cannot be reused.
+        db.delete_collection()
+        db = open_vectorstore(persist_directory, embedding)
+        previous = {}
+    else:
+        previous = manifest.get("documents", {})
+        stored = db._collection.count()
+        if stored != len(previous):
+            # A partial delete or an interrupted upsert left the collection out of step with the manifest, so diff
+            # against the ids it actually holds; ids the manifest does not know have no hash and are re-embedded.
+            print(f"Vectorstore holds {stored} documents but its manifest lists {len(previous)}; reconciling...")
+            previous = {isbn: previous.get(isbn) for isbn in db.get(include=[])["ids"]}
 
-    embedding = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+    changed = [isbn for isbn, digest in hashes.items() if previous.get(isbn) != digest]
+    removed = [isbn for isbn in previous if isbn not in hashes]
 
-    db_books = Chroma.from_documents(
-        documents=documents,
-        embedding=embedding,
-        persist_directory=persist_directory
+    if removed:
+        db.delete(ids=removed)
+    if changed:
+        print(f"Embedding {len(changed)} new or changed books...")
+        _upsert_books(db, books[books["isbn13"].astype(str).isin(changed)])
+
+    write_manifest(persist_directory, {
+        "csv_sha256": csv_hash,
+        "embedding_model": model_name,
+        "document_count": len(hashes),
+        "documents": hashes,
+    })
+    return db
+
+
+def build_vectorstore(csv_path: str, description_txt_path: str, persist_directory: str = "chroma_db") -> "Chroma":
+    """
+    Builds and persists a Chroma vector database from book descriptions.
+
+    Unchanged books already present in `persist_directory` are not re-embedded; see `load_or_build_vectorstore`.
+
+    Args:
+        csv_path (str): Path to the cleaned book CSV.
+        description_txt_path (str): Where to save tagged descriptions as .txt
+        persist_directory (str): Directory to persist the Chroma DB.
+
+    Returns:
+        Chroma: The built vectorstore object.
+    """
+    return load_or_build_vectorstore(csv_path, description_txt_path, persist_directory)
+
+
+def manifest_fingerprint(manifest: dict) -> str:
+    """Summarizes the embedded contents of a vectorstore so derived indexes can tell when they are stale.
+
+    Only the model and per-ISBN document hashes are included, so re-saving an identical catalog under a different CSV does not invalidate anything.
+    """
+    contents = {"embedding_model": manifest.get("embedding_model"), "documents": manifest.get("documents", {})}
+    return hashlib.sha256(json.dumps(contents, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_or_build_numpy_index(
+    db: "Chroma",
+    persist_directory: str = "chroma_db",
+    index_directory: str = "vector_index",
+) -> NumpyVectorIndex:
+    """Opens the memory-mapped NumPy index, exporting it from the Chroma collection when it is stale.
+
+    The stored embeddings are copied out of Chroma rather than recomputed, so the export never runs the embedding model.
+
+    Args:
+        db (Chroma): The up-to-date vectorstore, e.g. from `load_or_build_vectorstore`.
+        persist_directory (str): Directory the Chroma DB (and its manifest) was persisted to.
+        index_directory (str): Directory holding the NumPy index files.
+
+    Returns:
+        NumpyVectorIndex: An index sharing the vectorstore's embedding model for queries.
+    """
+    source = read_manifest(persist_directory)
+    fingerprint = manifest_fingerprint(source) if source is not None else None
+    existing = NumpyVectorIndex.read_manifest(index_directory)
+    if fingerprint is not None and existing is not None and existing.get("source_fingerprint") == fingerprint:
+        return NumpyVectorIndex.load(index_directory, embedding=db.embeddings)
+
+    isbns, vectors = [], []
+    total = db._collection.count()
+    for offset in range(0, total, EXPORT_BATCH_SIZE):
+        batch = db.get(include=["embeddings"], limit=EXPORT_BATCH_SIZE, offset=offset)
+        isbns.extend(int(doc_id) for doc_id in batch["ids"])
+        vectors.append(np.asarray(batch["embeddings"], dtype=np.float32))
+
+    order = np.argsort(np.asarray(isbns, dtype=np.int64), kind="stable")
+    matrix = np.concatenate(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+    return NumpyVectorIndex.build(
+        index_directory,
+        matrix[order],
+        np.asarray(isbns, dtype=np.int64)[order],
+        embedding=db.embeddings,
+        metadata={
+            "embedding_model": (source or {}).get("embedding_model", EMBEDDING_MODEL_NAME),
+            "source_fingerprint": fingerprint,
+        },
     )
 
-    return db_books
+
+def open_current_numpy_index(
+    csv_path: str,
+    persist_directory: str = "chroma_db",
+    index_directory: str = "vector_index",
+    model_name: str = EMBEDDING_MODEL_NAME,
+) -> Optional[NumpyVectorIndex]:
+    """Opens the NumPy index directly when it is up to date with `csv_path`, without opening Chroma.
+
+    This is the warm-start path for the numpy-based backends: only the two manifests and the CSV hash are checked. Callers fall back to `load_or_build_vectorstore` and `load_or_build_numpy_index` when it returns None.
+
+    Args:
+        csv_path (str): Path to the cleaned book CSV.
+        persist_directory (str): Directory the Chroma DB (and its manifest) was persisted to.
+        index_directory (str): Directory holding the NumPy index files.
+        model_name (str): Sentence-transformer model the index must have been built with.
+
+    Returns:
+        Optional[NumpyVectorIndex]: The memory-mapped index, or None if the vectorstore or index is stale.
+    """
+    source = read_manifest(persist_directory)
+    if source is None or source.get("embedding_model") != model_name or source.get("csv_sha256") != file_sha256(csv_path):
+        return None
+    existing = NumpyVectorIndex.read_manifest(index_directory)
+    if existing is None or existing.get("source_fingerprint") != manifest_fingerprint(source):
+        return None
+    return NumpyVectorIndex.load(index_directory, embedding=get_embedding_model(model_name))